@@ -0,0 +1,234 @@
+"""
+Dead letters for failed jobs, and a tool to list and replay them.
+
+    python dead_letters.py                                    # summary of all dead letters
+    python dead_letters.py --error-class HTTPError --since 24h --list
+    python dead_letters.py --error-class image_preflight --since 2026-10-01 --replay --rate 60
+
+A job that finishes "failed" gets one document in DEAD_LETTER_COLLECTION,
+keyed by the job's path, with the error class, HTTP status, attempt count and
+timestamps. If the same job fails again, that record is updated. A later
+successful run deletes it. Replay streams the records one cursor page at a time.
+Each job that is still "failed" goes back through the same JobPool and
+process_job as the listener. At most --rate jobs are submitted per minute.
+A replay only covers letters that failed before it started (--until defaults
+to the start time), so a job that fails again during the run is not replayed
+a second time from a later page.
+"""
+import os
+import re
+import sys
+import time
+import logging
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from firebase_admin import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+# --- Dead Letter Config ---
+DEAD_LETTER_COLLECTION = os.environ.get("GHOST_DEAD_LETTER_COLLECTION", "dead_letters")
+DEAD_LETTER_PAGE_SIZE = int(os.environ.get("GHOST_DEAD_LETTER_PAGE_SIZE", "200"))
+DEAD_LETTER_MESSAGE_CHARS = 500
+
+class JobFailed(Exception):
+    """
+    A job failed for a known reason that retrying will not fix.
+
+    error_class is a short category (e.g. "invalid_job", "image_preflight")
+    recorded on the dead letter; anything else that fails a job is recorded
+    under its exception class name instead.
+    """
+
+    def __init__(self, error_class, message, http_status=None):
+        super().__init__(message)
+        self.error_class = error_class
+        self.http_status = http_status
+
+def describe_failure(exc):
+    """(error class, HTTP status or None, message) for a job failure."""
+    if isinstance(exc, JobFailed):
+        return exc.error_class, exc.http_status, str(exc)
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    return type(exc).__name__, status, str(exc) or type(exc).__name__
+
+def dead_letter_ref(db, job_ref):
+    # Job paths contain '/', which document IDs cannot
+    return db.collection(DEAD_LETTER_COLLECTION).document(job_ref.path.replace("/", ":"))
+
+def dead_letter_record(job_doc, failure, attempts, worker_id):
+    """Fields merged into the job's dead letter on every failure."""
+    job_data = job_doc.to_dict() or {}
+    error_class, http_status, message = describe_failure(failure)
+    return {
+        "jobPath": job_doc.reference.path,
+        "jobId": job_doc.id,
+        "productType": job_data.get("productType"),
+        "title": job_data.get("title"),
+        "errorClass": error_class,
+        "httpStatus": http_status,
+        "message": message[:DEAD_LETTER_MESSAGE_CHARS],
+        "attempts": attempts,
+        "failureCount": firestore.Increment(1),
+        "workerId": worker_id,
+        "jobCreatedAt": job_data.get("createdAt"),
+        "failedAt": firestore.SERVER_TIMESTAMP,
+    }
+
+def dead_letter_query(db, error_class=None, since=None, until=None):
+    """
+    Dead letters oldest failure first. Filtering on errorClass together with
+    a time window needs a composite index (errorClass, failedAt).
+    """
+    query = db.collection(DEAD_LETTER_COLLECTION)
+    if error_class:
+        query = query.where(filter=FieldFilter("errorClass", "==", error_class))
+    if since:
+        query = query.where(filter=FieldFilter("failedAt", ">=", since))
+    if until:
+        query = query.where(filter=FieldFilter("failedAt", "<", until))
+    # Tie-break on the document path so the cursor is unique
+    return query.order_by("failedAt").order_by("__name__")
+
+def replay_query(db, error_class=None, since=None, until=None):
+    """
+    dead_letter_query ending no later than now. A job this replay runs that
+    fails again gets a later failedAt, so it does not come round again on a
+    later page.
+    """
+    started = datetime.now(timezone.utc)
+    return dead_letter_query(db, error_class, since, min(until, started) if until else started)
+
+def iter_pages(query, page_size=DEAD_LETTER_PAGE_SIZE, limit=None):
+    """Yield lists of snapshots, one cursor-paginated page at a time."""
+    cursor = None
+    seen = 0
+    while limit is None or seen < limit:
+        size = page_size if limit is None else min(page_size, limit - seen)
+        page_query = query.start_after(cursor) if cursor is not None else query
+        page = list(page_query.limit(size).stream())
+        if not page:
+            return
+        seen += len(page)
+        yield page
+        if len(page) < size:
+            return
+        cursor = page[-1]
+
+def parse_time(value):
+    """ISO date/datetime (UTC unless given) or an age such as '30m', '24h', '7d'."""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([mhd])", value.strip())
+    if match:
+        unit = {"m": "minutes", "h": "hours", "d": "days"}[match.group(2)]
+        return datetime.now(timezone.utc) - timedelta(**{unit: float(match.group(1))})
+    parsed = datetime.fromisoformat(value.strip())
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+# ==============================================================================
+# REPLAY
+# ==============================================================================
+def replay(db, pages, pool, bucket, writer, stop):
+    """
+    Submit every still-failed job behind the given dead-letter pages to pool.
+
+    Each page's jobs are read with one batched get. Jobs that were deleted,
+    are in flight or already completed are skipped. A replayed job continues
+    from the attempt count on its dead letter; it is only retried again if
+    that is still under JOB_MAX_ATTEMPTS. The dead letter itself stays until
+    the job succeeds and records the replay (and, on another failure, the
+    total attempts).
+
+    pages should end at the run's start (see replay_query). A job
+    that fails again moves its letter past that bound; one seen again anyway
+    (server and local clocks disagree) is skipped as already replayed.
+    """
+    stats = Counter()
+    replayed = set()
+    for page in pages:
+        paths = [letter.get("jobPath") for letter in page]
+        jobs = {snap.reference.path: snap for snap in db.get_all([db.document(p) for p in paths])}
+        for letter, path in zip(page, paths):
+            if stop.is_set():
+                return stats
+            if path in replayed:
+                stats["already_replayed"] += 1
+                continue
+            job = jobs.get(path)
+            if job is None or not job.exists:
+                stats["missing"] += 1
+                continue
+            if (job.to_dict() or {}).get("status") != "failed":
+                stats["not_failed"] += 1
+                continue
+            time.sleep(bucket.reserve())
+            # replay=True: claim straight from "failed" under the usual
+            # precondition. The job keeps the attempts it already used, so a
+            # replay of an exhausted job is one more attempt, not a fresh budget.
+            if pool.submit(job, None, letter.get("attempts") or 0, True):
+                stats["submitted"] += 1
+                replayed.add(path)
+                writer.update(
+                    letter.reference,
+                    {"replayCount": firestore.Increment(1), "lastReplayedAt": firestore.SERVER_TIMESTAMP},
+                )
+        logging.info(f"Replay progress: {dict(stats)} | job pool: {pool.stats()}")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--error-class", help="only this error class (e.g. HTTPError, image_preflight)")
+    parser.add_argument("--since", type=parse_time, help="failed at or after (ISO time or age like 24h)")
+    parser.add_argument("--until", type=parse_time, help="failed before (ISO time or age like 1h; with --replay, at most now)")
+    parser.add_argument("--limit", type=int, help="stop after this many dead letters")
+    parser.add_argument("--page-size", type=int, default=DEAD_LETTER_PAGE_SIZE)
+    parser.add_argument("--list", action="store_true", help="print one line per dead letter")
+    parser.add_argument("--replay", action="store_true", help="re-run the matching failed jobs")
+    parser.add_argument("--rate", type=float, default=60, help="jobs submitted per minute when replaying")
+    parser.add_argument("--burst", type=int, default=10, help="jobs that may be submitted back to back")
+    args = parser.parse_args()
+
+    # Initializes Firebase and brings the worker pool, claims and retries
+    # the listener uses; replayed jobs run exactly as live ones do
+    import product_generator as pg
+    from printful_client import TokenBucket
+
+    if args.replay:
+        query = replay_query(pg.db, args.error_class, args.since, args.until)
+    else:
+        query = dead_letter_query(pg.db, args.error_class, args.since, args.until)
+    pages = iter_pages(query, args.page_size, args.limit)
+
+    if not args.replay:
+        counts = Counter()
+        for page in pages:
+            for letter in page:
+                data = letter.to_dict()
+                counts[(data.get("errorClass"), data.get("httpStatus"))] += 1
+                if args.list:
+                    failed_at = data.get("failedAt")
+                    print(
+                        f"{failed_at.isoformat() if failed_at else '-'}  {data.get('errorClass')}"
+                        f"{' ' + str(data['httpStatus']) if data.get('httpStatus') else ''}  "
+                        f"x{data.get('failureCount', 1)}  {data.get('jobPath')}  {data.get('message', '')[:120]}"
+                    )
+        for (error_class, status), count in counts.most_common():
+            print(f"{count:>7}  {error_class}{' (HTTP ' + str(status) + ')' if status else ''}")
+        print(f"{sum(counts.values()):>7}  total")
+        return
+
+    import signal
+    signal.signal(signal.SIGTERM, pg.handle_shutdown)
+    signal.signal(signal.SIGINT, pg.handle_shutdown)
+    pool = pg.start_workers()
+    bucket = TokenBucket(rate_per_minute=args.rate, burst=args.burst)
+    try:
+        stats = replay(pg.db, pages, pool, bucket, pg.status_writer, pg.shutdown_event)
+    finally:
+        pg.stop_workers(pool)
+    logging.info(f"Replay finished: {dict(stats)}")
+    sys.exit(0 if not pg.shutdown_event.is_set() else 130)
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,402 @@
-print('[fmt] No-op formatter. Using .md as deliverable in v1.')
+"""
+Render Markdown deliverables to HTML and PDF.
+
+    python formatter.py                               # data/products/**/*.md -> data/media/**/*.{html,pdf}
+    python formatter.py --formats pdf --workers 8
+    python formatter.py --bench 300                   # throughput on a synthetic catalog
+
+Markdown is parsed with markdown-it-py, set up like the Node mdToPdf helper
+(markdown-it, no raw HTML, linkify, typographer), and the tokens are
+rendered to HTML and laid out as an A4 PDF with fpdf2. Large documents are
+streamed: the source is read in chunks of about FORMATTER_CHUNK_CHARS, cut
+before a top-level heading, and each chunk is parsed and rendered to every
+format before the next is read. Only one chunk's tokens are held at a time;
+the HTML is written as it goes. fpdf2 keeps laid-out pages until it writes
+the file, so a PDF's memory grows with its output, not its source. A
+document without headings is one chunk. Link reference definitions apply
+to the chunks after theirs, not before. Each output is cached
+under a key made from the source's content hash, the format, the template
+and the library versions, so an unchanged deliverable is never rendered
+again; it is only copied into place. Cache misses are spread over a process
+pool.
+"""
+import os
+import re
+import sys
+import json
+import html
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fpdf
+import markdown_it
+from fpdf import FPDF
+from markdown_it import MarkdownIt
+
+# --- Formatter Config ---
+FORMATTER_SRC = os.environ.get("FORMATTER_SRC", "data/products")
+FORMATTER_OUT = os.environ.get("FORMATTER_OUT", "data/media")
+FORMATTER_CACHE = os.environ.get("FORMATTER_CACHE", "data/render_cache")
+FORMATTER_FORMATS = os.environ.get("FORMATTER_FORMATS", "html,pdf")
+FORMATTER_WORKERS = int(os.environ.get("FORMATTER_WORKERS", "0")) or (os.cpu_count() or 1)
+# Optional HTML template file: {title} and {body} placeholders, other braces doubled
+FORMATTER_TEMPLATE = os.environ.get("FORMATTER_TEMPLATE", "")
+# Sources are parsed in pieces of about this many characters (see iter_chunks)
+FORMATTER_CHUNK_CHARS = int(os.environ.get("FORMATTER_CHUNK_CHARS", str(256 * 1024)))
+# Unicode TTFs for the PDF (DejaVu Sans / Sans Mono); the core Latin-1 fonts are used if absent
+FORMATTER_PDF_FONT_DIR = os.environ.get("FORMATTER_PDF_FONT_DIR", "/usr/share/fonts/truetype/dejavu")
+
+RENDERER_VERSION = "3"  # bump when rendering output changes, to invalidate the cache
+FORMATS = ("html", "pdf")
+
+# Same look as the Node mdToPdf helper
+DEFAULT_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"/><title>{title}</title><style>body{{font-family: system-ui, -apple-system, Segoe UI, Roboto, Helvetica, Arial; padding:32px; line-height:1.55; max-width:860px; margin:auto}}h1,h2,h3{{margin:16px 0 8px}}code,pre{{font-family: ui-monospace, Menlo, Consolas, monospace; background:#f6f8fa}}pre{{padding:12px; border-radius:8px; overflow:auto}}img{{max-width:100%}}table{{border-collapse:collapse}}td,th{{border:1px solid #ddd; padding:4px 8px}}blockquote{{color:#555; border-left:4px solid #ddd; margin:0; padding-left:12px}}.meta{{color:#666; font-size:12px; margin-bottom:24px}}</style></head>
+<body><div class="meta">Generated by Ghost System</div>
+{body}
+</body></html>
+"""
+
+def load_template(path=FORMATTER_TEMPLATE):
+    if not path:
+        return DEFAULT_TEMPLATE
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def split_template(template):
+    """(head, foot) around {body}; {title} is filled in per document."""
+    head, sep, foot = template.partition("{body}")
+    if not sep:
+        raise ValueError("template has no {body} placeholder")
+    return head, foot
+
+# ==============================================================================
+# MARKDOWN (markdown-it-py, configured like the Node mdToPdf helper)
+# ==============================================================================
+def _new_markdown():
+    # html off: raw HTML in a deliverable is shown as text, never injected
+    md = MarkdownIt("default", {"html": False, "linkify": True, "typographer": True})
+    return md.enable(["linkify", "replacements", "smartquotes"])
+
+MD = _new_markdown()
+
+def _image_as_text(self, tokens, idx, options, env):
+    # The PDF has no network or asset lookup: an image prints as its alt text
+    alt = self.renderInlineAsText(tokens[idx].children or [], options, env)
+    return html.escape(f"[{alt or 'image'}]")
+
+MD_PDF = _new_markdown()
+MD_PDF.add_render_rule("image", _image_as_text)
+
+_FENCE = re.compile(r" {0,3}(`{3,}|~{3,})")
+_HEADING = re.compile(r"#{1,6}(\s|$)")
+
+def iter_chunks(path, chunk_chars=FORMATTER_CHUNK_CHARS):
+    """
+    Yield the source in pieces of at least chunk_chars (the last may be
+    shorter). A piece ends only where the next line is an ATX heading at
+    column 0 after a blank line, outside a code fence: no block spans that
+    boundary, so the pieces parse as the whole document would.
+    """
+    buf, size = [], 0
+    fence = None  # opening run of the code fence we are in
+    blank = True
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if fence is None:
+                if size >= chunk_chars and blank and _HEADING.match(line):
+                    yield "".join(buf)
+                    buf, size = [], 0
+                match = _FENCE.match(line)
+                if match:
+                    fence = match.group(1)
+            elif re.fullmatch(rf" {{0,3}}{re.escape(fence)}{re.escape(fence[0])}*\s*", line):
+                fence = None
+            buf.append(line)
+            size += len(line)
+            blank = not line.strip()
+    if buf:
+        yield "".join(buf)
+
+def html_frame(template=DEFAULT_TEMPLATE, title=""):
+    """(head, foot) of the HTML page, {title} filled in."""
+    head, foot = split_template(template)
+    head = html.escape(title).join(part.replace("{{", "{").replace("}}", "}") for part in head.split("{title}"))
+    return head, foot
+
+# ==============================================================================
+# PDF (fpdf2)
+# ==============================================================================
+# fpdf2's built-in fonts are Latin-1 only; with the DejaVu TTFs any Unicode
+# text prints. Without them, typographic punctuation falls back to ASCII and
+# other characters print as '?'.
+PDF_FONT_FILES = {  # family -> {style: file in FORMATTER_PDF_FONT_DIR}; missing styles use ""
+    "dejavu": {"": "DejaVuSans.ttf", "B": "DejaVuSans-Bold.ttf", "I": "DejaVuSans-Oblique.ttf", "BI": "DejaVuSans-BoldOblique.ttf"},
+    "dejavumono": {"": "DejaVuSansMono.ttf", "B": "DejaVuSansMono-Bold.ttf"},
+}
+LATIN1_FALLBACK = str.maketrans({
+    "‘": "'", "’": "'", "“": '"', "”": '"',
+    "–": "-", "—": "--", "…": "...", "•": "*", "™": "(TM)",
+})
+
+def pdf_fonts(font_dir=FORMATTER_PDF_FONT_DIR):
+    """(text family, code family, unicode?): the DejaVu TTFs if present, else the core fonts."""
+    if font_dir and os.path.exists(os.path.join(font_dir, PDF_FONT_FILES["dejavu"][""])):
+        return "dejavu", "dejavumono", True
+    return "helvetica", "courier", False
+
+def _add_fonts(pdf, font_dir):
+    for family, styles in PDF_FONT_FILES.items():
+        for style in ("", "B", "I", "BI"):
+            path = os.path.join(font_dir, styles.get(style, ""))
+            pdf.add_font(family, style, path if os.path.isfile(path) else os.path.join(font_dir, styles[""]))
+
+class PdfDocument:
+    """An A4 PDF with the Node helper's margins, laid out one chunk of tokens at a time."""
+
+    def __init__(self, font_dir=FORMATTER_PDF_FONT_DIR):
+        self.family, self.code_family, self.unicode = pdf_fonts(font_dir)
+        self.pdf = FPDF(format="A4", unit="mm")
+        self.pdf.set_margins(14, 16, 14)
+        self.pdf.set_auto_page_break(True, margin=16)
+        if self.unicode:
+            _add_fonts(self.pdf, font_dir)
+        self.pdf.add_page()
+        self.pdf.set_font(self.family, size=10.5)
+        self._write_html('<p><font size="8" color="#666666">Generated by Ghost System</font></p>')
+
+    def _write_html(self, body):
+        if not self.unicode:
+            body = body.translate(LATIN1_FALLBACK).encode("latin-1", "replace").decode("latin-1")
+        self.pdf.write_html(
+            body, font_family=self.family, pre_code_font=self.code_family, warn_on_tags_not_matching=False,
+        )
+
+    def write(self, tokens, env):
+        self._write_html(MD_PDF.renderer.render(tokens, MD_PDF.options, env))
+
+    def output(self, path):
+        self.pdf.output(path)
+
+# ==============================================================================
+# RENDER CACHE + POOL
+# ==============================================================================
+def file_digest(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return h.hexdigest()
+            h.update(chunk)
+
+def template_digest(fmt, template):
+    # Library upgrades can change the output, so their versions are part of the key;
+    # the PDF layout is code, so RENDERER_VERSION and its fonts stand in for a template
+    basis = template if fmt == "html" else f"pdf-a4:{fpdf.FPDF_VERSION}:{pdf_fonts()}"
+    key = f"{RENDERER_VERSION}\0{markdown_it.__version__}\0{fmt}\0{basis}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def cache_path(cache_dir, key, fmt):
+    return os.path.join(cache_dir, key[:2], f"{key}.{fmt}")
+
+def render_file(src, targets, template=DEFAULT_TEMPLATE):
+    """
+    Render src once into each {fmt: cache path}. Runs in a pool worker.
+    Returns (src, bytes read, seconds).
+    """
+    started = time.perf_counter()
+    title = os.path.splitext(os.path.basename(src))[0]
+    pending = []  # temp files not yet moved into the cache
+    html_out = pdf = None
+    try:
+        for fmt, path in targets.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pending.append(f"{path}.{os.getpid()}.tmp")
+            if fmt == "html":
+                html_out = open(pending[-1], "w", encoding="utf-8", newline="\n")
+                head, foot = html_frame(template, title)
+                html_out.write(head)
+            else:
+                pdf = PdfDocument()
+        env = {}  # shared by every chunk, so earlier link references resolve later
+        for chunk in iter_chunks(src):
+            tokens = MD.parse(chunk, env)
+            if html_out is not None:
+                html_out.write(MD.renderer.render(tokens, MD.options, env))
+            if pdf is not None:
+                pdf.write(tokens, env)
+        for fmt, tmp in zip(targets, pending):
+            if fmt == "html":
+                html_out.write(foot)
+                html_out.close()
+            else:
+                pdf.output(tmp)
+        for fmt, path in targets.items():
+            os.replace(pending.pop(0), path)
+    finally:
+        if html_out is not None:
+            html_out.close()
+        for tmp in pending:  # a failed render leaves nothing behind
+            try:
+                os.remove(tmp)
+            except FileNotFoundError:
+                pass
+    return src, os.path.getsize(src), time.perf_counter() - started
+
+def place(cached, dest):
+    """
+    Copy a cached output to dest. Never a hard link: the Node forge rewrites
+    data/media files in place, which would corrupt the shared cache entry.
+    Skipped when dest is still an untouched copy (same size and mtime).
+    """
+    try:
+        c, d = os.stat(cached), os.stat(dest)
+        if c.st_size == d.st_size and c.st_mtime_ns == d.st_mtime_ns:
+            return
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    tmp = f"{dest}.{os.getpid()}.tmp"
+    try:
+        shutil.copy2(cached, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def render_catalog(src_dir=FORMATTER_SRC, out_dir=FORMATTER_OUT, cache_dir=FORMATTER_CACHE,
+                   formats=FORMATS, workers=FORMATTER_WORKERS, template=None):
+    """
+    Render every .md under src_dir to out_dir (same relative paths) in each
+    format. Returns stats: documents, rendered, cached, bytes, seconds.
+    """
+    template = template if template is not None else load_template()
+    digests = {fmt: template_digest(fmt, template) for fmt in formats}
+    started = time.perf_counter()
+    stats = {"documents": 0, "rendered": 0, "cached": 0, "bytes": 0, "failed": 0}
+
+    placements = []  # (cache path, dest)
+    jobs = {}  # src -> {fmt: cache path}, cache misses only
+    claimed = set()  # cache paths some job already renders (identical sources)
+    for root, _, names in os.walk(src_dir):
+        for name in sorted(names):
+            if not name.endswith(".md"):
+                continue
+            src = os.path.join(root, name)
+            stats["documents"] += 1
+            stats["bytes"] += os.path.getsize(src)
+            source_digest = file_digest(src)
+            rel = os.path.splitext(os.path.relpath(src, src_dir))[0]
+            for fmt in formats:
+                key = hashlib.sha256(f"{source_digest}:{digests[fmt]}".encode()).hexdigest()
+                cached = cache_path(cache_dir, key, fmt)
+                placements.append((cached, os.path.join(out_dir, f"{rel}.{fmt}")))
+                if cached in claimed or os.path.exists(cached):
+                    stats["cached"] += 1
+                else:
+                    claimed.add(cached)
+                    jobs.setdefault(src, {})[fmt] = cached
+
+    if jobs:
+        if workers <= 1 or len(jobs) == 1:
+            results = []
+            for src, targets in jobs.items():
+                try:
+                    results.append(render_file(src, targets, template))
+                except Exception as e:
+                    stats["failed"] += 1
+                    logging.error(f"Rendering {src} failed: {e}")
+        else:
+            results = []
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                futures = {pool.submit(render_file, src, targets, template): src for src, targets in jobs.items()}
+                for future in as_completed(futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        stats["failed"] += 1
+                        logging.error(f"Rendering {futures[future]} failed: {e}")
+        stats["rendered"] = sum(len(jobs[src]) for src, _, _ in results)
+
+    for cached, dest in placements:
+        if os.path.exists(cached):
+            place(cached, dest)
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+# ==============================================================================
+# BENCHMARK
+# ==============================================================================
+def write_synthetic_catalog(path, products, large_mb=0):
+    """products x (prompt-pack.md, readme.md, setup.md), plus one large document."""
+    para = ("Use this **prompt** to draft a *launch email* for `{product}`; see "
+            "[the guide](https://example.com/guide) before you start. ") * 3
+    for i in range(products):
+        folder = os.path.join(path, f"product-{i:05d}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, "prompt-pack.md"), "w", encoding="utf-8") as f:
+            f.write(f"# Prompt Pack {i}\n\n{para}\n\n")
+            for n in range(1, 51):
+                f.write(f"## Prompt {n}\n\n{para}\n\n```text\nYou are an expert copywriter. Product {i}, prompt {n}.\n```\n\n")
+        with open(os.path.join(folder, "readme.md"), "w", encoding="utf-8") as f:
+            f.write(f"# Readme\n\n{para}\n\n- Item one\n- Item two\n  - nested\n1. First\n2. Second\n\n| Field | Value |\n|---|---|\n| sku | {i} |\n")
+        with open(os.path.join(folder, "setup.md"), "w", encoding="utf-8") as f:
+            f.write("# Setup\n\n" + "\n\n".join(f"### Step {n}\n\n{para}\n\n> Tip: {para}" for n in range(1, 11)) + "\n")
+    if large_mb:
+        with open(os.path.join(path, "large.md"), "w", encoding="utf-8") as f:
+            block = f"## Section\n\n{para}\n\n- point\n- point\n\n```\ncode line\n```\n\n"
+            for _ in range(int(large_mb * 1024 * 1024 / len(block)) + 1):
+                f.write(block)
+
+def benchmark(products, workers, large_mb, formats):
+    with tempfile.TemporaryDirectory(prefix="formatter-bench-") as tmp:
+        src = os.path.join(tmp, "src")
+        write_synthetic_catalog(src, products, large_mb)
+        report = {"products": products, "formats": list(formats), "workers": workers}
+        for label, n in (("cold_1_worker", 1), (f"cold_{workers}_workers", workers), ("warm", workers)):
+            cache = os.path.join(tmp, "cache" if label == "warm" else f"cache-{label}")
+            if label == "warm":
+                os.rename(os.path.join(tmp, f"cache-cold_{workers}_workers"), cache)
+            stats = render_catalog(src, os.path.join(tmp, "out"), cache, formats, n)
+            secs = max(stats["seconds"], 1e-9)
+            stats["docs_per_s"] = round(stats["documents"] / secs, 1)
+            stats["mb_per_s"] = round(stats["bytes"] / secs / 1e6, 2)
+            report[label] = stats
+        return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--src", default=FORMATTER_SRC)
+    parser.add_argument("--out", default=FORMATTER_OUT)
+    parser.add_argument("--cache", default=FORMATTER_CACHE)
+    parser.add_argument("--formats", default=FORMATTER_FORMATS, help="comma-separated: html,pdf")
+    parser.add_argument("--workers", type=int, default=FORMATTER_WORKERS)
+    parser.add_argument("--bench", type=int, metavar="PRODUCTS", help="benchmark on a synthetic catalog instead")
+    parser.add_argument("--bench-large-mb", type=float, default=1, help="size of the one large benchmark document")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    formats = tuple(f.strip() for f in args.formats.split(",") if f.strip())
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"unknown format(s): {', '.join(sorted(unknown))}")
+
+    if args.bench:
+        print(json.dumps(benchmark(args.bench, args.workers, args.bench_large_mb, formats), indent=2))
+        return
+    if not os.path.isdir(args.src):
+        print(f"[fmt] No sources in {args.src}; nothing to render.")
+        return
+    stats = render_catalog(args.src, args.out, args.cache, formats, args.workers)
+    print(f"[fmt] {json.dumps(stats)}")
+    if stats["failed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Health and metrics endpoint for the listener process (stdlib only).
+
+    GET /healthz   liveness: the listener loop checked in recently
+    GET /readyz    readiness: listener attached and Firestore reachable
+    GET /metrics   Prometheus text format
+
+Counters and stage histograms are fixed-size and updated under one short
+lock (a dict increment and a bisect per event). Queue depth, in-flight jobs
+and the other gauges are read only when /metrics is scraped, so nothing is
+added to the job path for them.
+"""
+import os
+import time
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Health Endpoint Config ---
+HEALTH_ENABLED = os.environ.get("GHOST_HEALTH_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+HEALTH_HOST = os.environ.get("GHOST_HEALTH_HOST", "0.0.0.0")
+# Render web services route traffic to $PORT
+HEALTH_PORT = int(os.environ.get("GHOST_HEALTH_PORT") or os.environ.get("PORT") or "8080")
+HEALTH_STALE_SECONDS = float(os.environ.get("GHOST_HEALTH_STALE_SECONDS", "180"))  # listener loop ticks every 60s
+HEALTH_PROBE_SECONDS = float(os.environ.get("GHOST_HEALTH_PROBE_SECONDS", "30"))  # Firestore probe cache
+
+# Latency buckets (seconds): claim and status writes are milliseconds, a
+# Printful call can take several seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _labels(labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+
+# ==============================================================================
+# METRICS REGISTRY
+# ==============================================================================
+class Metrics:
+    """Counters by (name, labels), per-stage histograms and scrape-time gauges."""
+
+    def __init__(self, prefix="ghost"):
+        self.prefix = prefix
+        self.started = time.time()
+        self._counters = {}  # (name, ((label, value), ...) in call order) -> n
+        self._stages = {}    # stage -> [bucket counts..., +Inf count, sum]
+        self._gauges = {}    # name -> (help, fn returning a number or {labels tuple: number})
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1, **labels):
+        # Labels are sorted at scrape time, not per event
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def observe(self, stage, seconds):
+        slot = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = [0] * (len(BUCKETS) + 1) + [0.0]
+            hist[slot] += 1
+            hist[-1] += seconds
+
+    def stage(self, name):
+        """with METRICS.stage("claim"): ... records the block's duration."""
+        return _StageTimer(self, name)
+
+    def gauge(self, name, help, fn):
+        self._gauges[name] = (help, fn)
+
+    def prometheus(self):
+        p = self.prefix
+        with self._lock:
+            raw_counters = list(self._counters.items())
+            stages = {k: list(v) for k, v in sorted(self._stages.items())}
+
+        merged = {}
+        for (name, labels), n in raw_counters:
+            key = (name, tuple(sorted(labels)))
+            merged[key] = merged.get(key, 0) + n
+
+        out = []
+        seen = set()
+        for (name, labels), n in sorted(merged.items()):
+            if name not in seen:
+                seen.add(name)
+                out += [f"# TYPE {p}_{name}_total counter"]
+            out.append(f"{p}_{name}_total{_labels(labels)} {n}")
+
+        out += [
+            f"# HELP {p}_stage_duration_seconds Time spent per job stage.",
+            f"# TYPE {p}_stage_duration_seconds histogram",
+        ]
+        for stage, hist in stages.items():
+            cumulative = 0
+            for bound, n in zip(BUCKETS, hist):
+                cumulative += n
+                out.append(f'{p}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            cumulative += hist[len(BUCKETS)]
+            out.append(f'{p}_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {cumulative}')
+            out.append(f'{p}_stage_duration_seconds_sum{{stage="{stage}"}} {hist[-1]:.6f}')
+            out.append(f'{p}_stage_duration_seconds_count{{stage="{stage}"}} {cumulative}')
+
+        for name, (help, fn) in sorted(self._gauges.items()):
+            try:
+                value = fn()
+            except Exception as e:
+                logging.debug(f"Gauge {name} failed: {e}")
+                continue
+            out += [f"# HELP {p}_{name} {help}", f"# TYPE {p}_{name} gauge"]
+            if isinstance(value, dict):
+                out += [f"{p}_{name}{_labels(labels)} {v}" for labels, v in sorted(value.items())]
+            else:
+                out.append(f"{p}_{name} {value}")
+
+        out += [f"# TYPE {p}_uptime_seconds gauge", f"{p}_uptime_seconds {time.time() - self.started:.0f}"]
+        return "\n".join(out) + "\n"
+
+class _StageTimer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+METRICS = Metrics()
+
+# ==============================================================================
+# LIVENESS / READINESS
+# ==============================================================================
+class HealthState:
+    """
+    What the probes report. The listener calls heartbeat() from its loop and
+    set_attached() around its snapshot watch; `probe` is a callable that
+    raises if Firestore is unreachable, run at most every probe_interval.
+    """
+
+    def __init__(self, probe=None, stale_after=HEALTH_STALE_SECONDS, probe_interval=HEALTH_PROBE_SECONDS):
+        self.probe = probe
+        self.stale_after = stale_after
+        self.probe_interval = probe_interval
+        self.attached = False
+        self.last_heartbeat = time.monotonic()
+        self._probe_at = None
+        self._probe_error = "not checked yet"
+        self._probe_lock = threading.Lock()
+
+    def heartbeat(self):
+        self.last_heartbeat = time.monotonic()
+
+    def set_attached(self, attached):
+        self.attached = attached
+        self.heartbeat()
+
+    def live(self):
+        age = time.monotonic() - self.last_heartbeat
+        if age > self.stale_after:
+            return False, f"listener loop silent for {age:.0f}s"
+        return True, "ok"
+
+    def ready(self):
+        if not self.attached:
+            return False, "listener not attached"
+        error = self._firestore_error()
+        if error:
+            return False, f"firestore unreachable: {error}"
+        return True, "ok"
+
+    def _firestore_error(self):
+        if self.probe is None:
+            return None
+        # One probe at a time; concurrent callers get the cached answer
+        with self._probe_lock:
+            now = time.monotonic()
+            if self._probe_at is None or now - self._probe_at >= self.probe_interval:
+                try:
+                    self.probe()
+                    self._probe_error = None
+                except Exception as e:
+                    self._probe_error = str(e) or type(e).__name__
+                self._probe_at = now
+            return self._probe_error
+
+# ==============================================================================
+# HTTP SERVER
+# ==============================================================================
+class HealthHandler(BaseHTTPRequestHandler):
+    server_version = "GhostHealth/1.0"
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/") or "/"
+        state = self.server.state
+        if path == "/metrics":
+            self._send(200, self.server.metrics.prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+        elif path in ("/healthz", "/"):
+            ok, reason = state.live()
+            self._send(200 if ok else 503, reason + "\n")
+        elif path == "/readyz":
+            ok, reason = state.ready()
+            self._send(200 if ok else 503, reason + "\n")
+        else:
+            self._send(404, "not found\n")
+
+    def _send(self, status, body, content_type="text/plain; charset=utf-8"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Probes hit this every few seconds; keep them out of the job log
+        pass
+
+def start_health_server(state, metrics=METRICS, host=HEALTH_HOST, port=HEALTH_PORT):
+    """Serve the probes and /metrics from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), HealthHandler)
+    server.daemon_threads = True
+    server.state = state
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, name="HealthServer", daemon=True).start()
+    logging.info(f"Health endpoint listening on {host}:{server.server_address[1]} (/healthz, /readyz, /metrics).")
+    return server
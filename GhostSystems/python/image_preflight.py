@@ -0,0 +1,260 @@
+"""
+Image pre-flight checks before a product is sent to Printful.
+
+    python image_preflight.py https://example.com/art.png --product-type T-Shirt
+
+Only the first PREFLIGHT_RANGE_BYTES of an image are fetched (ranged GET);
+Pillow reads format and pixel size from those header bytes without decoding.
+The image must be PNG or JPEG and reach PREFLIGHT_MIN_DPI over the product's
+print area. Image facts are cached in memory (LRU, trusted for
+PREFLIGHT_TTL_SECONDS) and on disk keyed by URL + ETag, so artwork reused by
+many jobs is fetched once and afterwards only revalidated with a HEAD.
+"""
+import io
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+
+import requests
+
+# --- Pre-flight Config ---
+PREFLIGHT_ENABLED = os.environ.get("PREFLIGHT_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+PREFLIGHT_CACHE_PATH = os.environ.get("PREFLIGHT_CACHE", "data/image_preflight.sqlite")
+PREFLIGHT_RANGE_BYTES = int(os.environ.get("PREFLIGHT_RANGE_BYTES", "16384"))
+PREFLIGHT_MAX_BYTES = int(os.environ.get("PREFLIGHT_MAX_BYTES", str(1024 * 1024)))
+PREFLIGHT_TTL_SECONDS = int(os.environ.get("PREFLIGHT_TTL_SECONDS", "3600"))
+PREFLIGHT_LRU_SIZE = int(os.environ.get("PREFLIGHT_LRU_SIZE", "2048"))
+PREFLIGHT_TIMEOUT = float(os.environ.get("PREFLIGHT_TIMEOUT", "10"))
+PREFLIGHT_MIN_DPI = float(os.environ.get("PREFLIGHT_MIN_DPI", "150"))
+
+# Printful print areas in inches (width, height). Override or extend with
+# PREFLIGHT_PRINT_AREAS='{"Poster": [18, 24]}'.
+DEFAULT_PRINT_AREAS = {
+    "T-Shirt": (12, 16),  # front print area
+    "Mug": (9, 3.5),      # 11oz wrap-around
+}
+ACCEPTED_FORMATS = {"PNG", "JPEG"}
+
+def print_areas_from_env():
+    areas = dict(DEFAULT_PRINT_AREAS)
+    raw = os.environ.get("PREFLIGHT_PRINT_AREAS", "").strip()
+    if raw:
+        try:
+            areas.update({k: (float(v[0]), float(v[1])) for k, v in json.loads(raw).items()})
+        except (ValueError, TypeError, IndexError, AttributeError) as e:
+            logging.error(f"Ignoring invalid PREFLIGHT_PRINT_AREAS: {e}")
+    return areas
+
+class PreflightResult:
+    def __init__(self, ok, reason="", info=None):
+        self.ok = ok
+        self.reason = reason
+        self.info = info or {}
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return f"PreflightResult(ok={self.ok}, reason={self.reason!r}, info={self.info})"
+
+class TransientFetchError(Exception):
+    """The image could not be checked right now (timeout, 5xx); nothing is cached."""
+
+# ==============================================================================
+# IMAGE PRE-FLIGHT
+# ==============================================================================
+class ImagePreflight:
+    """
+    Fetch-and-inspect with a two-level cache of image facts.
+
+    The cached facts ({"format", "width", "height"} or {"error"}) are
+    independent of the product type; the size rule is applied per call, so
+    one fetch serves a T-Shirt and a Mug job using the same artwork.
+    """
+
+    def __init__(self, cache_path=PREFLIGHT_CACHE_PATH, lru_size=PREFLIGHT_LRU_SIZE,
+                 ttl=PREFLIGHT_TTL_SECONDS, min_dpi=PREFLIGHT_MIN_DPI, print_areas=None, session=None):
+        self.ttl = ttl
+        self.min_dpi = min_dpi
+        self.print_areas = print_areas if print_areas is not None else print_areas_from_env()
+        self.session = session or requests.Session()
+        self.stats = {"lru_hits": 0, "disk_hits": 0, "fetches": 0, "bytes": 0}
+
+        self._lru = OrderedDict()  # url -> (checked_at, etag, facts)
+        self._lru_size = max(1, lru_size)
+        self._lock = threading.Lock()
+
+        self._db = None
+        if cache_path:
+            parent = os.path.dirname(cache_path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            self._db = sqlite3.connect(cache_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                " url TEXT NOT NULL, etag TEXT NOT NULL, facts TEXT NOT NULL, checked_at REAL NOT NULL,"
+                " PRIMARY KEY (url, etag)) WITHOUT ROWID"
+            )
+            self._db.commit()
+
+    # --- Public API ---
+    def check(self, url, product_type=None):
+        try:
+            facts = self.inspect(url)
+        except TransientFetchError as e:
+            # Fail open: Printful fetches the image itself and has the final say
+            logging.warning(f"Image pre-flight skipped for {url}: {e}")
+            return PreflightResult(True, f"unchecked: {e}")
+        return self.evaluate(facts, product_type)
+
+    def evaluate(self, facts, product_type=None):
+        if "error" in facts:
+            return PreflightResult(False, facts["error"], facts)
+        if facts["format"] not in ACCEPTED_FORMATS:
+            return PreflightResult(False, f"unsupported format {facts['format']}", facts)
+        area = self.print_areas.get(product_type)
+        if area:
+            # Scaled to fit the print area, the image prints at this resolution
+            dpi = max(facts["width"] / area[0], facts["height"] / area[1])
+            if dpi < self.min_dpi:
+                need_w, need_h = round(area[0] * self.min_dpi), round(area[1] * self.min_dpi)
+                return PreflightResult(
+                    False,
+                    f"{facts['width']}x{facts['height']} is {dpi:.0f} DPI on the {area[0]}x{area[1]}in "
+                    f"{product_type} print area; need {self.min_dpi:.0f} DPI (~{need_w}x{need_h})",
+                    facts,
+                )
+        return PreflightResult(True, "", facts)
+
+    def inspect(self, url):
+        """Image facts for url, from cache when possible."""
+        now = time.time()
+        with self._lock:
+            cached = self._lru.get(url)
+            if cached and now - cached[0] < self.ttl:
+                self._lru.move_to_end(url)
+                self.stats["lru_hits"] += 1
+                return cached[2]
+
+        etag = self._head_etag(url)
+        if etag:
+            if cached and cached[1] == etag:
+                self._remember(url, etag, cached[2], now)
+                self.stats["lru_hits"] += 1
+                return cached[2]
+            facts = self._disk_get(url, etag)
+            if facts is not None:
+                self._remember(url, etag, facts, now)
+                self.stats["disk_hits"] += 1
+                return facts
+
+        etag, facts = self._fetch(url)
+        self._remember(url, etag, facts, now)
+        if etag:
+            self._disk_put(url, etag, facts, now)
+        return facts
+
+    # --- Fetching ---
+    def _head_etag(self, url):
+        try:
+            response = self.session.head(url, timeout=PREFLIGHT_TIMEOUT, allow_redirects=True)
+        except requests.RequestException:
+            return None
+        return response.headers.get("ETag") if response.ok else None
+
+    def _fetch(self, url):
+        """(etag, facts) from the first bytes of the image, widening the range if needed."""
+        from PIL import Image
+
+        want = PREFLIGHT_RANGE_BYTES
+        while True:
+            self.stats["fetches"] += 1
+            try:
+                response = self.session.get(
+                    url, headers={"Range": f"bytes=0-{want - 1}"}, stream=True,
+                    timeout=PREFLIGHT_TIMEOUT, allow_redirects=True,
+                )
+            except requests.RequestException as e:
+                raise TransientFetchError(str(e))
+            try:
+                if response.status_code >= 500 or response.status_code == 429:
+                    raise TransientFetchError(f"HTTP {response.status_code}")
+                if response.status_code >= 400:
+                    return None, {"error": f"image URL returned HTTP {response.status_code}"}
+                etag = response.headers.get("ETag")
+                # Servers that ignore Range send 200 with the whole file; read only `want`
+                data = response.raw.read(want, decode_content=True)
+                self.stats["bytes"] += len(data)
+            finally:
+                response.close()
+
+            try:
+                with Image.open(io.BytesIO(data)) as img:
+                    return etag, {"format": img.format, "width": img.width, "height": img.height}
+            except (OSError, SyntaxError, ValueError):
+                # Unidentified or truncated header: JPEGs with large EXIF/ICC
+                # blocks put the size marker further in
+                if len(data) >= want and want < PREFLIGHT_MAX_BYTES:
+                    want = min(want * 4, PREFLIGHT_MAX_BYTES)
+                    continue
+                return etag, {"error": "not a readable image"}
+
+    # --- Caches ---
+    def _remember(self, url, etag, facts, now):
+        with self._lock:
+            self._lru[url] = (now, etag, facts)
+            self._lru.move_to_end(url)
+            while len(self._lru) > self._lru_size:
+                self._lru.popitem(last=False)
+
+    def _disk_get(self, url, etag):
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT facts FROM images WHERE url = ? AND etag = ?", (url, etag)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _disk_put(self, url, etag, facts, now):
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO images (url, etag, facts, checked_at) VALUES (?, ?, ?, ?)",
+                (url, etag, json.dumps(facts, separators=(",", ":")), now),
+            )
+            self._db.commit()
+
+_preflight = None
+_preflight_lock = threading.Lock()
+
+def get_preflight():
+    """Process-wide pre-flight checker sharing one session and cache."""
+    global _preflight
+    with _preflight_lock:
+        if _preflight is None:
+            _preflight = ImagePreflight()
+        return _preflight
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--product-type")
+    parser.add_argument("--cache", default=PREFLIGHT_CACHE_PATH, help="disk cache ('' = memory only)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    preflight = ImagePreflight(cache_path=args.cache)
+    for url in args.urls:
+        started = time.perf_counter()
+        result = preflight.check(url, args.product_type)
+        print(f"{'OK  ' if result else 'FAIL'} {url} {result.info} {result.reason} ({(time.perf_counter() - started) * 1000:.0f} ms)")
+    print(preflight.stats)
+
+if __name__ == "__main__":
+    main()
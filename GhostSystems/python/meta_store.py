@@ -0,0 +1,500 @@
+"""
+Append-only product metadata store with a SKU index.
+
+    python meta_store.py migrate                 # import data/meta/*.json (add --remove to delete them)
+    python meta_store.py get SKU
+    python meta_store.py list --prefix my-title_ebook_
+    python meta_store.py compact
+    python meta_store.py export data/meta        # one JSON file per SKU for legacy readers
+
+Records are appended as NDJSON lines to numbered segment files; a newer line
+for a SKU supersedes the older one and a tombstone line deletes it. A SQLite
+index maps each SKU to (segment, offset, length), so a lookup is one indexed
+query plus a slice of the memory-mapped segment. Bulk writes append all lines
+with one write() and update the index in one transaction. Compaction rewrites
+the live records into fresh segments and drops the old ones.
+
+Until the Node forge and price optimizer read the store, util.save_meta keeps
+writing data/meta/<sku>.json next to it (META_LEGACY_JSON), so don't migrate
+with --remove yet. Variants the price optimizer writes as JSON reach the store
+through a re-run of migrate.
+"""
+import os
+import sys
+import json
+import mmap
+import time
+import logging
+import argparse
+import sqlite3
+import threading
+
+try:
+    import fcntl
+except ImportError:  # not on POSIX: single-process use only
+    fcntl = None
+
+# --- Meta Store Config ---
+META_STORE_DIR = os.environ.get("META_STORE_DIR", "data/meta")
+META_SEGMENT_BYTES = int(os.environ.get("META_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+META_FSYNC = os.environ.get("META_FSYNC", "0").strip().lower() in ("1", "true", "yes")
+# util.save_meta also writes <sku>.json into the store directory while the Node
+# forge and price optimizer still glob data/meta/*.json. Set to 0 once they
+# read the store.
+META_LEGACY_JSON = os.environ.get("META_LEGACY_JSON", "1").strip().lower() in ("1", "true", "yes")
+
+TOMBSTONE = "_deleted"
+
+def _encode(meta):
+    return (json.dumps(meta, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+class _FileLock:
+    """Cross-process writer lock (flock on a lock file) plus a thread lock."""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._fd = None
+        self._depth = 0
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+        return False
+
+# ==============================================================================
+# META STORE
+# ==============================================================================
+class MetaStore:
+    """
+    NDJSON segments + SQLite SKU index under `base`.
+
+    The index also records how many bytes of each segment it covers. If a
+    writer died between appending and indexing, the uncovered tail is indexed
+    on the next open (a torn last line is cut off), so the segments stay the
+    source of truth and rebuild_index() can recreate the index from them.
+    """
+
+    def __init__(self, base=META_STORE_DIR, segment_bytes=META_SEGMENT_BYTES, fsync=META_FSYNC):
+        self.base = base
+        self.segment_dir = os.path.join(base, "segments")
+        self.segment_bytes = max(1, segment_bytes)
+        self.fsync = fsync
+        os.makedirs(self.segment_dir, exist_ok=True)
+
+        self._lock = _FileLock(os.path.join(base, ".meta_store.lock"))
+        self._maps = {}  # segment id -> (mmap, mapped size)
+        self._maps_lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(base, "index.sqlite"), check_same_thread=False, isolation_level=None)
+        self._db_lock = threading.Lock()
+        with self._db_lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " sku TEXT PRIMARY KEY, segment INTEGER NOT NULL, offset INTEGER NOT NULL,"
+                " length INTEGER NOT NULL, updated_at REAL NOT NULL) WITHOUT ROWID"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS segments (id INTEGER PRIMARY KEY, indexed_bytes INTEGER NOT NULL)")
+        with self._lock:
+            self._recover()
+
+    # --- Writes ---
+    def put(self, meta):
+        """Store one record (must have 'sku'); returns the SKU."""
+        self.put_many([meta])
+        return meta["sku"]
+
+    def put_many(self, metas, unique=False):
+        """
+        Append records in one write and index them in one transaction.
+        unique=True raises KeyError instead of superseding an existing SKU.
+        Returns the number of records written.
+        """
+        lines = []
+        for meta in metas:
+            sku = meta.get("sku")
+            if not sku:
+                raise ValueError("meta record has no 'sku'")
+            lines.append((sku, _encode(meta), False))
+        if not lines:
+            return 0
+        with self._lock:
+            if unique:
+                taken = self._existing([line[0] for line in lines])
+                if taken or len({line[0] for line in lines}) < len(lines):
+                    raise KeyError(f"SKU(s) already stored: {', '.join(sorted(taken)) or 'duplicate in batch'}")
+            self._append(lines)
+        return len(lines)
+
+    def delete(self, sku):
+        """Tombstone a SKU; returns False if it was not stored."""
+        with self._lock:
+            if not self._existing([sku]):
+                return False
+            self._append([(sku, _encode({"sku": sku, TOMBSTONE: True}), True)])
+        return True
+
+    def _append(self, lines):
+        """Write (sku, data, deleted) lines to the active segment(s) and index them. Caller holds the lock."""
+        segment, size = self._active_segment()
+        now = time.time()
+        chunk, upserts, deletes, sizes = [], [], [], {}
+        for sku, data, deleted in lines:
+            if size > 0 and size + len(data) > self.segment_bytes:
+                if chunk:
+                    self._write(segment, chunk)
+                    sizes[segment] = size
+                segment, size, chunk = segment + 1, 0, []
+            if deleted:
+                deletes.append((sku,))
+            else:
+                upserts.append((sku, segment, size, len(data), now))
+            chunk.append(data)
+            size += len(data)
+        self._write(segment, chunk)
+        sizes[segment] = size
+
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            try:
+                # A batch is all puts or a single delete, so the two never interleave
+                self._db.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)", upserts)
+                self._db.executemany("DELETE FROM records WHERE sku = ?", deletes)
+                self._db.executemany("INSERT OR REPLACE INTO segments VALUES (?, ?)", list(sizes.items()))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _write(self, segment, chunk):
+        with open(self._segment_path(segment), "ab") as f:
+            f.write(b"".join(chunk))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    # --- Reads ---
+    def get(self, sku):
+        with self._db_lock:
+            row = self._db.execute("SELECT segment, offset, length FROM records WHERE sku = ?", (sku,)).fetchone()
+        if row is None:
+            return None
+        try:
+            return json.loads(self._read(*row))
+        except FileNotFoundError:
+            # Compacted away under us: the index now points at the new segment
+            with self._db_lock:
+                row = self._db.execute("SELECT segment, offset, length FROM records WHERE sku = ?", (sku,)).fetchone()
+            return json.loads(self._read(*row)) if row else None
+
+    def get_many(self, skus):
+        """{sku: meta} for the SKUs that exist."""
+        found = {}
+        for sku in skus:
+            meta = self.get(sku)
+            if meta is not None:
+                found[sku] = meta
+        return found
+
+    def __contains__(self, sku):
+        return bool(self._existing([sku]))
+
+    def __len__(self):
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def skus(self, prefix=""):
+        """SKUs in order, optionally those starting with prefix (an index range scan)."""
+        with self._db_lock:
+            if prefix:
+                # Every string with this prefix sorts between prefix and prefix + U+10FFFF
+                rows = self._db.execute(
+                    "SELECT sku FROM records WHERE sku >= ? AND sku < ? ORDER BY sku", (prefix, prefix + "\U0010ffff")
+                ).fetchall()
+            else:
+                rows = self._db.execute("SELECT sku FROM records ORDER BY sku").fetchall()
+        return [r[0] for r in rows]
+
+    def iter_records(self):
+        """Every live record, in storage order (sequential reads of each segment)."""
+        with self._db_lock:
+            rows = self._db.execute("SELECT segment, offset, length FROM records ORDER BY segment, offset").fetchall()
+        for row in rows:
+            yield json.loads(self._read(*row))
+
+    def _read(self, segment, offset, length):
+        end = offset + length
+        with self._maps_lock:
+            entry = self._maps.get(segment)
+            if entry is None or entry[1] < end:
+                # New segment, or the active one grew past what we mapped
+                if entry is not None:
+                    entry[0].close()
+                with open(self._segment_path(segment), "rb") as f:
+                    size = os.fstat(f.fileno()).st_size
+                    entry = (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), size)
+                self._maps[segment] = entry
+            return entry[0][offset:end]
+
+    def _existing(self, skus):
+        found = set()
+        with self._db_lock:
+            for i in range(0, len(skus), 500):
+                part = skus[i:i + 500]
+                found.update(
+                    r[0] for r in self._db.execute(
+                        f"SELECT sku FROM records WHERE sku IN ({','.join('?' * len(part))})", part
+                    )
+                )
+        return found
+
+    # --- Segments, recovery, compaction ---
+    def _segment_path(self, segment):
+        return os.path.join(self.segment_dir, f"{segment:08d}.ndjson")
+
+    def _segment_ids(self):
+        return sorted(int(name.split(".")[0]) for name in os.listdir(self.segment_dir) if name.endswith(".ndjson"))
+
+    def _active_segment(self):
+        ids = self._segment_ids()
+        if not ids:
+            return 1, 0
+        return ids[-1], os.path.getsize(self._segment_path(ids[-1]))
+
+    def _recover(self):
+        """Index whatever segment bytes the index does not cover yet."""
+        with self._db_lock:
+            covered = dict(self._db.execute("SELECT id, indexed_bytes FROM segments").fetchall())
+        for segment in self._segment_ids():
+            path = self._segment_path(segment)
+            size = os.path.getsize(path)
+            start = covered.get(segment, 0)
+            if size > start:
+                self._index_tail(segment, start, size)
+
+    def _index_tail(self, segment, start, size):
+        path = self._segment_path(segment)
+        with open(path, "rb") as f:
+            f.seek(start)
+            tail = f.read(size - start)
+        cut = tail.rfind(b"\n") + 1
+        if cut < len(tail):
+            logging.warning(f"Meta store: dropping {len(tail) - cut} byte(s) of a torn record at the end of {path}.")
+            with open(path, "r+b") as f:
+                f.truncate(start + cut)
+        offset = start
+        ops = []  # in file order, so the last line per SKU wins
+        for line in tail[:cut].splitlines(keepends=True):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logging.warning(f"Meta store: skipping unreadable record at {path}:{offset}.")
+                offset += len(line)
+                continue
+            if record.get(TOMBSTONE):
+                ops.append(("DELETE FROM records WHERE sku = ?", (record["sku"],)))
+            else:
+                ops.append((
+                    "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)",
+                    (record["sku"], segment, offset, len(line), time.time()),
+                ))
+            offset += len(line)
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            for sql, params in ops:
+                self._db.execute(sql, params)
+            self._db.execute("INSERT OR REPLACE INTO segments VALUES (?, ?)", (segment, start + cut))
+            self._db.execute("COMMIT")
+        if ops:
+            logging.info(f"Meta store: indexed {len(ops)} record(s) from {path}.")
+
+    def rebuild_index(self):
+        """Recreate the index from the segments alone."""
+        with self._lock:
+            with self._db_lock:
+                self._db.execute("DELETE FROM records")
+                self._db.execute("DELETE FROM segments")
+            for segment in self._segment_ids():
+                self._index_tail(segment, 0, os.path.getsize(self._segment_path(segment)))
+
+    def compact(self):
+        """
+        Rewrite live records into new segments and delete the old ones.
+        Returns {"records", "bytes_before", "bytes_after"}.
+        """
+        with self._lock:
+            old_ids = self._segment_ids()
+            before = sum(os.path.getsize(self._segment_path(s)) for s in old_ids)
+            with self._db_lock:
+                rows = self._db.execute(
+                    "SELECT sku, segment, offset, length FROM records ORDER BY segment, offset"
+                ).fetchall()
+
+            segment = (old_ids[-1] + 1) if old_ids else 1
+            size, chunk, moved, sizes = 0, [], [], {}
+            for sku, seg, offset, length in rows:
+                data = self._read(seg, offset, length)
+                if size > 0 and size + length > self.segment_bytes:
+                    self._write(segment, chunk)
+                    sizes[segment] = size
+                    segment, size, chunk = segment + 1, 0, []
+                moved.append((segment, size, sku))
+                chunk.append(data)
+                size += length
+            if chunk:
+                self._write(segment, chunk)
+                sizes[segment] = size
+
+            with self._db_lock:
+                self._db.execute("BEGIN")
+                self._db.executemany("UPDATE records SET segment = ?, offset = ? WHERE sku = ?", moved)
+                self._db.executemany("DELETE FROM segments WHERE id = ?", [(s,) for s in old_ids])
+                self._db.executemany("INSERT OR REPLACE INTO segments VALUES (?, ?)", list(sizes.items()))
+                self._db.execute("COMMIT")
+
+            self._close_maps()
+            for s in old_ids:
+                os.remove(self._segment_path(s))
+            with self._db_lock:
+                self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            after = sum(sizes.values())
+        logging.info(f"Meta store compacted: {len(rows)} record(s), {before} -> {after} bytes.")
+        return {"records": len(rows), "bytes_before": before, "bytes_after": after}
+
+    def _close_maps(self):
+        with self._maps_lock:
+            for m, _ in self._maps.values():
+                m.close()
+            self._maps = {}
+
+    def close(self):
+        self._close_maps()
+        with self._db_lock:
+            self._db.close()
+
+# ==============================================================================
+# MIGRATION
+# ==============================================================================
+def migrate_json_dir(store, src=META_STORE_DIR, batch_size=1000, remove=False):
+    """
+    Import legacy one-file-per-SKU JSON (util.save_meta's old output).
+    SKUs already in the store are skipped, so the migration can be re-run.
+    Returns {"imported", "skipped", "failed"}.
+    """
+    stats = {"imported": 0, "skipped": 0, "failed": 0}
+    names = sorted(n for n in os.listdir(src) if n.endswith(".json")) if os.path.isdir(src) else []
+    for i in range(0, len(names), batch_size):
+        batch, paths = [], []
+        for name in names[i:i + batch_size]:
+            path = os.path.join(src, name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.error(f"Skipping unreadable meta file {path}: {e}")
+                stats["failed"] += 1
+                continue
+            meta.setdefault("sku", name[:-len(".json")])
+            batch.append(meta)
+            paths.append(path)
+        existing = store._existing([m["sku"] for m in batch])
+        fresh = [m for m in batch if m["sku"] not in existing]
+        stats["skipped"] += len(batch) - len(fresh)
+        stats["imported"] += store.put_many(fresh)
+        if remove:
+            for path in paths:
+                os.remove(path)
+        logging.info(f"Migrated {min(i + batch_size, len(names))}/{len(names)} meta file(s).")
+    return stats
+
+def write_json(meta, dest):
+    """Write one record as <dest>/<sku>.json (the old layout); returns the path."""
+    os.makedirs(dest, exist_ok=True)
+    path = os.path.join(dest, f"{meta['sku']}.json")
+    tmp = os.path.join(dest, f".{meta['sku']}.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return path
+
+def export_json_dir(store, dest):
+    """Write one pretty-printed JSON file per SKU (the old layout); returns the count."""
+    count = 0
+    for meta in store.iter_records():
+        write_json(meta, dest)
+        count += 1
+    return count
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(base=META_STORE_DIR):
+    """Process-wide store per directory."""
+    with _stores_lock:
+        store = _stores.get(base)
+        if store is None:
+            store = _stores[base] = MetaStore(base)
+        return store
+
+# ==============================================================================
+# CLI
+# ==============================================================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--store", default=META_STORE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="import legacy data/meta/*.json files")
+    migrate.add_argument("--src", help="directory of JSON files (default: the store directory)")
+    migrate.add_argument("--remove", action="store_true", help="delete each file once imported")
+    get = sub.add_parser("get")
+    get.add_argument("sku")
+    listing = sub.add_parser("list")
+    listing.add_argument("--prefix", default="")
+    sub.add_parser("compact")
+    sub.add_parser("stats")
+    sub.add_parser("reindex", help="rebuild the SKU index from the segments")
+    export = sub.add_parser("export", help="write one JSON file per SKU")
+    export.add_argument("dest")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    store = MetaStore(args.store)
+    if args.command == "migrate":
+        print(json.dumps(migrate_json_dir(store, args.src or args.store, remove=args.remove)))
+    elif args.command == "get":
+        meta = store.get(args.sku)
+        if meta is None:
+            print(f"No record for {args.sku}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(meta, ensure_ascii=False, indent=2))
+    elif args.command == "list":
+        for sku in store.skus(args.prefix):
+            print(sku)
+    elif args.command == "compact":
+        print(json.dumps(store.compact()))
+    elif args.command == "reindex":
+        store.rebuild_index()
+        print(f"{len(store)} record(s) indexed")
+    elif args.command == "export":
+        print(f"{export_json_dir(store, args.dest)} file(s) written to {args.dest}")
+    else:
+        ids = store._segment_ids()
+        size = sum(os.path.getsize(store._segment_path(s)) for s in ids)
+        print(json.dumps({"records": len(store), "segments": len(ids), "segment_bytes": size}))
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Printful catalog cache and variant resolver.
+
+    python printful_catalog.py                      # refresh (if stale) and list the index
+    python printful_catalog.py --fixture fixtures/printful_catalog.json
+    python printful_catalog.py --resolve T-Shirt --size XL --color Black
+
+Each product type is configured by one default catalog variant ID. The type's
+catalog product is looked up from that variant, and all of the product's
+variants are indexed by (product type, size, color). Lookups are dict hits;
+the API is only called again when the cache is older than the TTL, and then
+with If-None-Match so unchanged endpoints come back as 304s. That refresh runs
+on a background thread with single-attempt requests, so jobs keep resolving
+from the stale cache instead of waiting out a Printful outage.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+
+import requests
+
+from printful_client import get_client
+
+# --- Catalog Config ---
+# product type -> default catalog variant ID (or {"variant_id": N}). Extend with
+# PRINTFUL_PRODUCT_TYPES='{"Poster": 1234}' instead of redeploying.
+DEFAULT_PRODUCT_TYPES = {
+    "Mug": 7710,     # 11oz White Glossy Mug
+    "T-Shirt": 4017, # Gildan 64000 T-Shirt, White, L
+}
+CATALOG_CACHE_PATH = os.environ.get("PRINTFUL_CATALOG_CACHE", "data/printful_catalog.json")
+CATALOG_TTL_SECONDS = int(os.environ.get("PRINTFUL_CATALOG_TTL_SECONDS", str(24 * 3600)))
+CATALOG_CACHE_VERSION = 1
+
+def product_types_from_env():
+    types = dict(DEFAULT_PRODUCT_TYPES)
+    raw = os.environ.get("PRINTFUL_PRODUCT_TYPES", "").strip()
+    if raw:
+        try:
+            for name, value in json.loads(raw).items():
+                types[name] = int(value["variant_id"] if isinstance(value, dict) else value)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            logging.error(f"Ignoring invalid PRINTFUL_PRODUCT_TYPES: {e}")
+    return types
+
+def norm(value):
+    """Index key form: '11 oz' == '11oz', 'White ' == 'white'."""
+    return "".join(str(value or "").lower().split())
+
+# ==============================================================================
+# CATALOG INDEX
+# ==============================================================================
+class CatalogIndex:
+    """(product type, size, color) -> variant ID, built from the compact cache."""
+
+    def __init__(self):
+        self.variants = {}  # (type, size, color) -> variant_id
+        self.defaults = {}  # type -> (default variant_id, size, color)
+        self.options = {}   # type -> sorted "size / color" labels, for error messages
+        self.uncatalogued = set()  # types with no catalog data yet (default only)
+
+    def add_type(self, product_type, default_variant_id, variants=None):
+        """Index the type's variants; None means no catalog data, so only the default."""
+        self.defaults[product_type] = (default_variant_id, None, None)
+        if variants is None:
+            self.uncatalogued.add(product_type)
+            variants = []
+        labels = []
+        for variant_id, size, color, in_stock in variants:
+            if variant_id == default_variant_id:
+                self.defaults[product_type] = (variant_id, size, color)
+            if not in_stock:
+                continue
+            self.variants[(product_type, norm(size), norm(color))] = variant_id
+            labels.append(f"{size} / {color}")
+        self.options[product_type] = sorted(labels)
+
+    def has_type(self, product_type):
+        return product_type in self.defaults
+
+    def resolve(self, product_type, size=None, color=None):
+        """Variant ID for the type (and size/color if given), or None."""
+        default = self.defaults.get(product_type)
+        if default is None:
+            return None
+        default_id, default_size, default_color = default
+        if (not size and not color) or product_type in self.uncatalogued:
+            # Without a catalog the size/color can't be checked; use the default as before
+            return default_id
+        # A missing half comes from the default variant ("XL" -> white XL tee)
+        key = (product_type, norm(size or default_size), norm(color or default_color))
+        return self.variants.get(key)
+
+# ==============================================================================
+# CATALOG (CACHE + REFRESH)
+# ==============================================================================
+class PrintfulCatalog:
+    """
+    On-disk catalog cache with TTL and ETag revalidation behind a CatalogIndex.
+
+    The cache keeps only what the index needs per endpoint (variant ID, size,
+    color, stock) plus each endpoint's ETag. resolve() never calls the API: a
+    stale cache starts one background refresh and is served until it lands.
+    If a refresh fails the stale cache is kept; with no cache at all, each
+    type resolves to its default variant whatever the size/color.
+    """
+
+    def __init__(self, client=None, path=CATALOG_CACHE_PATH, ttl=CATALOG_TTL_SECONDS, product_types=None):
+        self.client = client
+        self.path = path
+        self.ttl = ttl
+        self.product_types = product_types if product_types is not None else product_types_from_env()
+        self.cache = {"version": CATALOG_CACHE_VERSION, "fetched_at": 0, "endpoints": {}}
+        self.index = CatalogIndex()
+        self._lock = threading.Lock()  # held for the whole refresh
+        self._load()
+        self._build_index()
+
+    # --- Public API ---
+    def has_type(self, product_type):
+        return product_type in self.product_types
+
+    def resolve(self, product_type, size=None, color=None):
+        self.refresh_if_stale(wait=False)
+        return self.index.resolve(product_type, size, color)
+
+    def options(self, product_type):
+        return self.index.options.get(product_type, [])
+
+    def stale(self):
+        return time.time() - self.cache["fetched_at"] >= self.ttl
+
+    def refresh_if_stale(self, wait=True):
+        """
+        Refresh a stale cache. With wait=False (the job path) the refresh runs
+        on a background thread, at most one at a time, and this returns at once.
+        """
+        if not self.stale():
+            return
+        if wait:
+            with self._lock:
+                if self.stale():
+                    self._refresh_or_defer()
+            return
+        if not self._lock.acquire(blocking=False):
+            return  # a refresh is already running
+        if not self.stale():
+            self._lock.release()
+            return
+        threading.Thread(target=self._background_refresh, name="PrintfulCatalog", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            # One attempt per endpoint: no backoff sleeps while Printful is down
+            self._refresh_or_defer(max_retries=0)
+        finally:
+            self._lock.release()
+
+    def _refresh_or_defer(self, max_retries=None):
+        try:
+            self.refresh(max_retries=max_retries)
+        except Exception as e:
+            # Retry after a short while rather than on every job
+            self.cache["fetched_at"] = time.time() - self.ttl + min(self.ttl, 300)
+            logging.error(f"Printful catalog refresh failed; using cached catalog: {e}")
+
+    def refresh(self, max_retries=None):
+        client = self.client or get_client()
+        fetched = not_modified = 0
+        for product_type, variant_id in self.product_types.items():
+            try:
+                variant, cached = self._endpoint(client, f"/products/variant/{variant_id}", self._compact_variant, max_retries)
+                not_modified += cached
+                if variant is None:
+                    continue
+                product, cached = self._endpoint(client, f"/products/{variant['product_id']}", self._compact_product, max_retries)
+                not_modified += cached
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                logging.error(f"Printful has no catalog variant {variant_id} for '{product_type}'.")
+                continue
+            fetched += 1
+        self.cache["fetched_at"] = time.time()
+        self._save()
+        self._build_index()
+        logging.info(f"Printful catalog refreshed: {fetched} product type(s), {not_modified} endpoint(s) not modified.")
+
+    # --- Internals ---
+    def _endpoint(self, client, path, compact, max_retries=None):
+        """(compact data or None, True if revalidated as 304 Not Modified)."""
+        entry = self.cache["endpoints"].get(path)
+        response = client.get_conditional(path, entry and entry.get("etag"), max_retries=max_retries)
+        if response.status_code == 304 and entry:
+            return entry, True
+        data = compact(response.json().get("result") or {})
+        if data is None:
+            logging.error(f"Unexpected Printful catalog response for {path}.")
+            return None, False
+        data["etag"] = response.headers.get("ETag")
+        self.cache["endpoints"][path] = data
+        return data, False
+
+    @staticmethod
+    def _compact_variant(result):
+        variant = result.get("variant") or {}
+        if "product_id" not in variant:
+            return None
+        return {"product_id": variant["product_id"], "size": variant.get("size"), "color": variant.get("color")}
+
+    @staticmethod
+    def _compact_product(result):
+        variants = result.get("variants")
+        if variants is None:
+            return None
+        return {
+            "title": (result.get("product") or {}).get("title", ""),
+            "variants": [
+                [v["id"], v.get("size"), v.get("color"), bool(v.get("in_stock", True))]
+                for v in variants
+            ],
+        }
+
+    def _build_index(self):
+        index = CatalogIndex()
+        endpoints = self.cache["endpoints"]
+        for product_type, variant_id in self.product_types.items():
+            variant = endpoints.get(f"/products/variant/{variant_id}")
+            product = variant and endpoints.get(f"/products/{variant['product_id']}")
+            variants = product["variants"] if product else None
+            index.add_type(product_type, variant_id, variants)
+        self.index = index
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable Printful catalog cache {self.path}: {e}")
+            return
+        if cache.get("version") == CATALOG_CACHE_VERSION:
+            self.cache = cache
+
+    def _save(self):
+        if not self.path:
+            return
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.cache, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog():
+    """Process-wide catalog; loaded from disk once, refreshed when stale."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = PrintfulCatalog()
+        return _catalog
+
+# ==============================================================================
+# CLI
+# ==============================================================================
+class FixtureClient:
+    """Serves recorded catalog responses ({"responses": {path: body}}) in place of the API."""
+
+    def __init__(self, path):
+        with open(path, encoding="utf-8") as f:
+            self.responses = json.load(f)["responses"]
+
+    def get_conditional(self, path, etag=None, max_retries=None):
+        response = requests.Response()
+        body = self.responses.get(path)
+        response.status_code = 200 if body is not None else 404
+        response._content = json.dumps(body or {"code": 404, "result": None}).encode("utf-8")
+        response.raise_for_status()
+        return response
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixture", help="recorded responses to build from instead of the API")
+    parser.add_argument("--cache", default=CATALOG_CACHE_PATH, help="cache file ('' = none)")
+    parser.add_argument("--refresh", action="store_true", help="refresh even if the cache is fresh")
+    parser.add_argument("--resolve", metavar="PRODUCT_TYPE")
+    parser.add_argument("--size")
+    parser.add_argument("--color")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    client = FixtureClient(args.fixture) if args.fixture else None
+    catalog = PrintfulCatalog(client=client, path=args.cache)
+    if args.refresh or args.fixture:
+        catalog.refresh()
+
+    if args.resolve:
+        variant_id = catalog.resolve(args.resolve, args.size, args.color)
+        if variant_id is None:
+            print(f"No variant for {args.resolve} {args.size or ''} {args.color or ''}".rstrip())
+            print(f"Available: {', '.join(catalog.options(args.resolve)) or 'unknown product type'}")
+            sys.exit(1)
+        print(variant_id)
+        return
+
+    catalog.refresh_if_stale()
+    for product_type in sorted(catalog.product_types):
+        options = catalog.options(product_type)
+        default_id, size, color = catalog.index.defaults[product_type]
+        print(f"{product_type}: default {default_id} ({size or '?'} / {color or '?'}), {len(options)} in-stock variant(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from resilience import CircuitBreaker, RetryLater
+
+# --- Printful Client Config ---
+PRINTFUL_API_URL = os.environ.get("PRINTFUL_API_URL", "https://api.printful.com")
+
+# Printful's published limit is 120 calls per 60 seconds per store (leaky
+# bucket). Stay a little under it by default; the burst lets a few jobs go out
+# back to back after an idle period.
+PRINTFUL_RATE_PER_MINUTE = float(os.environ.get("PRINTFUL_RATE_PER_MINUTE", "110"))
+PRINTFUL_BURST = int(os.environ.get("PRINTFUL_BURST", "10"))
+PRINTFUL_CONCURRENCY = int(os.environ.get("PRINTFUL_CONCURRENCY", "8"))
+PRINTFUL_MAX_RETRIES = int(os.environ.get("PRINTFUL_MAX_RETRIES", "4"))
+PRINTFUL_TIMEOUT = float(os.environ.get("PRINTFUL_TIMEOUT", "30"))
+PRINTFUL_BACKOFF_BASE = float(os.environ.get("PRINTFUL_BACKOFF_BASE", "1.0"))
+PRINTFUL_BACKOFF_MAX = float(os.environ.get("PRINTFUL_BACKOFF_MAX", "60"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# ==============================================================================
+# TOKEN BUCKET
+# ==============================================================================
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by the sync and async paths.
+
+    reserve() takes a token and returns how long the caller must wait before
+    using it, so threads can time.sleep() and coroutines can asyncio.sleep()
+    on the same budget. pause() holds every caller back until a deadline,
+    which is how a 429 Retry-After is applied to the whole client.
+    """
+
+    def __init__(self, rate_per_minute=PRINTFUL_RATE_PER_MINUTE, burst=PRINTFUL_BURST):
+        self.rate = max(rate_per_minute, 0.001) / 60.0  # tokens per second
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()  # in the future while paused
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        """Take a token; seconds to wait before using it. Raises RetryLater past max_wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now > self.updated:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+            # Tokens may go negative: each caller queues behind the ones
+            # already waiting instead of all waking at the same instant
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            wait += max(0.0, self.updated - now)
+            if max_wait is not None and wait > max_wait:
+                self.tokens += 1  # not taken after all
+                raise RetryLater("Printful rate budget exhausted", wait)
+            return wait
+
+    def pause(self, seconds):
+        with self._lock:
+            # Nothing accrues until the pause ends; queued callers shift back
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = max(self.updated, time.monotonic() + seconds)
+
+    def acquire(self, max_wait=None):
+        wait = self.reserve(max_wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+def retry_after_seconds(response):
+    """Seconds from a Retry-After header (delta or HTTP date), or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# ==============================================================================
+# PRINTFUL CLIENT
+# ==============================================================================
+class PrintfulClient:
+    """
+    Pooled, rate-limited Printful API client.
+
+    One requests.Session with a keep-alive connection pool is shared by all
+    callers, so jobs reuse TCP+TLS connections instead of opening one each.
+    Every attempt takes a token from the bucket first and passes a circuit
+    breaker that stops calls during an outage. 429 responses pause
+    the whole client for Retry-After (or the X-Ratelimit-Reset hint). 5xx and
+    connection errors back off exponentially with jitter. Other errors raise
+    requests.HTTPError straight away, with .response attached.
+
+    Callers that must not block (job workers) pass max_retries=0 and a small
+    max_wait; they then get RetryLater / CircuitOpenError, or a retryable
+    error per is_retryable(), and can reschedule the work themselves.
+
+    The async methods run requests on the client's own thread pool (one
+    thread per pooled connection) and limit how many are in flight at once
+    with a semaphore, sharing the same session and bucket.
+    """
+
+    def __init__(self, api_key=None, base_url=PRINTFUL_API_URL,
+                 rate_per_minute=PRINTFUL_RATE_PER_MINUTE, burst=PRINTFUL_BURST,
+                 concurrency=PRINTFUL_CONCURRENCY, max_retries=PRINTFUL_MAX_RETRIES,
+                 timeout=PRINTFUL_TIMEOUT):
+        self.api_key = api_key if api_key is not None else os.environ.get("PRINTFUL_API_KEY")
+        self.base_url = base_url.rstrip("/")
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.breaker = CircuitBreaker("printful")
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        if self.api_key:
+            self.session.headers["Authorization"] = f"Bearer {self.api_key}"
+
+        self._semaphores = weakref.WeakKeyDictionary()  # per event loop
+        self._executor = None
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _backoff(self, attempt):
+        # Full jitter: spreads retries from many workers hitting the same outage
+        return random.uniform(0, min(PRINTFUL_BACKOFF_MAX, PRINTFUL_BACKOFF_BASE * (2 ** attempt)))
+
+    def _rate_limit_hint(self, response):
+        # Printful reports the remaining budget; stop before the server says 429
+        if response.headers.get("X-Ratelimit-Remaining") == "0":
+            try:
+                self.bucket.pause(float(response.headers.get("X-Ratelimit-Reset", "0")))
+            except ValueError:
+                pass
+
+    def _attempt(self, method, url, body, headers=None):
+        """One HTTP attempt. Returns (response, retry_delay); retry_delay is None when done."""
+        self.breaker.before_call()  # raises CircuitOpenError while Printful is down
+        try:
+            response = self.session.request(method, url, data=body, headers=headers, timeout=self.timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            self.breaker.record_failure()
+            return e, -1.0
+        except Exception:
+            # Any other failure (ChunkedEncodingError, TooManyRedirects, ...) must
+            # still settle the breaker, or a half-open probe never gets released
+            self.breaker.record_failure()
+            raise
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        self._rate_limit_hint(response)
+        if response.status_code == 429:
+            delay = retry_after_seconds(response)
+            if delay is None:
+                return response, -1.0
+            # The bucket holds back every caller, this retry included
+            logging.warning(f"Printful rate limit hit; pausing requests for {delay:.1f}s (Retry-After).")
+            self.bucket.pause(delay)
+            return response, 0.0
+        if response.status_code in RETRY_STATUSES:
+            return response, -1.0
+        return response, None
+
+    def _finish(self, outcome, raw=False):
+        if isinstance(outcome, Exception):
+            raise outcome
+        outcome.raise_for_status()
+        if raw:
+            return outcome
+        return outcome.json() if outcome.content else {}
+
+    def _next_delay(self, method, path, attempt, outcome, delay, max_retries):
+        if attempt >= max_retries:
+            if max_retries:  # single-attempt callers retry on their own
+                logging.error(f"Printful {method} {path}: max retries exceeded.")
+            return None
+        if delay < 0:
+            delay = self._backoff(attempt)
+        status = outcome if isinstance(outcome, Exception) else f"HTTP {outcome.status_code}"
+        logging.warning(
+            f"Printful {method} {path} failed (Attempt {attempt + 1}/{max_retries + 1}): "
+            f"{status}; retrying in {delay:.1f}s."
+        )
+        return delay
+
+    def _encode(self, payload):
+        # bytes, not str: http.client then sends headers and body in one
+        # write, avoiding a Nagle/delayed-ACK stall on reused connections
+        return json.dumps(payload).encode("utf-8") if payload is not None else None
+
+    def request(self, method, path, payload=None, headers=None, raw=False, max_retries=None, max_wait=None):
+        """JSON body of a 2xx response, or the Response itself with raw=True (e.g. for a 304)."""
+        url = f"{self.base_url}{path}"
+        body = self._encode(payload)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            self.bucket.acquire(max_wait)
+            outcome, delay = self._attempt(method, url, body, headers)
+            if delay is None:
+                break
+            delay = self._next_delay(method, path, attempt, outcome, delay, max_retries)
+            if delay is None:
+                break
+            time.sleep(delay)
+        return self._finish(outcome, raw)
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        sem = self._semaphores.get(loop)
+        if sem is None:
+            sem = self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+        if self._executor is None:
+            # The default executor may have fewer threads than pooled connections
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="Printful")
+        return sem
+
+    async def arequest(self, method, path, payload=None):
+        url = f"{self.base_url}{path}"
+        body = self._encode(payload)
+        sem = self._semaphore()
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire_async()
+            async with sem:
+                outcome, delay = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._attempt, method, url, body
+                )
+            if delay is None:
+                break
+            delay = self._next_delay(method, path, attempt, outcome, delay, self.max_retries)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+        return self._finish(outcome)
+
+    # --- Endpoints ---
+    def get_conditional(self, path, etag=None, max_retries=None):
+        """GET with If-None-Match; the Response (status 304 when etag still matches)."""
+        headers = {"If-None-Match": etag} if etag else None
+        return self.request("GET", path, headers=headers, raw=True, max_retries=max_retries)
+
+    def create_sync_product(self, payload, **kwargs):
+        return self.request("POST", "/store/products", payload, **kwargs)
+
+    async def acreate_sync_product(self, payload):
+        return await self.arequest("POST", "/store/products", payload)
+
+def is_retryable(exc):
+    """True if a failed call may succeed later (outage, rate limit), False if it never will."""
+    if isinstance(exc, (RetryLater, requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(exc, "response", None)
+    return response is not None and response.status_code in RETRY_STATUSES
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Process-wide client, so every job shares one connection pool and rate budget."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = PrintfulClient()
+        return _client
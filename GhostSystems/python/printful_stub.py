@@ -0,0 +1,244 @@
+"""
+Local stub of the Printful products endpoint, plus a load runner.
+
+    python printful_stub.py --requests 300 --mode async --concurrency 8
+    python printful_stub.py --mode naive      # old per-call requests.post
+
+The stub server answers POST /store/products after a configurable latency.
+It enforces its own sliding-window limit, answering 429 with Retry-After. It
+can also inject 5xx errors. With --catalog it also serves the recorded catalog
+GET responses with ETags, answering 304 to a matching If-None-Match. The runner pushes --requests product creates through
+PrintfulClient (sync threads or asyncio) and reports throughput, latency
+percentiles, 429s and TCP connections opened.
+"""
+import json
+import time
+import hashlib
+import random
+import asyncio
+import logging
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from printful_client import PrintfulClient
+
+# ==============================================================================
+# STUB SERVER
+# ==============================================================================
+class StubState:
+    def __init__(self, latency_ms=50.0, rate_limit=0, window=60.0, error_rate=0.0, catalog=None):
+        self.latency = latency_ms / 1000.0
+        self.rate_limit = rate_limit  # accepted requests per window (0 = unlimited)
+        self.window_s = window
+        self.error_rate = error_rate
+        self.catalog = {}  # path -> (etag, body bytes)
+        if catalog:
+            with open(catalog, encoding="utf-8") as f:
+                for path, body in json.load(f)["responses"].items():
+                    data = json.dumps(body).encode("utf-8")
+                    self.catalog[path] = ('"%s"' % hashlib.sha1(data).hexdigest(), data)
+        self.lock = threading.Lock()
+        self.window = deque()  # accepted request times inside the window
+        self.next_id = 1
+        self.counts = {"requests": 0, "created": 0, "rate_limited": 0, "errors": 0, "connections": 0,
+                       "catalog_hits": 0, "not_modified": 0}
+
+    def bump(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def admit(self):
+        """0 if the request fits the limit, else seconds until a slot frees up."""
+        if not self.rate_limit:
+            return 0
+        now = time.monotonic()
+        with self.lock:
+            while self.window and now - self.window[0] >= self.window_s:
+                self.window.popleft()
+            if len(self.window) >= self.rate_limit:
+                return max(1, int(self.window_s - (now - self.window[0]) + 0.999))
+            self.window.append(now)
+            return 0
+
+    def new_id(self):
+        with self.lock:
+            self.next_id += 1
+            return self.next_id - 1
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client pooling is visible
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def setup(self):
+        super().setup()
+        self.server.state.bump("connections")
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        state = self.server.state
+        state.bump("requests")
+        entry = state.catalog.get(self.path)
+        if entry is None:
+            return self._send(404, {"code": 404, "error": {"message": "Not found"}})
+        etag, data = entry
+        if self.headers.get("If-None-Match") == etag:
+            state.bump("not_modified")
+            return self._send(304, b"", {"ETag": etag})
+        state.bump("catalog_hits")
+        self._send(200, data, {"ETag": etag})
+
+    def do_POST(self):
+        state = self.server.state
+        state.bump("requests")
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+
+        if self.path != "/store/products":
+            return self._send(404, {"code": 404, "error": {"message": "Not found"}})
+        retry_after = state.admit()
+        if retry_after:
+            state.bump("rate_limited")
+            return self._send(
+                429,
+                {"code": 429, "error": {"message": "Too Many Requests"}},
+                {"Retry-After": str(retry_after)},
+            )
+        try:
+            payload = json.loads(raw or b"{}")
+            name = payload["sync_product"]["name"]
+        except (ValueError, KeyError, TypeError):
+            return self._send(400, {"code": 400, "error": {"message": "Invalid sync_product"}})
+
+        time.sleep(state.latency)
+        if state.error_rate and random.random() < state.error_rate:
+            state.bump("errors")
+            return self._send(503, {"code": 503, "error": {"message": "Service Unavailable"}})
+
+        state.bump("created")
+        self._send(200, {"code": 200, "result": {"id": state.new_id(), "external_id": "", "name": name}})
+
+def start_stub(host="127.0.0.1", port=0, **state_kwargs):
+    """Start the stub in a daemon thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(**state_kwargs)
+    threading.Thread(target=server.serve_forever, name="PrintfulStub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+# ==============================================================================
+# LOAD RUNNER
+# ==============================================================================
+def sample_payload(i):
+    return {
+        "sync_product": {"name": f"Stub product {i}", "thumbnail": "https://example.com/a.png"},
+        "sync_variants": [{
+            "retail_price": "19.99",
+            "variant_id": 4017,
+            "files": [{"type": "default", "url": "https://example.com/a.png", "options": [], "position": {}}],
+        }],
+        "publish": False,
+    }
+
+def _timed(fn, i):
+    started = time.perf_counter()
+    fn(sample_payload(i))
+    return time.perf_counter() - started
+
+def run_sync(client, n, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(lambda i: _timed(client.create_sync_product, i), range(n)))
+
+def run_async(client, n):
+    async def one(i):
+        started = time.perf_counter()
+        await client.acreate_sync_product(sample_payload(i))
+        return time.perf_counter() - started
+
+    async def all_jobs():
+        return await asyncio.gather(*(one(i) for i in range(n)))
+
+    return asyncio.run(all_jobs())
+
+def run_naive(base_url, n, concurrency):
+    # What post_to_printful used to do: a fresh connection per call
+    def post(payload):
+        r = requests.post(f"{base_url}/store/products", data=json.dumps(payload),
+                          headers={"Content-Type": "application/json"})
+        r.raise_for_status()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(lambda i: _timed(post, i), range(n)))
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--mode", choices=["sync", "async", "naive"], default="async")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="stub response latency")
+    parser.add_argument("--server-limit", type=int, default=0, help="stub requests per window (0 = none)")
+    parser.add_argument("--window", type=float, default=60.0, help="stub rate-limit window, seconds")
+    parser.add_argument("--client-rate", type=float, default=60000.0, help="client token bucket per minute")
+    parser.add_argument("--burst", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 503 responses")
+    parser.add_argument("--catalog", help="recorded catalog fixture to serve on GET")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
+    server, base_url = start_stub(latency_ms=args.latency_ms, rate_limit=args.server_limit,
+                                  window=args.window, error_rate=args.error_rate, catalog=args.catalog)
+    client = PrintfulClient(api_key="stub", base_url=base_url, rate_per_minute=args.client_rate,
+                            burst=args.burst, concurrency=args.concurrency)
+    started = time.perf_counter()
+    try:
+        if args.mode == "sync":
+            latencies = run_sync(client, args.requests, args.concurrency)
+        elif args.mode == "async":
+            latencies = run_async(client, args.requests)
+        else:
+            latencies = run_naive(base_url, args.requests, args.concurrency)
+    finally:
+        elapsed = time.perf_counter() - started
+        client.close()
+        server.shutdown()
+
+    latencies = sorted(latencies)
+    counts = server.state.counts
+    print(json.dumps({
+        "mode": args.mode,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99": round(percentile(latencies, 0.99) * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        },
+        "server": counts,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
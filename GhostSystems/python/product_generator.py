@@ -1,13 +1,25 @@
 import sys
 import os
-import json
 import logging
-import requests
 import time
+import queue
+import random
+import signal
+import socket
+from datetime import datetime, timedelta, timezone
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.api_core.exceptions import FailedPrecondition, NotFound
 from google.cloud.firestore_v1.base_query import FieldFilter
 import threading
+from printful_client import get_client as get_printful_client, is_retryable
+from printful_catalog import get_catalog as get_printful_catalog
+from image_preflight import PREFLIGHT_ENABLED, get_preflight
+from status_writer import StatusWriter
+from resilience import RetryScheduler, backoff_delay
+from dead_letters import JobFailed, dead_letter_record, dead_letter_ref
+from health import HEALTH_ENABLED, METRICS, HealthState, start_health_server
+from sharding import SHARDING_ENABLED, ShardedWatch
 # from flask import Flask # <-- REMOVED
 #
 # NOTE: Shopify integration has been removed and consolidated into GhostSystems/ Node.js service.
@@ -42,37 +54,52 @@ except Exception as e:
     sys.exit(1)
 
 # --- Printful Config ---
-PRINTFUL_API_URL = "https://api.printful.com"
+# Base URL, rate limit, pool size and retries live in printful_client.py.
+# Product types and their variants come from the cached catalog in
+# printful_catalog.py (PRINTFUL_PRODUCT_TYPES adds types without a redeploy).
 PRINTFUL_API_KEY = os.environ.get("PRINTFUL_API_KEY")
-VARIANT_MAP = {
-    "Mug": 7710,    # 11oz White Glossy Mug
-    "T-Shirt": 4017, # Gildan 64000 T-Shirt, White, L
-}
+
+# --- Worker Pool Config ---
+# Jobs run on a fixed set of worker threads fed by a bounded queue. When the
+# queue is full the snapshot callback blocks, which pauses intake from the
+# listener instead of spawning more threads.
+JOB_WORKERS = int(os.environ.get("GHOST_JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.environ.get("GHOST_JOB_QUEUE_SIZE", "32"))
+SHUTDOWN_TIMEOUT = float(os.environ.get("GHOST_SHUTDOWN_TIMEOUT", "120"))
+
+# --- Retry Config ---
+# Outbound failures that may clear up (Printful outage, 5xx, rate limit) do not
+# sleep in the worker: the job goes to a delay queue and the worker moves on.
+# Backoff base/cap and the circuit breaker are configured in resilience.py.
+JOB_MAX_ATTEMPTS = int(os.environ.get("GHOST_JOB_MAX_ATTEMPTS", "8"))
+MAX_INLINE_WAIT = float(os.environ.get("GHOST_MAX_INLINE_WAIT", "2"))  # rate-limit wait a worker may absorb
+
+# --- Job Claim / Lease Config ---
+# A job is claimed by moving it pending -> processing with a precondition on
+# the document's update_time, so only one listener (or one replay after a
+# restart) wins. The claim carries a lease; a job still "processing" after its
+# lease expired is assumed abandoned (crashed worker) and may be reclaimed.
+JOB_LEASE_SECONDS = int(os.environ.get("GHOST_JOB_LEASE_SECONDS", "600"))
+WORKER_ID = os.environ.get("GHOST_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+# --- Backlog Drain Config ---
+# On startup the pending backlog is read page by page (oldest first, optionally
+# highest priority first) and fed through the job pool before the live listener
+# attaches, instead of arriving as one snapshot holding every pending job.
+BACKLOG_DRAIN = os.environ.get("GHOST_BACKLOG_DRAIN", "1").strip().lower() not in ("0", "false", "no")
+BACKLOG_PAGE_SIZE = int(os.environ.get("GHOST_BACKLOG_PAGE_SIZE", "200"))
+JOB_ORDER_FIELD = os.environ.get("GHOST_JOB_ORDER_FIELD", "createdAt").strip()
+JOB_PRIORITY_FIELD = os.environ.get("GHOST_JOB_PRIORITY_FIELD", "").strip()  # e.g. "priority" (higher first)
+
+# --- Sharding Config ---
+# GHOST_SHARDING=1 runs this process as one member of a listener group that
+# splits the pending jobs by hash slot. Slots, heartbeat and the coordination
+# document are configured in sharding.py, which also has the local launcher.
 
 # --- Shopify Config ---
 # REMOVED: Shopify integration has been moved to GhostSystems/src/integrations/shopify-pipeline.ts
 # Digital products are now created via the Node.js unified service using REST Admin API
 
-# ==============================================================================
-# HELPER FUNCTION: PRINTFUL API POST
-# ==============================================================================
-def post_to_printful(url, headers, payload, retries=3, delay=5):
-    """Makes a POST request to the Printful API with exponential backoff."""
-    for i in range(retries):
-        try:
-            response = requests.post(url, headers=headers, data=json.dumps(payload))
-            response.raise_for_status()
-            logging.info(f"Printful API call successful (Attempt {i+1}/{retries}).")
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logging.warning(f"Printful API call failed (Attempt {i+1}/{retries}): {e}")
-            if i < retries - 1:
-                time.sleep(delay)
-                delay *= 2
-            else:
-                logging.error("Max retries exceeded for Printful API.")
-                raise
-
 # ==============================================================================
 # GHOST WORKER 1: CREATE PRINTFUL PRODUCT
 # ==============================================================================
@@ -88,7 +115,7 @@ def create_printful_product(job_doc):
     # 1. Check for Printful API Key
     if not PRINTFUL_API_KEY:
         logging.error("PRINTFUL_API_KEY environment variable not set. Cannot proceed.")
-        return False
+        raise JobFailed("config", "PRINTFUL_API_KEY is not set")
 
     # 2. Get Job Details (Image is required for Printful)
     try:
@@ -96,26 +123,38 @@ def create_printful_product(job_doc):
         image_url = job_data.get("imageUrl")
         if not image_url:
              logging.error(f"Job data {job_doc.id} is missing 'imageUrl'. Printful products require an image.")
-             return False
+             raise JobFailed("invalid_job", "missing 'imageUrl'")
         price = job_data["price"]
         auto_publish = job_data.get("autoPublish", False)
     except KeyError as e:
         logging.error(f"Job data {job_doc.id} is missing required key: {e}.")
-        return False
+        raise JobFailed("invalid_job", f"missing required key {e}")
+
+    # 2b. Image pre-flight: reject unreadable or undersized artwork before the
+    # Printful round trip (a few KB per new image, cached by URL + ETag)
+    if PREFLIGHT_ENABLED:
+        preflight = get_preflight().check(image_url, product_type)
+        if not preflight:
+            logging.error(f"Job {job_doc.id} image failed pre-flight: {preflight.reason} ({image_url})")
+            raise JobFailed("image_preflight", preflight.reason)
 
-    # 3. Find Printful Variant ID
-    variant_id = VARIANT_MAP.get(product_type)
+    # 3. Find Printful Variant ID (cached catalog index, no API call per job)
+    catalog = get_printful_catalog()
+    size, color = job_data.get("size"), job_data.get("color")
+    variant_id = catalog.resolve(product_type, size, color)
     if not variant_id:
-        logging.error(f"Unknown productType: '{product_type}'. No Printful variant ID found in map.")
-        return False
+        if not catalog.has_type(product_type):
+            logging.error(f"Unknown productType: '{product_type}'. No Printful variant ID found in catalog.")
+        else:
+            logging.error(
+                f"No in-stock Printful variant for '{product_type}' size={size!r} color={color!r}. "
+                f"Available: {', '.join(catalog.options(product_type))}"
+            )
+        raise JobFailed("variant_not_found", f"no in-stock variant for size={size!r} color={color!r}")
         
     logging.info(f"Mapping productType '{product_type}' to Printful variant_id {variant_id}.")
     
     # 4. Construct Printful API Payload
-    headers = {
-        "Authorization": f"Bearer {PRINTFUL_API_KEY}",
-        "Content-Type": "application/json"
-    }
     payload = {
         "sync_product": {"name": title, "thumbnail": image_url},
         "sync_variants": [{
@@ -129,21 +168,25 @@ def create_printful_product(job_doc):
     payload["publish"] = auto_publish
     logging.info(f"Auto-Publish set to: {auto_publish}")
 
-    # 5. Send to Printful
-    api_url = f"{PRINTFUL_API_URL}/store/products"
+    # 5. Send to Printful (shared pooled, rate-limited client)
     try:
         logging.info(f"Sending product '{title}' to Printful API...")
-        result = post_to_printful(api_url, headers, payload)
+        # One attempt: retries go through the retry scheduler, not a sleep here
+        with METRICS.stage("printful_call"):
+            result = get_printful_client().create_sync_product(payload, max_retries=0, max_wait=MAX_INLINE_WAIT)
         product_id = result.get("result", {}).get("id")
         product_name = result.get("result", {}).get("name")
         logging.info(f"Successfully created Printful product ID: {product_id}, Name: {product_name}")
         logging.info("Printful will now sync this product to your Shopify store.")
         return True
     except Exception as e:
+        if is_retryable(e):
+            raise
         logging.error(f"Failed to create Printful product: {e}")
         if hasattr(e, 'response') and e.response is not None:
             logging.error(f"API Response: {e.response.text}")
-        return False
+            raise JobFailed("printful_rejected", e.response.text or str(e), e.response.status_code) from e
+        raise
 
 # ==============================================================================
 # GHOST WORKER 2: CREATE DIGITAL PRODUCT (REMOVED)
@@ -159,69 +202,423 @@ def create_printful_product(job_doc):
 #   2. Nexus listener moves to status: "draft"
 #   3. Shopify pipeline publishes to Shopify with status: "published"
 
+# ==============================================================================
+# JOB CLAIMING (LEASES)
+# ==============================================================================
+def lease_expired(job_data, now=None):
+    expires = job_data.get("leaseExpiresAt")
+    return expires is None or expires <= (now or datetime.now(timezone.utc))
+
+def claim_job(job_doc, replay=False):
+    """
+    Atomically claim a job for this worker.
+
+    Returns the claim's update_time (the precondition for our final status
+    write), or None if the job is not claimable or another worker got there
+    first. Pending jobs and processing jobs with an expired lease are claimable,
+    and failed jobs too when replaying dead letters.
+    """
+    job_data = job_doc.to_dict() or {}
+    status = job_data.get("status")
+    now = datetime.now(timezone.utc)
+    if status == "processing" and lease_expired(job_data, now):
+        logging.warning(f"Reclaiming job {job_doc.id}: lease held by {job_data.get('claimedBy')} expired.")
+    elif status == "failed" and replay:
+        logging.info(f"Replaying failed job {job_doc.id} ({job_data.get('errorClass')}).")
+    elif status != "pending":
+        return None
+
+    try:
+        # Fails if the document changed since this snapshot, i.e. someone else
+        # claimed (or finished) it in between
+        result = job_doc.reference.update(
+            {
+                "status": "processing",
+                "claimedBy": WORKER_ID,
+                "claimedAt": firestore.SERVER_TIMESTAMP,
+                "leaseExpiresAt": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                "claimCount": firestore.Increment(1),
+            },
+            option=db.write_option(last_update_time=job_doc.update_time),
+        )
+    except (FailedPrecondition, NotFound):
+        return None
+    return result.update_time
+
+# Set by start_listener(): final statuses are coalesced into BulkWriter flushes
+# instead of one blocking update RPC per job. The claim stays a synchronous
+# write because its outcome decides whether the job runs at all.
+status_writer = None
+
+def finish_job(job_ref, status, claim_time, fields=None):
+    """Record the final status, only if our claim is still the latest write."""
+    fields = {"status": status, "finishedAt": firestore.SERVER_TIMESTAMP, **(fields or {})}
+    if status_writer is not None:
+        status_writer.update(job_ref, fields, last_update_time=claim_time)
+        return True
+    try:
+        with METRICS.stage("status_write"):
+            job_ref.update(fields, option=db.write_option(last_update_time=claim_time))
+        return True
+    except (FailedPrecondition, NotFound):
+        logging.warning(f"Lease on job {job_ref.id} was lost before it finished; status '{status}' not recorded.")
+        return False
+
+def record_dead_letter(job_doc, failure, attempts):
+    """Upsert the job's dead letter; returns the fields to add to its 'failed' status."""
+    record = dead_letter_record(job_doc, failure, attempts, WORKER_ID)
+    ref = dead_letter_ref(db, job_doc.reference)
+    try:
+        if status_writer is not None:
+            status_writer.set(ref, record)
+        else:
+            ref.set(record, merge=True)
+    except Exception as e:
+        logging.error(f"Could not record dead letter for job {job_doc.id}: {e}")
+    return {"errorClass": record["errorClass"], "error": record["message"]}
+
+def clear_dead_letter(job_doc):
+    """After a success: drop the dead letter left by an earlier failure, if any."""
+    if not (job_doc.to_dict() or {}).get("errorClass"):
+        return {}
+    ref = dead_letter_ref(db, job_doc.reference)
+    try:
+        if status_writer is not None:
+            status_writer.delete(ref)
+        else:
+            ref.delete()
+    except Exception as e:
+        logging.error(f"Could not delete dead letter for job {job_doc.id}: {e}")
+    return {"errorClass": firestore.DELETE_FIELD, "error": firestore.DELETE_FIELD}
+
+def extend_lease(job_ref, claim_time, seconds):
+    """Push our lease out by `seconds`; the new claim time, or None if the lease was lost."""
+    try:
+        result = job_ref.update(
+            {"leaseExpiresAt": datetime.now(timezone.utc) + timedelta(seconds=seconds + JOB_LEASE_SECONDS)},
+            option=db.write_option(last_update_time=claim_time),
+        )
+    except (FailedPrecondition, NotFound):
+        return None
+    return result.update_time
+
+# Set by start_listener(): retries wait here instead of in a sleeping worker
+retry_scheduler = None
+
+def schedule_retry(job_doc, claim_time, attempt, error):
+    """Re-enqueue the job after a backoff. False if it cannot be retried."""
+    if retry_scheduler is None or attempt + 1 >= JOB_MAX_ATTEMPTS:
+        return False
+    delay = backoff_delay(attempt)
+    hint = getattr(error, "retry_after", None)
+    if hint:
+        # Circuit cooldown / rate-limit wait, spread so jobs do not return together
+        delay = max(delay, hint * random.uniform(1.0, 1.5))
+    try:
+        # Keep the job ours while it waits, so the expired-lease sweep leaves it alone
+        new_claim = extend_lease(job_doc.reference, claim_time, delay)
+    except Exception as e:
+        logging.error(f"Could not extend lease on job {job_doc.id} for retry: {e}")
+        return False
+    if new_claim is None:
+        logging.warning(f"Lease on job {job_doc.id} was lost; not retrying.")
+        return True  # someone else owns it now; record nothing
+    retry_scheduler.schedule(delay, job_doc, new_claim, attempt + 1)
+    logging.warning(
+        f"Job {job_doc.id} attempt {attempt + 1}/{JOB_MAX_ATTEMPTS} failed ({error}); retrying in {delay:.0f}s."
+    )
+    return True
+
+def reclaim_expired_jobs(pool, owns=None):
+    """Resubmit jobs stuck in 'processing' whose lease has run out (only those `owns` accepts, if given)."""
+    now = datetime.now(timezone.utc)
+    # Needs a composite index (status, leaseExpiresAt) on the 'jobs' collection group
+    query = (
+        db.collection_group('jobs')
+        .where(filter=FieldFilter('status', '==', 'processing'))
+        .where(filter=FieldFilter('leaseExpiresAt', '<', now))
+    )
+    count = 0
+    for job_doc in query.stream():
+        if owns is not None and not owns(job_doc):
+            continue
+        if pool.submit(job_doc):
+            count += 1
+    if count:
+        logging.info(f"Resubmitted {count} job(s) with expired leases.")
+
 # ==============================================================================
 # MAIN EXECUTION: JOB ROUTER
 # ==============================================================================
-def process_job(job_doc):
+def process_job(job_doc, claim_time=None, attempt=0, replay=False):
     """
     This function is called by the listener every time a new job is received.
-    It routes the job to the correct worker.
+    It routes the job to the correct worker. Retries come back through here
+    with the claim they already hold and the attempt number; dead-letter
+    replays (dead_letters.py) with replay=True and the attempts already used.
     """
     job_id = job_doc.id
     job_data = job_doc.to_dict()
     product_type = job_data.get("productType")
 
-    logging.info(f"--- JOB RECEIVED: {job_id} ---")
-    logging.info(f"Routing job for product type: '{product_type}'")
-
-    # Update job status to "processing"
     job_ref = job_doc.reference
-    try:
-        job_ref.update({"status": "processing"})
-    except Exception as e:
-        logging.error(f"Failed to update job status to processing for {job_id}: {e}")
-        # Don't stop, proceed to process anyway
+    if claim_time is None:
+        logging.info(f"--- JOB RECEIVED: {job_id} ---")
+
+        # Claim the job ("pending" -> "processing" under our lease). Replays after
+        # a restart and other listener instances lose the claim and stop here,
+        # before any Printful call is made.
+        try:
+            with METRICS.stage("claim"):
+                claim_time = claim_job(job_doc, replay)
+        except Exception as e:
+            METRICS.count("claims", outcome="error")
+            logging.error(f"Failed to claim job {job_id}: {e}")
+            return
+        if claim_time is None:
+            METRICS.count("claims", outcome="lost")
+            logging.info(f"Job {job_id} already claimed or no longer pending; skipping.")
+            return
+        METRICS.count("claims", outcome="won")
+    else:
+        logging.info(f"--- JOB RETRY: {job_id} (attempt {attempt + 1}/{JOB_MAX_ATTEMPTS}) ---")
+
+    logging.info(f"Routing job for product type: '{product_type}'")
 
     # --- JOB ROUTING LOGIC ---
     success = False
+    failure = None
+    route = "unknown"
     try:
-        if product_type in ("T-Shirt", "Mug"):
+        if get_printful_catalog().has_type(product_type):
+            route = "printful"
             success = create_printful_product(job_doc)
             
         elif product_type == "AI Prompt Package":
+            route = "digital"
             # REMOVED: Digital products are now handled by GhostSystems Node.js service
             # See: GhostSystems/src/integrations/shopify-pipeline.ts
             logging.warning(f"Product type '{product_type}' is no longer handled by Python script.")
             logging.info("Digital products should be created via the unified Node.js service in GhostSystems/")
             logging.info("The Shopify pipeline will automatically publish products with status: 'draft'")
             success = False # Mark as failed so it can be routed to Node.js service
+            failure = JobFailed("unsupported_product_type", f"'{product_type}' is handled by the Node.js service")
             
         elif product_type == "Tech Gadget":
+            route = "unsupported"
             logging.warning(f"Product type '{product_type}' is not yet supported. Job will be marked as 'failed'.")
             success = False # Mark as failed so it can be reviewed
+            failure = JobFailed("unsupported_product_type", f"'{product_type}' is not yet supported")
             
         else:
             logging.error(f"Unknown productType: '{product_type}'. No route found for this job.")
             success = False
+            failure = JobFailed("unsupported_product_type", f"no route for productType '{product_type}'")
 
+    except JobFailed as e:
+        failure = e  # already logged where it was raised
+        success = False
     except Exception as e:
-        logging.error(f"--- UNHANDLED EXCEPTION processing job {job_id}: {e} ---")
+        if is_retryable(e):
+            if schedule_retry(job_doc, claim_time, attempt, e):
+                METRICS.count("jobs", route=route, outcome="retry")
+                return  # worker released; the scheduler re-enqueues the job when due
+            logging.error(f"Job {job_id} still failing after {attempt + 1} attempt(s): {e}")
+        else:
+            logging.error(f"--- UNHANDLED EXCEPTION processing job {job_id}: {e} ---")
+        failure = e
         success = False
     
     # 4. Final log and status update
+    METRICS.count("jobs", route=route, outcome="success" if success else "failure")
     if success:
         logging.info(f"--- JOB {job_id} FINISHED: SUCCESS ---")
-        job_ref.update({"status": "complete"})
+        finish_job(job_ref, "complete", claim_time, clear_dead_letter(job_doc))
     else:
         logging.error(f"--- JOB {job_id} FINISHED: FAILED ---")
-        job_ref.update({"status": "failed"})
+        if failure is None:
+            failure = JobFailed("unknown", "job reported failure without a reason")
+        finish_job(job_ref, "failed", claim_time, record_dead_letter(job_doc, failure, attempt + 1))
+
+# ==============================================================================
+# JOB POOL: FIXED WORKERS + BOUNDED QUEUE
+# ==============================================================================
+class JobPool:
+    """
+    Fixed number of worker threads pulling job documents from a bounded queue.
+
+    submit() blocks while the queue is full (backpressure on the listener) and
+    ignores a job that is already queued or running, so a listener resync that
+    re-delivers pending jobs does not process them twice. shutdown() stops
+    intake, lets queued and in-flight jobs finish, then joins the workers.
+    """
+
+    _STOP = object()
+
+    def __init__(self, handler, workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE):
+        self.handler = handler
+        self.jobs = queue.Queue(maxsize=max(1, queue_size))
+        self.closed = threading.Event()
+        self._lock = threading.Lock()
+        self._active = set()  # paths of jobs queued or running
+        self._busy = 0  # workers inside the handler right now
+        self._threads = [
+            threading.Thread(target=self._work, name=f"JobWorker-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, job_doc, *args):
+        """Queue handler(job_doc, *args); blocks while the queue is full."""
+        # Job ids are only unique under their parent document; the collection
+        # group spans every user, so jobs are told apart by full path
+        key = job_doc.reference.path
+        with self._lock:
+            if self.closed.is_set():
+                logging.warning(f"Pool is shutting down; job {job_doc.id} left pending.")
+                return False
+            if key in self._active:
+                logging.info(f"Job {key} is already queued or running; skipping.")
+                return False
+            self._active.add(key)
+
+        # Short timeouts so a full queue does not block shutdown forever
+        while True:
+            try:
+                self.jobs.put((job_doc, args), timeout=1)
+                return True
+            except queue.Full:
+                if self.closed.is_set():
+                    with self._lock:
+                        self._active.discard(key)
+                    logging.warning(f"Pool closed while job {job_doc.id} waited for a slot; left pending.")
+                    return False
+
+    def _work(self):
+        while True:
+            item = self.jobs.get()
+            if item is self._STOP:
+                self.jobs.task_done()
+                return
+            job_doc, args = item
+            with self._lock:
+                self._busy += 1
+            try:
+                self.handler(job_doc, *args)
+            except Exception as e:
+                logging.error(f"Worker crashed on job {job_doc.id}: {e}")
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._active.discard(job_doc.reference.path)
+                self.jobs.task_done()
+
+    def stats(self):
+        with self._lock:
+            active, busy = len(self._active), self._busy
+        return {"queued": self.jobs.qsize(), "active": active, "busy": busy, "workers": len(self._threads)}
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """Stop intake, drain queued and in-flight jobs, then stop the workers."""
+        self.closed.set()
+        deadline = time.monotonic() + timeout
+        for _ in self._threads:
+            # Sentinels queue behind real jobs, so everything queued still runs
+            self.jobs.put(self._STOP)
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        alive = sum(t.is_alive() for t in self._threads)
+        if alive:
+            logging.warning(f"{alive} worker(s) still busy after {timeout}s; exiting anyway.")
+        else:
+            logging.info("Job pool drained.")
+
+# ==============================================================================
+# STARTUP BACKLOG DRAIN
+# ==============================================================================
+def backlog_query(jobs_query):
+    """Pending jobs in drain order. Each ordering needs a composite index with status."""
+    query = jobs_query
+    if JOB_PRIORITY_FIELD:
+        query = query.order_by(JOB_PRIORITY_FIELD, direction="DESCENDING")
+    if JOB_ORDER_FIELD and JOB_ORDER_FIELD != "__name__":
+        query = query.order_by(JOB_ORDER_FIELD)
+    # Tie-break on the document path so the cursor is unique
+    return query.order_by("__name__")
+
+def drain_backlog(jobs_query, pool, page_size=BACKLOG_PAGE_SIZE):
+    """
+    Submit the pending backlog to the pool one cursor-paginated page at a time.
+
+    Only one page is held in memory and pool.submit() blocks while the queue is
+    full, so startup memory does not grow with the backlog. Jobs without the
+    ordering field(s) are left out of the ordered query; the live listener
+    picks them up afterwards. Returns the number of jobs submitted.
+    """
+    query = backlog_query(jobs_query)
+    cursor = None
+    submitted = 0
+    pages = 0
+    while not shutdown_event.is_set():
+        page_query = query.start_after(cursor) if cursor is not None else query
+        page = list(page_query.limit(page_size).stream())
+        if not page:
+            break
+        pages += 1
+        health.heartbeat()  # a long drain is still progress
+        for job_doc in page:
+            if shutdown_event.is_set():
+                break
+            if pool.submit(job_doc):
+                submitted += 1
+        cursor = page[-1]
+        if len(page) < page_size:
+            break
+    logging.info(f"Backlog drain finished: {submitted} job(s) submitted from {pages} page(s).")
+    return submitted
 
 # ==============================================================================
 # FIRESTORE LISTENER (THREAD)
 # ==============================================================================
+shutdown_event = threading.Event()
+
+# Liveness = the listener loop below keeps ticking; readiness = the snapshot
+# watch is attached and a (cached) Firestore read succeeds
+health = HealthState(probe=lambda: db.collection("_health").document("probe").get(timeout=5))
+
+def start_workers():
+    """Job pool plus the status writer and retry scheduler its jobs go through."""
+    global status_writer, retry_scheduler
+    status_writer = StatusWriter(db)
+    pool = JobPool(process_job)
+    retry_scheduler = RetryScheduler(pool.submit)
+    logging.info(f"Job pool ready: {JOB_WORKERS} worker(s), queue size {JOB_QUEUE_SIZE}.")
+
+    # Read at scrape time only
+    METRICS.gauge("job_queue_depth", "Jobs waiting in the pool queue.", lambda: pool.stats()["queued"])
+    METRICS.gauge("jobs_in_flight", "Workers running a job right now.", lambda: pool.stats()["busy"])
+    METRICS.gauge("job_workers", "Worker threads in the pool.", lambda: pool.stats()["workers"])
+    METRICS.gauge("retries_waiting", "Jobs waiting in the retry delay queue.", lambda: len(retry_scheduler))
+    METRICS.gauge("status_writes_pending", "Status writes waiting for the next flush.", lambda: len(status_writer))
+    METRICS.gauge(
+        "printful_circuit_state", "1 for the Printful circuit breaker's current state.",
+        lambda: {(("state", get_printful_client().breaker.stats()["state"]),): 1},
+    )
+    return pool
+
+def stop_workers(pool):
+    waiting = retry_scheduler.close()
+    if waiting:
+        # Still "processing" under our lease; the sweep reclaims them once it expires
+        logging.warning(f"{waiting} scheduled retries were not yet due; they are reclaimed once their lease expires.")
+    pool.shutdown()
+    status_writer.close()
+
 # This function will run in a background thread
 def start_listener():
     logging.info("Initializing Firestore listener in background thread...")
+    pool = start_workers()
     
     # We listen to *all* jobs from *all* users with status "pending"
     # This requires a Composite Index in Firebase. The log will tell you the URL to create it.
@@ -237,19 +634,59 @@ def start_listener():
             for change in changes:
                 if change.type.name == 'ADDED':
                     logging.info(f"New pending job detected: {change.document.id}")
-                    # Run the job processing in a new thread so we don't block the listener
-                    job_thread = threading.Thread(target=process_job, args=(change.document,))
-                    job_thread.start()
+                    # Blocks while the queue is full, so a burst of pending jobs
+                    # holds the listener back instead of piling up threads
+                    pool.submit(change.document)
             callback_done.set() # Signal that the snapshot is processed
 
+        # Sharded mode: this process is one member of a listener group and only
+        # watches, drains and sweeps the jobs in the slots it owns. Membership
+        # heartbeats and rebalancing run on their own thread (sharding.py).
+        sharded = ShardedWatch(db, WORKER_ID, jobs_query, on_snapshot) if SHARDING_ENABLED else None
+        if sharded:
+            sharded.join()
+
+        # Drain what is already pending before attaching the listener. By the
+        # time the drain ends, every job before the cursor is claimed or sitting
+        # in the bounded pool queue, so the listener's first snapshot only holds
+        # those (skipped by the pool as already queued; claims are idempotent)
+        # plus jobs created during the drain. Nothing is dropped: the live query
+        # is the full pending set.
+        if BACKLOG_DRAIN:
+            logging.info(
+                f"Draining pending backlog (page size {BACKLOG_PAGE_SIZE}, "
+                f"order: {JOB_PRIORITY_FIELD + ' desc, ' if JOB_PRIORITY_FIELD else ''}{JOB_ORDER_FIELD or '__name__'})..."
+            )
+            # Sharded: needs a composite index (status, shard, ordering fields)
+            for query in (sharded.queries() if sharded else [jobs_query]):
+                drain_backlog(query, pool)
+
         # Start the listener
-        query_watch = jobs_query.on_snapshot(on_snapshot)
+        if sharded:
+            sharded.attach()
+            query_watch = sharded
+        else:
+            query_watch = jobs_query.on_snapshot(on_snapshot)
+        health.set_attached(True)
         logging.info("📡 Ghost listener is online and watching for 'pending' jobs.")
         
-        # Keep the main thread alive
-        while True:
-            time.sleep(60) # Keep the process alive
-            
+        # Keep the listener thread alive until a shutdown signal
+        while not shutdown_event.wait(60):
+            health.heartbeat()
+            logging.info(
+                f"Job pool: {pool.stats()} | retries waiting: {len(retry_scheduler)} | "
+                f"printful circuit: {get_printful_client().breaker.stats()}"
+            )
+            try:
+                reclaim_expired_jobs(pool, sharded.owns if sharded else None)
+            except Exception as e:
+                logging.error(f"Expired-lease sweep failed: {e}")
+
+        logging.info("Shutdown requested: closing listener and draining job pool...")
+        health.set_attached(False)
+        query_watch.unsubscribe()
+        stop_workers(pool)
+
     except Exception as e:
         logging.critical(f"Listener query failed: {e}")
         logging.critical("This likely requires a new Firebase Composite Index.")
@@ -261,6 +698,7 @@ def start_listener():
 # FLASK WEB SERVER (MAIN THREAD)
 # ==============================================================================
 # This is what Render will see as the "Web Service"
+# Superseded by the stdlib endpoint in health.py (/healthz, /readyz, /metrics)
 # app = Flask(__name__) <-- REMOVED
 
 # @app.route('/') <-- REMOVED
@@ -269,13 +707,30 @@ def start_listener():
 #    logging.info("Health check endpoint '/' was pinged.") <-- REMOVED
 #    return 'Ghost Listener is active and listening to Firebase in the background.', 200 <-- REMOVED
 
+def handle_shutdown(signum, frame):
+    logging.info(f"Received signal {signum}; shutting down gracefully.")
+    shutdown_event.set()
+
 def main():
+    # SIGTERM is what Render sends on deploy/stop; drain in-flight jobs first
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    signal.signal(signal.SIGINT, handle_shutdown)
+
+    # Replaces the old Flask health check: probes and Prometheus metrics
+    if HEALTH_ENABLED:
+        try:
+            start_health_server(health)
+        except OSError as e:
+            logging.error(f"Health endpoint not started: {e}")
+
     # Start the Firestore listener in a separate, non-daemon thread
     listener_thread = threading.Thread(target=start_listener, name="FirestoreListener")
     listener_thread.start()
     
-    # Keep the main thread alive so the listener thread can run
-    listener_thread.join()
+    # Keep the main thread alive so the listener thread can run. join() with a
+    # timeout keeps the main thread responsive to signals.
+    while listener_thread.is_alive():
+        listener_thread.join(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,160 @@
+import os
+import time
+import heapq
+import random
+import logging
+import itertools
+import threading
+
+# --- Retry / Circuit Breaker Config ---
+RETRY_BASE_SECONDS = float(os.environ.get("GHOST_RETRY_BASE_SECONDS", "5"))
+RETRY_MAX_SECONDS = float(os.environ.get("GHOST_RETRY_MAX_SECONDS", "300"))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("GHOST_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("GHOST_BREAKER_RESET_SECONDS", "30"))
+BREAKER_MAX_RESET_SECONDS = float(os.environ.get("GHOST_BREAKER_MAX_RESET_SECONDS", "300"))
+
+class RetryLater(Exception):
+    """The call was not made (or should not be repeated yet); try again in retry_after seconds."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitOpenError(RetryLater):
+    pass
+
+def backoff_delay(attempt, base=RETRY_BASE_SECONDS, cap=RETRY_MAX_SECONDS):
+    """Exponential backoff with jitter: uniform in [d/2, d], d = min(cap, base * 2**attempt)."""
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+# ==============================================================================
+# CIRCUIT BREAKER
+# ==============================================================================
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures. While open,
+    before_call() raises CircuitOpenError without touching the network. Once
+    the reset timeout passes, a single probe call is let through (half-open):
+    success closes the circuit, failure reopens it with the timeout doubled
+    (up to max_reset_timeout).
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout=BREAKER_RESET_SECONDS, max_reset_timeout=BREAKER_MAX_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+                logging.info(f"Circuit '{self.name}' half-open: sending a probe request.")
+                return
+            self.rejected += 1
+            # Half-open with a probe in flight: others wait a short while
+            retry_after = remaining if remaining > 0 else min(self.base_reset_timeout, 5.0)
+            raise CircuitOpenError(f"circuit '{self.name}' is open", retry_after)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info(f"Circuit '{self.name}' closed: probe succeeded.")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+                self._open()
+            elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        logging.warning(
+            f"Circuit '{self.name}' open after {self.failures} consecutive failure(s); "
+            f"next probe in {self.reset_timeout:.0f}s."
+        )
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+# ==============================================================================
+# RETRY SCHEDULER (DELAY QUEUE)
+# ==============================================================================
+class RetryScheduler:
+    """
+    Heap of (due time, item) drained by one thread that hands each item to
+    `submit` when it falls due. Workers schedule a retry and return
+    immediately instead of sleeping through the backoff.
+    """
+
+    def __init__(self, submit, name="RetryScheduler"):
+        self.submit = submit
+        self._heap = []
+        self._seq = itertools.count()  # FIFO among equal due times; items never compared
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap)
+
+    def schedule(self, delay, *item):
+        with self._cond:
+            if self._closed:
+                return False
+            heapq.heappush(self._heap, (time.monotonic() + max(0.0, delay), next(self._seq), item))
+            # Wake the thread only if this became the earliest entry
+            if self._heap[0][2] is item:
+                self._cond.notify()
+            return True
+
+    def close(self):
+        """Stop the thread; returns the number of retries left unscheduled."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        return len(self._heap)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._heap:
+                        wait = self._heap[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+                _, _, item = heapq.heappop(self._heap)
+            try:
+                # May block on a full job queue: that is the backpressure we want
+                self.submit(*item)
+            except Exception as e:
+                logging.error(f"Retry submission failed: {e}")
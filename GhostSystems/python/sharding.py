@@ -0,0 +1,418 @@
+"""
+Hash-partitioned job listeners, so that several product_generator.py processes split the pending jobs between them.
+
+    GHOST_SHARDING=1 python product_generator.py    # join the listener group (any host)
+    python sharding.py --processes 4                # local launcher: 4 sharded listeners on this host
+    python sharding.py --status                     # live members and their slots
+
+Every job belongs to one of SHARD_SLOTS fixed slots, stored in the job's
+SHARD_FIELD. Producers should set it when they create the job, using
+job_shard(job_id). That is a hash of the document id, so every language
+gets the same answer. The group leader stamps the field on pending jobs that
+arrive without it. Firestore cannot query for a missing field, so that
+stamping watch is not sharded: the leader reads every pending job.
+
+Members register and heartbeat in one coordination document
+(SHARD_COLLECTION/SHARD_GROUP). On each heartbeat every member reads that
+document back. All members see the same live-member list and compute the
+same slot assignment from it by rendezvous hashing, so no coordinator is
+needed. A member joining or leaving moves only its share of the slots. Each
+member watches "pending" jobs in its own slots only. When its slots change,
+it swaps its watches.
+
+During a rebalance two members may briefly watch the same slot. The claim
+precondition in product_generator.py still lets only one of them run a job.
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import hashlib
+import logging
+import argparse
+import threading
+import subprocess
+from datetime import timedelta
+
+from firebase_admin import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from resilience import backoff_delay
+
+# --- Sharding Config ---
+SHARDING_ENABLED = os.environ.get("GHOST_SHARDING", "0").strip().lower() in ("1", "true", "yes")
+SHARD_SLOTS = int(os.environ.get("GHOST_SHARD_SLOTS", "64"))  # fixed for the life of the group
+SHARD_FIELD = os.environ.get("GHOST_SHARD_FIELD", "shard")
+SHARD_COLLECTION = os.environ.get("GHOST_SHARD_COLLECTION", "_coordination")
+SHARD_GROUP = os.environ.get("GHOST_SHARD_GROUP", "job_listeners")  # coordination document id
+SHARD_HEARTBEAT_SECONDS = float(os.environ.get("GHOST_SHARD_HEARTBEAT_SECONDS", "10"))
+SHARD_MEMBER_TTL_SECONDS = float(os.environ.get("GHOST_SHARD_MEMBER_TTL_SECONDS", "30"))
+# The stamper watches every pending job, stamped or not (Firestore cannot
+# query for a missing field), so the leader reads each job once more than
+# the others. Turn it off once all producers set the shard field.
+SHARD_STAMP = os.environ.get("GHOST_SHARD_STAMP", "1").strip().lower() not in ("0", "false", "no")
+SHARD_PRUNE_AFTER = 10  # member TTLs before the leader deletes a dead member's entry
+MAX_IN_VALUES = 30  # Firestore limit on values in one 'in' filter
+
+class ShardConfigError(RuntimeError):
+    """This process and the coordination document disagree on the slot count."""
+
+def job_shard(job_id, slots=SHARD_SLOTS):
+    """Slot of a job: first 8 bytes of sha1(document id), big-endian, modulo the slot count."""
+    return int.from_bytes(hashlib.sha1(job_id.encode("utf-8")).digest()[:8], "big") % slots
+
+def job_slot(job_doc, slots=SHARD_SLOTS):
+    """Slot stored on the job, or the one it would be stamped with."""
+    slot = (job_doc.to_dict() or {}).get(SHARD_FIELD)
+    return slot if isinstance(slot, int) else job_shard(job_doc.id, slots)
+
+def member_key(worker_id):
+    """
+    Worker id as a plain map key in the coordination document: its sha1 hex,
+    so distinct ids never share a key (the id itself is kept as workerId).
+    """
+    return hashlib.sha1(worker_id.encode("utf-8")).hexdigest()
+
+def assign_slots(members, slots=SHARD_SLOTS):
+    """
+    {member: [slot, ...]} by rendezvous hashing. Each slot goes to the member
+    with the highest sha1(member:slot), so only the slots of a member that
+    joins or leaves change hands.
+    """
+    owners = {member: [] for member in members}
+    if owners:
+        for slot in range(slots):
+            owners[max(owners, key=lambda m: hashlib.sha1(f"{m}:{slot}".encode("utf-8")).digest())].append(slot)
+    return owners
+
+def sharded_queries(jobs_query, slots):
+    """jobs_query restricted to the given slots, one query per MAX_IN_VALUES slots."""
+    slots = sorted(slots)
+    return [
+        jobs_query.where(filter=FieldFilter(SHARD_FIELD, "in", slots[i:i + MAX_IN_VALUES]))
+        for i in range(0, len(slots), MAX_IN_VALUES)
+    ]
+
+
+# ==============================================================================
+# MEMBERSHIP (COORDINATION DOCUMENT)
+# ==============================================================================
+class ShardMembership:
+    """
+    This process's entry in the coordination document and the slots it owns.
+
+    The document looks like {"slots": 64, "members": {key: {"workerId", "host",
+    "pid", "heartbeatAt"}}}. Liveness is judged by the server's clock (the
+    read time), so hosts do not need synchronized clocks.
+    """
+
+    def __init__(self, db, worker_id, slots=SHARD_SLOTS, ttl=SHARD_MEMBER_TTL_SECONDS):
+        self.ref = db.collection(SHARD_COLLECTION).document(SHARD_GROUP)
+        self.worker_id = worker_id
+        self.key = member_key(worker_id)
+        self.slots = slots
+        self.ttl = ttl
+        self.members = []
+        self.owned = frozenset()
+        self.leader = False
+
+    def heartbeat(self):
+        """Refresh our entry and recompute the assignment. Returns True if our slots changed."""
+        snapshot = self.ref.get()
+        data = snapshot.to_dict() or {}
+        if data.get("slots", self.slots) != self.slots:
+            raise ShardConfigError(
+                f"Listener group '{SHARD_GROUP}' uses {data['slots']} slots, this process {self.slots} (GHOST_SHARD_SLOTS)."
+            )
+
+        entry = {"workerId": self.worker_id, "host": socket.gethostname(), "pid": os.getpid(),
+                 "heartbeatAt": firestore.SERVER_TIMESTAMP}
+        self.ref.set({"slots": self.slots, "members": {self.key: entry}}, merge=True)
+
+        live_after = snapshot.read_time - timedelta(seconds=self.ttl)
+        prune_before = snapshot.read_time - timedelta(seconds=self.ttl * SHARD_PRUNE_AFTER)
+        live, dead = {self.key}, []
+        for key, member in (data.get("members") or {}).items():
+            beat = (member or {}).get("heartbeatAt")
+            if beat is not None and beat >= live_after:
+                live.add(key)
+            elif beat is None or beat < prune_before:
+                dead.append(key)
+
+        self.members = sorted(live)
+        self.leader = self.members[0] == self.key
+        if self.leader and dead:
+            self.ref.set({"members": {key: firestore.DELETE_FIELD for key in dead}}, merge=True)
+
+        owned = frozenset(assign_slots(self.members, self.slots)[self.key])
+        changed = owned != self.owned
+        self.owned = owned
+        return changed
+
+    def leave(self):
+        """Remove our entry so the others take over our slots on their next heartbeat."""
+        self.ref.set({"members": {self.key: firestore.DELETE_FIELD}}, merge=True)
+        self.owned = frozenset()
+        self.leader = False
+
+    def status(self):
+        """(key, workerId, host, pid, heartbeat age in seconds, live, slots owned) per member."""
+        snapshot = self.ref.get()
+        data = snapshot.to_dict() or {}
+        members = data.get("members") or {}
+        ages = {
+            key: (snapshot.read_time - m["heartbeatAt"]).total_seconds() if (m or {}).get("heartbeatAt") else None
+            for key, m in members.items()
+        }
+        live = sorted(k for k, age in ages.items() if age is not None and age <= self.ttl)
+        owners = assign_slots(live, data.get("slots", self.slots))
+        return [
+            (key, m.get("workerId"), m.get("host"), m.get("pid"), ages[key], key in owners, len(owners.get(key, [])))
+            for key, m in sorted(members.items())
+        ]
+
+
+# ==============================================================================
+# SHARDED WATCH
+# ==============================================================================
+class ShardStamper:
+    """
+    Leader only: writes the shard field on pending jobs created without one.
+
+    Not sharded: there is no query for "field missing", so this watches the
+    full jobs_query and skips the jobs that already carry SHARD_FIELD. The
+    leader therefore reads every pending job once more than other members;
+    set GHOST_SHARD_STAMP=0 once all producers stamp their jobs.
+    """
+
+    def __init__(self, db, jobs_query, slots=SHARD_SLOTS):
+        self.db = db
+        self.jobs_query = jobs_query
+        self.slots = slots
+        self._watch = None
+
+    @property
+    def running(self):
+        return self._watch is not None
+
+    def start(self):
+        if self._watch is None:
+            self._watch = self.jobs_query.on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _on_snapshot(self, col_snapshot, changes, read_time):
+        writer = None
+        stamped = 0
+        for change in changes:
+            if change.type.name != "ADDED" or SHARD_FIELD in (change.document.to_dict() or {}):
+                continue
+            if writer is None:
+                writer = self.db.bulk_writer()
+                # A failed precondition means the job changed (claimed, or stamped
+                # by a previous leader); the write is not retried
+                writer.on_write_error(lambda failure, bulk_writer: False)
+            job_doc = change.document
+            writer.update(
+                job_doc.reference, {SHARD_FIELD: job_shard(job_doc.id, self.slots)},
+                option=self.db.write_option(last_update_time=job_doc.update_time),
+            )
+            stamped += 1
+        if writer is not None:
+            writer.close()
+            logging.info(f"Stamped shard slots on {stamped} job(s).")
+
+class ShardedWatch:
+    """
+    Stand-in for the single watch over all pending jobs. It handles group
+    membership, one snapshot watch per chunk of owned slots and, on the
+    leader, the stamper. join() starts a heartbeat thread, so membership
+    stays fresh through a long backlog drain; attach() subscribes and from
+    then on the watches follow every rebalance.
+    """
+
+    def __init__(self, db, worker_id, jobs_query, callback, slots=SHARD_SLOTS):
+        self.jobs_query = jobs_query
+        self.callback = callback
+        self.membership = ShardMembership(db, worker_id, slots)
+        self.stamper = ShardStamper(db, jobs_query, slots)
+        self._watches = []
+        self._attached = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def owned(self):
+        return self.membership.owned
+
+    def join(self):
+        """First heartbeat (raises ShardConfigError on a slot-count mismatch), then keep beating."""
+        self.membership.heartbeat()
+        self._log_assignment("Joined")
+        self._thread = threading.Thread(target=self._run, name="ShardHeartbeat", daemon=True)
+        self._thread.start()
+
+    def queries(self):
+        """Pending-job queries covering the slots this process owns right now."""
+        return sharded_queries(self.jobs_query, self.owned)
+
+    def owns(self, job_doc):
+        return job_slot(job_doc, self.membership.slots) in self.owned
+
+    def attach(self):
+        with self._lock:
+            self._attached = True
+            self._subscribe()
+
+    def tick(self):
+        """Heartbeat; swap watches if our slots or leadership changed. Errors keep the current watches."""
+        with self._lock:
+            was_leader = self.membership.leader
+            try:
+                changed = self.membership.heartbeat()
+            except Exception as e:
+                # Others drop us after the TTL and take our slots; until we are
+                # back, both sides watch them and the claim decides
+                logging.error(f"Shard heartbeat failed: {e}")
+                return False
+            if changed or was_leader != self.membership.leader:
+                self._log_assignment("Rebalanced")
+                if self._attached:
+                    self._subscribe()
+            return changed
+
+    def unsubscribe(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            self._attached = False
+            self.stamper.stop()
+            for watch in self._watches:
+                watch.unsubscribe()
+            self._watches = []
+            try:
+                self.membership.leave()
+            except Exception as e:
+                logging.warning(f"Could not leave listener group (others take over after the TTL): {e}")
+
+    def _run(self):
+        while not self._stop.wait(SHARD_HEARTBEAT_SECONDS):
+            self.tick()
+
+    def _subscribe(self):
+        """(Re)subscribe to the owned slots; start or stop the stamper to match leadership."""
+        for watch in self._watches:
+            watch.unsubscribe()
+        # A new watch's first snapshot holds every pending job in its slots,
+        # including ones already queued here; the pool skips those
+        self._watches = [query.on_snapshot(self.callback) for query in self.queries()]
+        if self.membership.leader and SHARD_STAMP:
+            self.stamper.start()
+        else:
+            self.stamper.stop()
+
+    def _log_assignment(self, what):
+        m = self.membership
+        logging.info(
+            f"{what} listener group '{SHARD_GROUP}' as {m.key}: {len(m.owned)}/{m.slots} slot(s), "
+            f"{len(m.members)} member(s){', leader' if m.leader else ''}."
+        )
+
+
+# ==============================================================================
+# LOCAL LAUNCHER
+# ==============================================================================
+def launch(processes, base_port, stop_timeout):
+    """
+    Run `processes` sharded product_generator.py listeners on this host and
+    restart any that exit, with backoff. Each gets a stable worker id, so a
+    restarted listener takes back the same slots, and its own health port.
+    SIGTERM/SIGINT are passed on and the listeners drain before exiting.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "product_generator.py")
+    host = socket.gethostname()
+    stopping = []
+
+    def spawn(index):
+        env = dict(
+            os.environ, GHOST_SHARDING="1", GHOST_WORKER_ID=f"{host}-shard{index}",
+            GHOST_HEALTH_PORT=str(base_port + index),
+        )
+        logging.info(f"Starting listener {index} ({env['GHOST_WORKER_ID']}, health port {base_port + index}).")
+        return subprocess.Popen([sys.executable, script], env=env)
+
+    def stop(signum, frame):
+        logging.info(f"Received signal {signum}; stopping {processes} listener(s).")
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    children = {i: spawn(i) for i in range(processes)}
+    started = {i: time.monotonic() for i in children}
+    failures = {i: 0 for i in children}
+    restart_at = {}
+    while not stopping:
+        time.sleep(1)
+        now = time.monotonic()
+        for i, proc in children.items():
+            if i in restart_at:
+                if now >= restart_at[i]:
+                    del restart_at[i]
+                    children[i], started[i] = spawn(i), now
+                continue
+            code = proc.poll()
+            if code is None:
+                continue
+            failures[i] = 0 if now - started[i] > 60 else failures[i] + 1
+            delay = backoff_delay(failures[i])
+            logging.warning(f"Listener {i} exited with code {code}; restarting in {delay:.0f}s.")
+            restart_at[i] = now + delay
+
+    running = [proc for i, proc in children.items() if i not in restart_at and proc.poll() is None]
+    for proc in running:
+        proc.send_signal(signal.SIGTERM)
+    deadline = time.monotonic() + stop_timeout
+    for proc in running:
+        try:
+            proc.wait(max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            logging.error(f"Listener pid {proc.pid} did not stop within {stop_timeout:.0f}s; killing it.")
+            proc.kill()
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="listeners to run on this host")
+    parser.add_argument("--health-port", type=int,
+                        default=int(os.environ.get("GHOST_HEALTH_PORT") or os.environ.get("PORT") or "8080"),
+                        help="health port of listener 0; listener i uses this + i")
+    parser.add_argument("--stop-timeout", type=float,
+                        default=float(os.environ.get("GHOST_SHUTDOWN_TIMEOUT", "120")) + 30,
+                        help="seconds to wait for listeners to drain on shutdown")
+    parser.add_argument("--status", action="store_true", help="print the group's members and slots, then exit")
+    args = parser.parse_args()
+
+    if not args.status:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        sys.exit(launch(args.processes, args.health_port, args.stop_timeout))
+
+    import product_generator as pg
+
+    rows = ShardMembership(pg.db, pg.WORKER_ID).status()
+    for key, worker_id, host, pid, age, live, owned in rows:
+        print(
+            f"{key:<32} {host or '-':<20} pid {pid or '-':<7} "
+            f"heartbeat {f'{age:.0f}s ago' if age is not None else 'never':<12} "
+            f"{f'{owned} slot(s)' if live else 'expired'}"
+        )
+    print(f"{sum(1 for row in rows if row[5])} live member(s), group '{SHARD_GROUP}', {SHARD_SLOTS} slots")
+
+if __name__ == "__main__":
+    main()
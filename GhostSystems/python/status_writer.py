@@ -0,0 +1,149 @@
+import os
+import time
+import logging
+import threading
+
+from health import METRICS
+
+# --- Status Writer Config ---
+STATUS_FLUSH_SECONDS = float(os.environ.get("GHOST_STATUS_FLUSH_SECONDS", "0.25"))
+STATUS_FLUSH_SIZE = int(os.environ.get("GHOST_STATUS_FLUSH_SIZE", "100"))
+STATUS_MAX_ATTEMPTS = int(os.environ.get("GHOST_STATUS_MAX_ATTEMPTS", "5"))
+
+# gRPC status codes (https://grpc.github.io/grpc/core/md_doc_statuscodes.html)
+GRPC_NOT_FOUND = 5
+GRPC_FAILED_PRECONDITION = 9
+
+class StatusWriter:
+    """
+    Coalesces job status updates from all workers into BulkWriter flushes.
+
+    update() only records the write and returns, so worker threads do not
+    block on a Firestore RPC. A background thread flushes what has collected
+    after `flush_interval` seconds, or straight away once `max_batch`
+    documents are waiting. BulkWriter then packs them into batched RPCs.
+
+    Per-document order holds because updates to one document inside a window
+    are merged into a single write (later fields win, the first precondition
+    is kept), and each window is fully flushed, retries included, before the
+    next one starts. A write whose last_update_time precondition fails means
+    the job's lease was taken over; it is logged and dropped, not retried.
+
+    set() (merge) and delete() go through the same windows for side documents
+    such as dead letters. A delete replaces whatever is pending for that
+    document; otherwise a write merges into the pending one and keeps its kind.
+    """
+
+    def __init__(self, client, flush_interval=STATUS_FLUSH_SECONDS,
+                 max_batch=STATUS_FLUSH_SIZE, max_attempts=STATUS_MAX_ATTEMPTS):
+        self.client = client
+        self.flush_interval = flush_interval
+        self.max_batch = max(1, max_batch)
+        self.max_attempts = max_attempts
+        self.stats = {"updates": 0, "coalesced": 0, "writes": 0, "flushes": 0, "failed": 0}
+
+        self._pending = {}  # doc path -> [ref, kind, fields, last_update_time]
+        self._cond = threading.Condition()
+        self._closed = False
+        self._writer = None
+        self._thread = threading.Thread(target=self._run, name="StatusWriter", daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        """Documents waiting for the next flush."""
+        with self._cond:
+            return len(self._pending)
+
+    def update(self, ref, fields, last_update_time=None):
+        self._add(ref, "update", fields, last_update_time)
+
+    def set(self, ref, fields):
+        """Create or merge into the document (set with merge=True)."""
+        self._add(ref, "set", fields)
+
+    def delete(self, ref):
+        self._add(ref, "delete", {})
+
+    def _add(self, ref, kind, fields, last_update_time=None):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("StatusWriter is closed")
+            self.stats["updates"] += 1
+            entry = self._pending.get(ref.path)
+            if entry is None or kind == "delete" or entry[1] == "delete":
+                if entry is not None:
+                    self.stats["coalesced"] += 1
+                self._pending[ref.path] = [ref, kind, dict(fields), last_update_time]
+            else:
+                entry[2].update(fields)
+                self.stats["coalesced"] += 1
+            # The first write opens a flush window; a full batch closes it early
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def close(self):
+        """Flush everything still pending and stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        if self._writer is not None:
+            self._writer.close()
+        logging.info(f"Status writer closed: {self.stats}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._closed and len(self._pending) < self.max_batch:
+                    # Let the window fill up; update() or close() cut it short
+                    self._cond.wait(self.flush_interval)
+                batch, self._pending = self._pending, {}
+                done = self._closed and not batch
+            if done:
+                return
+            if batch:
+                try:
+                    self._flush(batch)
+                except Exception as e:
+                    self.stats["failed"] += len(batch)
+                    logging.error(f"Status flush of {len(batch)} write(s) failed: {e}")
+
+    def _on_error(self, failure, bulk_writer):
+        ref = failure.operation.reference
+        if failure.code in (GRPC_FAILED_PRECONDITION, GRPC_NOT_FOUND):
+            self.stats["failed"] += 1
+            logging.warning(f"Lease on job {ref.id} was lost before it finished; status not recorded.")
+            return False
+        if failure.attempts < self.max_attempts:
+            return True
+        self.stats["failed"] += 1
+        logging.error(f"Status write for job {ref.id} failed after {failure.attempts} attempt(s): {failure.message}")
+        return False
+
+    def _flush(self, batch):
+        if self._writer is None:
+            self._writer = self.client.bulk_writer()
+            self._writer.on_write_error(self._on_error)
+
+        started = time.perf_counter()
+        for ref, kind, fields, last_update_time in batch.values():
+            if kind == "set":
+                self._writer.set(ref, fields, merge=True)
+                continue
+            if kind == "delete":
+                self._writer.delete(ref)
+                continue
+            option = None
+            if last_update_time is not None:
+                option = self.client.write_option(last_update_time=last_update_time)
+            self._writer.update(ref, fields, option=option)
+        # Blocks until every write in this window (and its retries) settled
+        self._writer.flush()
+
+        elapsed = time.perf_counter() - started
+        self.stats["writes"] += len(batch)
+        self.stats["flushes"] += 1
+        METRICS.observe("status_write", elapsed)
+        logging.debug(f"Flushed {len(batch)} status write(s) in {elapsed:.3f}s.")
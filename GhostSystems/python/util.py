@@ -1,12 +1,26 @@
-import os, json, time
+import time, secrets, itertools
 from slugify import slugify
+from meta_store import META_STORE_DIR, META_LEGACY_JSON, get_store, write_json
 
-def save_meta(meta, base='data/meta'):
-    os.makedirs(base, exist_ok=True)
-    path = os.path.join(base, f"{meta['sku']}.json")
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(meta, f, ensure_ascii=False, indent=2)
-    return path
+def save_meta(meta, base=META_STORE_DIR):
+    """
+    Store the record in the append-only meta store (see meta_store.py) and,
+    while META_LEGACY_JSON is on, as <base>/<sku>.json for the Node readers
+    that still glob data/meta/*.json. Returns the SKU (it used to return the
+    JSON file's path; load_meta(sku) reads the record back).
+    """
+    stored = get_store(base).put(meta)
+    if META_LEGACY_JSON:
+        write_json(meta, base)
+    return stored
+
+def load_meta(sku, base=META_STORE_DIR):
+    return get_store(base).get(sku)
+
+_sku_seq = itertools.count(1)
 
 def sku(title, kind):
-    return f"{slugify(title)}_{kind}_{int(time.time())}"
+    # <slug>_<kind>_<unix seconds>_<suffix>. The suffix is a per-process counter
+    # (distinct within a process, even inside one second) followed by 8 random
+    # hex digits (distinct across processes and hosts)
+    return f"{slugify(title)}_{kind}_{int(time.time())}_{next(_sku_seq):x}{secrets.token_hex(4)}"
@@ -0,0 +1,55 @@
+# Oracle/bench_startup.py
+"""
+Startup-time benchmark for brain.py's offline modes.
+
+    python bench_startup.py [--runs 15]
+
+Compares the lazy-import offline modes with the Firebase SDK import that
+every brain.py invocation used to pay at module load (and that a one-shot
+cron run still pays on top of credential loading and channel setup, which
+--daemon amortizes).
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BRAIN = os.path.join(HERE, "brain.py")
+
+CASES = [
+    ("interpreter (python -c pass)", [sys.executable, "-c", "pass"]),
+    ("brain.py --enumerate", [sys.executable, BRAIN, "--enumerate"]),
+    ("brain.py --dry-run", [sys.executable, BRAIN, "--dry-run"]),
+    (
+        "firebase_admin + firestore import",
+        [sys.executable, "-c", "import firebase_admin; from firebase_admin import firestore; firestore.client"],
+    ),
+]
+
+def time_cmd(cmd, runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, cwd=HERE)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=15)
+    args = parser.parse_args()
+
+    print(f"{'case':40} {'median ms':>10} {'min ms':>8}")
+    for name, cmd in CASES:
+        try:
+            samples = time_cmd(cmd, args.runs)
+        except subprocess.CalledProcessError:
+            print(f"{name:40} {'n/a':>10} {'':>8}  (command failed; SDK not installed?)")
+            continue
+        print(f"{name:40} {statistics.median(samples):10.1f} {min(samples):8.1f}")
+
+if __name__ == "__main__":
+    main()
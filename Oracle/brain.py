@@ -1,11 +1,23 @@
 # Oracle/brain.py
 import os
+import re
+import sys
+import json
+import time
 import random
+import signal
 import hashlib
+import argparse
+import functools
+import itertools
+import threading
+from collections import namedtuple
 from datetime import datetime, timezone
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+# firebase_admin / google-cloud (and numpy) are imported on first use so the
+# offline modes (--dry-run, --enumerate, --count) start without the SDKs.
+from telemetry import Telemetry, write_atomic, write_json
+from product_schema import SCHEMA_VERSION, STYLE_GUIDES
 
 # ----------------------------
 # Config (env-driven)
@@ -17,6 +29,43 @@ BUNDLE_RATIO = float(os.getenv("ORACLE_BUNDLE_RATIO", "0.70"))  # heavier bundle
 ORACLE_SEED = os.getenv("ORACLE_SEED", "").strip()
 ORACLE_VERSION = os.getenv("ORACLE_VERSION", "oracle_v3_bundle_first")
 
+# Product document shape: 2 = compact (see product_schema.py), 1 = the
+# original with camelCase aliases and the style guide inlined in every image
+WRITE_SCHEMA = int(os.getenv("ORACLE_SCHEMA_VERSION", str(SCHEMA_VERSION)))
+
+# Candidate selection: "space" samples unclaimed combos without replacement,
+# "ranked" scores a pool of unclaimed candidates and writes the best,
+# "random" is the original draw-and-retry loop
+SAMPLER = os.getenv("ORACLE_SAMPLER", "space").strip().lower()
+
+# Ranked selection: candidates scored per run, and the weights of the default
+# linear score over the decision metrics (name=weight, comma separated). The
+# type mix is fixed by BUNDLE_RATIO; within a type each spec's own metrics
+# (see spec_metrics) and features (prompts, models) decide the order
+POOL_SIZE = int(os.getenv("ORACLE_POOL_SIZE", "50000"))
+SCORE_WEIGHTS = os.getenv("ORACLE_SCORE_WEIGHTS", "profit=1,fit=10,shelf=-1,discount=0.25,prompts=0.02,models=1")
+
+# Space/ranked runs: create() rounds per run before giving up. Each round is
+# one BulkWriter flush that re-draws only what was rejected as existing; a
+# nearly claimed space without a dedupe index needs the most rounds.
+SPACE_MAX_ROUNDS = int(os.getenv("ORACLE_SPACE_MAX_ROUNDS", "32"))
+# After a round with rejections, the next rounds first check a window of
+# candidates in one get_all; the window doubles per round up to this many ids
+SPACE_LOOKAHEAD_MAX = int(os.getenv("ORACLE_SPACE_LOOKAHEAD_MAX", "1000"))
+
+# Bulk mode: build the whole batch, one get_all existence check, BulkWriter creates
+BULK_MODE = os.getenv("ORACLE_BULK", "").strip().lower() in ("1", "true", "yes")
+BULK_MAX_ATTEMPTS = int(os.getenv("ORACLE_BULK_MAX_ATTEMPTS", "5"))
+GRPC_ALREADY_EXISTS = 6
+
+# Local dedupe index (SQLite file of claimed doc ids); empty path disables it
+DEDUPE_INDEX_PATH = os.getenv("ORACLE_DEDUPE_INDEX", "").strip()
+DEDUPE_INDEX_REWARM = os.getenv("ORACLE_DEDUPE_REWARM", "").strip().lower() in ("1", "true", "yes")
+
+# Near-duplicate (MinHash/LSH) index file; empty path disables it
+NEAR_DUP_INDEX_PATH = os.getenv("ORACLE_NEAR_DUP_INDEX", "").strip()
+NEAR_DUP_THRESHOLD = float(os.getenv("ORACLE_NEAR_DUP_THRESHOLD", "0.85"))
+
 # Price bands (USD)
 PRICE_PROMPT_PACK = (19, 49)
 PRICE_AUTOMATION_KIT = (29, 79)
@@ -37,11 +86,9 @@ SCARCITY_HOOKS = [
     "Secrets they do not spell out publicly",
 ]
 
-STYLE_GUIDE = {
-    "image_style": "premium, minimalist, high-contrast, modern SaaS bundle cover",
-    "format": "square 1:1",
-    "notes": "Strong title typography + abstract tech motif",
-}
+# Named guides live in product_schema.STYLE_GUIDES; v2 images store the name
+STYLE_GUIDE_NAME = "premium_minimal"
+STYLE_GUIDE = STYLE_GUIDES[STYLE_GUIDE_NAME]
 
 # ----------------------------
 # Curated building blocks
@@ -72,10 +119,68 @@ AUTOMATION_KIT_IDEAS = [
 
 AUTOMATION_PLATFORMS = ["n8n", "Make", "Zapier"]
 
+PACK_COUNTS = [50, 75, 100]  # stabilize a bit to reduce clone spam
+
+# Per-product random metric choices (builders, export and ranking share them)
+SHELF_DAYS = {
+    "prompt_pack": [3, 7, 14, 21],
+    "automation_kit": [7, 14, 30],
+    "bundle": [3, 7, 14],  # bundles should churn faster
+}
+FIT_SCORES = [7, 8, 9]
+BUNDLE_FIT_SCORE = 9
+DEPLOY_MINUTES = [20, 30, 45, 60]
+
+# Partitioning: this process owns doc ids with hash % n == k ("k/n"); a local
+# pool of W workers splits it further into shards k*W+i of n*W, so every host
+# in a fleet must run the same --workers
+PARTITION = os.getenv("ORACLE_PARTITION", "").strip()
+WORKERS = int(os.getenv("ORACLE_WORKERS", "1"))
+
+# Run telemetry: JSON summary (printed unless a path is set) and a Prometheus
+# textfile for node_exporter; worker shards get their own files
+METRICS_JSON_PATH = os.getenv("ORACLE_METRICS_JSON", "").strip()
+METRICS_PROM_PATH = os.getenv("ORACLE_METRICS_PROM", "").strip()
+
+# Daemon mode (--daemon): one warm client, a run every interval or per cron
+DAEMON_INTERVAL_SECONDS = float(os.getenv("ORACLE_INTERVAL_SECONDS", "3600"))
+DAEMON_CRON = os.getenv("ORACLE_CRON", "").strip()
+
 # ----------------------------
 # Firebase init
 # ----------------------------
+# Stand-in for firestore.SERVER_TIMESTAMP until the SDK is loaded; once
+# initialize_firebase() has run, builders emit the real sentinel.
+SERVER_TIMESTAMP = "SERVER_TIMESTAMP"
+_firestore = None
+
+SHARD = (0, 1)  # (index, count) owned by this process; set by set_shard()
+
+TELEMETRY = Telemetry()  # current run; emitted and replaced by run_once()
+_TELEMETRY_TOTAL = Telemetry()  # process lifetime, for the Prometheus file
+
+def timed(phase: str):
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                TELEMETRY.observe(phase, time.perf_counter() - start)
+        return inner
+    return wrap
+
+def server_timestamp():
+    return _firestore.SERVER_TIMESTAMP if _firestore is not None else SERVER_TIMESTAMP
+
+@timed("initialize_firebase")
 def initialize_firebase():
+    global _firestore
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    _firestore = firestore
     if firebase_admin._apps:
         return firestore.client()
 
@@ -92,6 +197,36 @@ def initialize_firebase():
     firebase_admin.initialize_app(cred)
     return firestore.client()
 
+def open_dedupe_index(db, collection_name: str, warm: bool = True):
+    # warm=False only opens the file (workers: run_workers() warmed it already)
+    if not DEDUPE_INDEX_PATH:
+        return None
+
+    from dedupe_index import DedupeIndex
+
+    index = DedupeIndex(DEDUPE_INDEX_PATH, collection_name)
+    if warm and (DEDUPE_INDEX_REWARM or not index.is_warm()):
+        with TELEMETRY.phase("dedupe_index_warm"):
+            count = index.warm(db)
+        TELEMETRY.rpc("run_query")
+        print(f"[Oracle] dedupe index warmed from '{collection_name}' | ids={count}")
+    return index
+
+def open_near_dup_index(db, collection_name: str):
+    if not NEAR_DUP_INDEX_PATH:
+        return None
+
+    from near_dupes import NearDuplicateIndex
+
+    near = NearDuplicateIndex(NEAR_DUP_INDEX_PATH, threshold=NEAR_DUP_THRESHOLD)
+    # Empty after load: new file, or one saved by another shingling version
+    if not len(near):
+        with TELEMETRY.phase("near_dup_index_warm"):
+            count = near.warm(db, collection_name)
+        TELEMETRY.rpc("run_query")
+        print(f"[Oracle] near-dup index warmed from '{collection_name}' | products={count}")
+    return near
+
 # ----------------------------
 # Helpers
 # ----------------------------
@@ -112,6 +247,10 @@ def pick_cost_range(product_type: str):
         return COST_RANGE_AUTOMATION_KIT
     return COST_RANGE_BUNDLE
 
+def drawn(draw, name: str, pick):
+    # draw pins a builder's random field (ranked sampler); otherwise pick() draws it
+    return draw[name] if draw and name in draw else pick()
+
 def stable_slug(s: str) -> str:
     s = (s or "").strip().lower()
     out = []
@@ -134,27 +273,50 @@ def doc_id_from_dedupe(dedupe_key: str) -> str:
     return hashlib.sha1(dedupe_key.encode("utf-8")).hexdigest()
 
 def base_product_fields(product_type: str, niche_key: str) -> dict:
-    # Snake_case primary schema plus backward-compatible aliases
-    return {
+    fields = {
         "product_type": product_type,
-        "productType": product_type,  # compatibility
         "niche": niche_key,
         "is_digital": True,
-        "digital": True,  # compatibility
         "requires_shipping": False,
-        "requiresShipping": False,  # compatibility
         "currency": "USD",
         "source": "oracle",
         "version": ORACLE_VERSION,
         "status": "pending",
         # Use Firestore timestamps server-side for consistency
-        "createdAt": firestore.SERVER_TIMESTAMP,
-        "updatedAt": firestore.SERVER_TIMESTAMP,
+        "createdAt": server_timestamp(),
+        "updatedAt": server_timestamp(),
     }
+    if WRITE_SCHEMA >= 2:
+        fields["schema"] = WRITE_SCHEMA
+    else:
+        # v1: backward-compatible camelCase aliases
+        fields.update(productType=product_type, digital=True, requiresShipping=False)
+    return fields
+
+def image_fields(image_prompt: str) -> dict:
+    if WRITE_SCHEMA >= 2:
+        return {"prompt": image_prompt, "style_guide": STYLE_GUIDE_NAME}
+    return {"prompt": image_prompt, **STYLE_GUIDE}
+
+def prompt_pack_dedupe_key(niche_key: str, theme: str, pack_count: int) -> str:
+    # Stable dedupe key (theme + niche)
+    return make_dedupe_key("prompt_pack", niche_key, theme, str(pack_count))
+
+def automation_kit_dedupe_key(niche_key: str, kit_name: str, platform: str) -> str:
+    # Stable dedupe key (kit + platform + niche)
+    return make_dedupe_key("automation_kit", niche_key, kit_name, platform)
+
+def bundle_dedupe_key(niche_key: str, prompt_pack_key: str, automation_kit_key: str) -> str:
+    # Stable dedupe: niche + prompt theme + kit name/platform under the hood
+    return make_dedupe_key("bundle", niche_key, prompt_pack_key, automation_kit_key)
 
-def build_prompt_pack(niche_key: str, niche_desc: str) -> dict:
-    theme, models = random.choice(PROMPT_PACK_IDEAS)
-    pack_count = random.choice([50, 75, 100])  # stabilize a bit to reduce clone spam
+@timed("build_prompt_pack")
+def build_prompt_pack(niche_key: str, niche_desc: str, idea=None, pack_count=None, draw=None) -> dict:
+    # idea/pack_count pin the combo (candidate-space sampling); None draws at random.
+    # draw pins price/shelf/fit (ranked sampling)
+    theme, models = idea or random.choice(PROMPT_PACK_IDEAS)
+    if pack_count is None:
+        pack_count = random.choice(PACK_COUNTS)
 
     title = f"{theme} Prompt Pack ({pack_count} prompts)"
     description = (
@@ -171,7 +333,7 @@ def build_prompt_pack(niche_key: str, niche_desc: str) -> dict:
         **base_product_fields("prompt_pack", niche_key),
         "title": title,
         "description": description,
-        "price_usd": pick_price("prompt_pack"),
+        "price_usd": drawn(draw, "price", lambda: pick_price("prompt_pack")),
         "tags": ["prompt_pack", "ai_images", "digital", niche_key],
         "payload": {
             "models": models,
@@ -179,7 +341,7 @@ def build_prompt_pack(niche_key: str, niche_desc: str) -> dict:
             "includes": ["style guide", "negative prompts", "composition recipes", "bonus variants"],
             "deliverables": ["prompt-pack.txt", "prompt-pack.pdf", "readme.md"],
         },
-        "image": {"prompt": image_prompt, **STYLE_GUIDE},
+        "image": image_fields(image_prompt),
     }
 
     # Decision metrics placeholders
@@ -187,17 +349,18 @@ def build_prompt_pack(niche_key: str, niche_desc: str) -> dict:
     product["metrics"] = {
         "cogs_est_usd_range": [lo, hi],
         "profit_est_usd_range": [product["price_usd"] - hi, product["price_usd"] - lo],
-        "time_on_shelf_est_days": random.choice([3, 7, 14, 21]),
-        "bundle_fit_score_0_10": random.choice([7, 8, 9]),
+        "time_on_shelf_est_days": drawn(draw, "shelf", lambda: random.choice(SHELF_DAYS["prompt_pack"])),
+        "bundle_fit_score_0_10": drawn(draw, "fit", lambda: random.choice(FIT_SCORES)),
     }
 
-    # Stable dedupe key (theme + niche)
-    product["dedupe_key"] = make_dedupe_key("prompt_pack", niche_key, theme, str(pack_count))
+    product["dedupe_key"] = prompt_pack_dedupe_key(niche_key, theme, pack_count)
     return product
 
-def build_automation_kit(niche_key: str, niche_desc: str) -> dict:
-    kit_name, integrations = random.choice(AUTOMATION_KIT_IDEAS)
-    platform = random.choice(AUTOMATION_PLATFORMS)
+@timed("build_automation_kit")
+def build_automation_kit(niche_key: str, niche_desc: str, idea=None, platform=None, draw=None) -> dict:
+    kit_name, integrations = idea or random.choice(AUTOMATION_KIT_IDEAS)
+    if platform is None:
+        platform = random.choice(AUTOMATION_PLATFORMS)
 
     title = f"{kit_name} ({platform} Automation Kit)"
     description = (
@@ -214,33 +377,37 @@ def build_automation_kit(niche_key: str, niche_desc: str) -> dict:
         **base_product_fields("automation_kit", niche_key),
         "title": title,
         "description": description,
-        "price_usd": pick_price("automation_kit"),
+        "price_usd": drawn(draw, "price", lambda: pick_price("automation_kit")),
         "tags": ["automation_kit", platform, "digital", niche_key],
         "payload": {
             "platform": platform,
             "integrations": integrations,
             "includes": ["workflow.json", "setup.md", "qa-checklist.md", "troubleshooting.md"],
-            "time_to_deploy_minutes": random.choice([20, 30, 45, 60]),
+            "time_to_deploy_minutes": drawn(draw, "deploy", lambda: random.choice(DEPLOY_MINUTES)),
         },
-        "image": {"prompt": image_prompt, **STYLE_GUIDE},
+        "image": image_fields(image_prompt),
     }
 
     lo, hi = pick_cost_range("automation_kit")
     product["metrics"] = {
         "cogs_est_usd_range": [lo, hi],
         "profit_est_usd_range": [product["price_usd"] - hi, product["price_usd"] - lo],
-        "time_on_shelf_est_days": random.choice([7, 14, 30]),
-        "bundle_fit_score_0_10": random.choice([7, 8, 9]),
+        "time_on_shelf_est_days": drawn(draw, "shelf", lambda: random.choice(SHELF_DAYS["automation_kit"])),
+        "bundle_fit_score_0_10": drawn(draw, "fit", lambda: random.choice(FIT_SCORES)),
     }
 
-    # Stable dedupe key (kit + platform + niche)
-    product["dedupe_key"] = make_dedupe_key("automation_kit", niche_key, kit_name, platform)
+    product["dedupe_key"] = automation_kit_dedupe_key(niche_key, kit_name, platform)
     return product
 
-def build_bundle(niche_key: str, niche_desc: str) -> dict:
+@timed("build_bundle")
+def build_bundle(niche_key: str, niche_desc: str, pack=None, kit=None, draw=None) -> dict:
     # Build components (embedded, not separate SKUs)
-    prompt_pack = build_prompt_pack(niche_key, niche_desc)
-    automation_kit = build_automation_kit(niche_key, niche_desc)
+    # pack=(idea, pack_count) / kit=(idea, platform) pin the components;
+    # draw pins price/shelf and the components' prices and deploy time
+    pack_draw = {"price": draw["pack_price"]} if draw else None
+    kit_draw = {"price": draw["kit_price"], "deploy": draw["deploy"]} if draw else None
+    prompt_pack = build_prompt_pack(niche_key, niche_desc, *(pack or (None, None)), draw=pack_draw)
+    automation_kit = build_automation_kit(niche_key, niche_desc, *(kit or (None, None)), draw=kit_draw)
 
     theme = prompt_pack["title"]
     kit = automation_kit["title"]
@@ -268,7 +435,7 @@ def build_bundle(niche_key: str, niche_desc: str) -> dict:
         **base_product_fields("bundle", niche_key),
         "title": bundle_title,
         "description": bundle_description,
-        "price_usd": pick_price("bundle"),
+        "price_usd": drawn(draw, "price", lambda: pick_price("bundle")),
         "tags": ["bundle", "high_ticket", "digital", niche_key],
         "hooks": marketing_copy,
         "payload": {
@@ -279,7 +446,7 @@ def build_bundle(niche_key: str, niche_desc: str) -> dict:
             "positioning": "Premium pairing: prompts + workflows",
             "scarcity": {"mode": "drop", "note": "Optional storefront copy guidance."},
         },
-        "image": {"prompt": image_prompt, **STYLE_GUIDE},
+        "image": image_fields(image_prompt),
         "bundle_components_meta": {
             "prompt_pack_title": prompt_pack["title"],
             "automation_kit_title": automation_kit["title"],
@@ -294,64 +461,934 @@ def build_bundle(niche_key: str, niche_desc: str) -> dict:
         "discount_vs_anchor_usd": max(0, anchor - product["price_usd"]),
         "cogs_est_usd_range": [lo, hi],
         "profit_est_usd_range": [product["price_usd"] - hi, product["price_usd"] - lo],
-        "time_on_shelf_est_days": random.choice([3, 7, 14]),  # bundles should churn faster
-        "bundle_fit_score_0_10": 9,
+        "time_on_shelf_est_days": drawn(draw, "shelf", lambda: random.choice(SHELF_DAYS["bundle"])),
+        "bundle_fit_score_0_10": BUNDLE_FIT_SCORE,
     }
 
-    # Stable dedupe: niche + prompt theme + kit name/platform under the hood
-    product["dedupe_key"] = make_dedupe_key(
-        "bundle",
+    product["dedupe_key"] = bundle_dedupe_key(
         niche_key,
         prompt_pack["dedupe_key"],
         automation_kit["dedupe_key"],
     )
     return product
 
-def upsert_product(db, collection_name: str, product: dict) -> str:
+def parse_partition(text: str):
+    if not text:
+        return 0, 1
+    k, n = (int(x) for x in text.split("/", 1))
+    if not (0 <= k < n):
+        raise ValueError(f"partition must be k/n with 0 <= k < n, got {text!r}")
+    return k, n
+
+def set_shard(index: int, count: int):
+    """
+    Own shard `index` of `count` and switch to its RNG stream. The stream is
+    derived from ORACLE_SEED, so each shard is reproducible on its own.
+    """
+    global SHARD
+    SHARD = (index, count)
+    if ORACLE_SEED and count > 1:
+        random.seed(f"{ORACLE_SEED}:{index}/{count}")
+
+def owns(doc_id: str) -> bool:
+    index, count = SHARD
+    return count <= 1 or int(doc_id[:8], 16) % count == index
+
+def near_duplicate_of(near, doc_id: str, product: dict, pending: dict = None) -> str:
+    """
+    Return the doc id `product` is a near-clone of, or "". A clear candidate
+    is only held in `pending` ({doc_id: signature}) so two clones in one
+    batch still collide; add_near_dups() indexes it once its write succeeded.
+    """
+    if near is None:
+        return ""
+    with TELEMETRY.phase("near_dup_check"):
+        sig = near.signature(product)
+        hit = near.query(product, sig)
+        if not hit and pending:
+            hit = next(
+                ((other, s) for other, s in pending.items() if (s == sig).mean() >= near.threshold), None
+            )
+    if hit:
+        TELEMETRY.count("near_duplicates")
+        return hit[0]
+    if pending is not None:
+        pending[doc_id] = sig
+    return ""
+
+def add_near_dups(near, pending: dict, written):
+    # Only written products claim their concept; a failed or rejected write
+    # must not block later candidates
+    if near is not None:
+        for doc_id in written:
+            near.add(doc_id, sig=pending[doc_id])
+
+@timed("upsert_product")
+def upsert_product(db, collection_name: str, product: dict, index=None) -> str:
     dedupe_key = product.get("dedupe_key")
     if not dedupe_key:
         raise RuntimeError("product missing dedupe_key")
 
     doc_id = doc_id_from_dedupe(dedupe_key)
+
+    # Known locally -> no network round trip at all
+    if index is not None and doc_id in index:
+        TELEMETRY.count("dedupe_index_hits")
+        return ""
+
+    from google.api_core.exceptions import AlreadyExists
+
     doc_ref = db.collection(collection_name).document(doc_id)
 
-    # If already exists, do nothing (prevents spam)
-    if doc_ref.get().exists:
+    # Create-only precondition: if it already exists (or another worker won
+    # the race) the server rejects it and nothing is overwritten
+    TELEMETRY.rpc("commit")
+    try:
+        doc_ref.create(product)
+    except AlreadyExists:
+        TELEMETRY.count("lost_races")
+        if index is not None:
+            index.add(doc_id)
         return ""
 
-    doc_ref.set(product, merge=False)
+    if index is not None:
+        index.add(doc_id)
     return doc_id
 
 # ----------------------------
-# Main
+# Candidate space (ORACLE_SAMPLER=space)
 # ----------------------------
-def main():
-    if ORACLE_SEED:
-        random.seed(ORACLE_SEED)
+# Every product the builders can emit is pinned by (type, niche, pack, kit);
+# the dedupe key depends on nothing else, so the space is small and fully
+# enumerable. Sampling from the unclaimed remainder replaces blind redraws.
+CandidateSpec = namedtuple("CandidateSpec", "product_type niche pack kit dedupe_key doc_id")
 
-    print(f"[Oracle] started {now_utc().isoformat()}")
-    collection_name = os.getenv("FIRESTORE_JOBS_COLLECTION", DEFAULT_COLLECTION)
+_CANDIDATE_SPACE = None
 
-    db = initialize_firebase()
+def _spec(product_type: str, niche, pack, kit, dedupe_key: str) -> CandidateSpec:
+    return CandidateSpec(product_type, niche, pack, kit, dedupe_key, doc_id_from_dedupe(dedupe_key))
+
+def enumerate_candidate_space() -> list:
+    """All CandidateSpecs in a fixed order (niche -> prompt packs, kits, bundles)."""
+    global _CANDIDATE_SPACE
+    if _CANDIDATE_SPACE is not None:
+        return _CANDIDATE_SPACE
+
+    packs = [(idea, count) for idea in PROMPT_PACK_IDEAS for count in PACK_COUNTS]
+    kits = [(idea, platform) for idea in AUTOMATION_KIT_IDEAS for platform in AUTOMATION_PLATFORMS]
+
+    space = []
+    for niche in NICHES:
+        niche_key = niche[0]
+        pack_keys = [prompt_pack_dedupe_key(niche_key, idea[0], count) for idea, count in packs]
+        kit_keys = [automation_kit_dedupe_key(niche_key, idea[0], platform) for idea, platform in kits]
+
+        space.extend(_spec("prompt_pack", niche, pack, None, key) for pack, key in zip(packs, pack_keys))
+        space.extend(_spec("automation_kit", niche, None, kit, key) for kit, key in zip(kits, kit_keys))
+        for pack, pack_key in zip(packs, pack_keys):
+            for kit, kit_key in zip(kits, kit_keys):
+                space.append(_spec("bundle", niche, pack, kit, bundle_dedupe_key(niche_key, pack_key, kit_key)))
+
+    _CANDIDATE_SPACE = space
+    return space
+
+def build_from_spec(spec: CandidateSpec, draw=None) -> dict:
+    niche_key, niche_desc = spec.niche
+    if spec.product_type == "prompt_pack":
+        product = build_prompt_pack(niche_key, niche_desc, *spec.pack, draw=draw)
+    elif spec.product_type == "automation_kit":
+        product = build_automation_kit(niche_key, niche_desc, *spec.kit, draw=draw)
+    else:
+        product = build_bundle(niche_key, niche_desc, pack=spec.pack, kit=spec.kit, draw=draw)
+    return product
+
+def claimed_doc_ids(db, collection_name: str, space: list, index=None) -> set:
+    # Every owned spec (--space-report only). Local index first; whatever it
+    # does not know is resolved in one get_all
+    doc_ids = [spec.doc_id for spec in space]
+    claimed = set()
+    if index is not None:
+        claimed = {doc_id for doc_id in doc_ids if doc_id in index}
+
+    found = existing_doc_ids(db, collection_name, [d for d in doc_ids if d not in claimed])
+    if index is not None and found:
+        index.add_many(found)
+    return claimed | found
+
+def space_report(space: list, claimed: set) -> dict:
+    report = {}
+    for spec in space:
+        row = report.setdefault(spec.product_type, {"total": 0, "remaining": 0})
+        row["total"] += 1
+        if spec.doc_id not in claimed:
+            row["remaining"] += 1
+    report["all"] = {
+        "total": sum(r["total"] for r in report.values()),
+        "remaining": sum(r["remaining"] for r in report.values()),
+    }
+    return report
+
+def format_space_report(report: dict) -> str:
+    parts = [f"{k}={v['remaining']}/{v['total']}" for k, v in report.items()]
+    return "[Oracle] space remaining " + " ".join(parts)
+
+def iter_candidates(space: list, claimed: set):
+    """
+    Yield unclaimed specs in random order without replacement. Each draw keeps
+    the product-type mix of draw_product(); if that type is exhausted the
+    draw falls back to whatever type still has room. Uses the module RNG, so
+    ORACLE_SEED plus the same claimed set gives the same order.
+    """
+    pools = {"prompt_pack": [], "automation_kit": [], "bundle": []}
+    for spec in space:
+        if spec.doc_id not in claimed:
+            pools[spec.product_type].append(spec)
+
+    while any(pools.values()):
+        if random.random() < BUNDLE_RATIO:
+            product_type = "bundle"
+        else:
+            product_type = "prompt_pack" if random.random() < 0.5 else "automation_kit"
+
+        pool = pools[product_type]
+        if not pool:
+            pool = next(p for p in pools.values() if p)
+
+        # swap-remove keeps each draw O(1)
+        i = random.randrange(len(pool))
+        pool[i], pool[-1] = pool[-1], pool[i]
+        yield pool.pop()
+
+def sample_candidates(space: list, claimed: set, n: int) -> list:
+    return list(itertools.islice(iter_candidates(space, claimed), n))
+
+# ----------------------------
+# Ranked selection (ORACLE_SAMPLER=ranked)
+# ----------------------------
+# Up to POOL_SIZE unclaimed specs are scored in one vectorized pass. A
+# spec's price, shelf time, fit, deploy time and (for a bundle) component
+# prices are its own: spec_metrics() derives them from a hash of its doc id,
+# so they are the same on every run and every host. Profit, anchor and
+# discount follow from them. The score therefore ranks the candidates, never
+# a lucky redraw, and the pick is built with exactly the values it was
+# scored on. Picks keep the type mix of iter_candidates(): each pick draws a
+# product type by BUNDLE_RATIO and pops that type's best spec off a heap.
+SCORE_COLUMNS = ("profit", "fit", "shelf", "discount", "price", "anchor", "deploy", "prompts", "models")
+RANKED_TYPES = ("prompt_pack", "automation_kit", "bundle")
+# Fields each type's builder takes from a draw (see build_from_spec)
+DRAW_FIELDS = {
+    "prompt_pack": ("price", "shelf", "fit"),
+    "automation_kit": ("price", "deploy", "shelf", "fit"),
+    "bundle": ("price", "shelf", "deploy", "pack_price", "kit_price"),
+}
+
+def parse_score_weights(text: str) -> dict:
+    weights = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in SCORE_COLUMNS:
+            raise ValueError(f"unknown score column {name!r} (expected one of {', '.join(SCORE_COLUMNS)})")
+        weights[name] = float(value)
+    return weights
+
+def linear_score(cols: dict, weights: dict = None):
+    """Default scoring function: weighted sum of metric columns (SCORE_WEIGHTS)."""
+    weights = parse_score_weights(SCORE_WEIGHTS) if weights is None else weights
+    score = 0.0
+    for name, weight in weights.items():
+        score = score + weight * cols[name]
+    return score
+
+def spec_metrics(np, specs: list) -> dict:
+    """
+    Each spec's values for the fields its builder draws at random, as int
+    columns (0 where a type has no such field). Uniform over the builders'
+    ranges and choices, from 32-bit lanes of sha256("metrics:" + doc id).
+    """
+    n = len(specs)
+    digests = b"".join(hashlib.sha256(f"metrics:{spec.doc_id}".encode("ascii")).digest() for spec in specs)
+    lanes = np.frombuffer(digests, dtype=">u4").reshape(n, 8).astype(np.int64)
+    kinds = np.array([RANKED_TYPES.index(spec.product_type) for spec in specs], dtype=np.int64)
+
+    def between(lane, bounds):
+        return bounds[0] + lanes[:, lane] % (bounds[1] - bounds[0] + 1)
+
+    def choice(lane, options):
+        return np.asarray(options, dtype=np.int64)[lanes[:, lane] % len(options)]
+
+    cols = {name: np.zeros(n, dtype=np.int64) for name in ("price", "shelf", "fit", "deploy", "pack_price", "kit_price")}
+    for t, product_type in enumerate(RANKED_TYPES):
+        rows = kinds == t
+        prices = PRICE_PROMPT_PACK if t == 0 else PRICE_AUTOMATION_KIT if t == 1 else PRICE_BUNDLE
+        cols["price"][rows] = between(0, prices)[rows]
+        cols["shelf"][rows] = choice(1, SHELF_DAYS[product_type])[rows]
+        if product_type != "bundle":
+            cols["fit"][rows] = choice(2, FIT_SCORES)[rows]
+        if product_type != "prompt_pack":
+            cols["deploy"][rows] = choice(3, DEPLOY_MINUTES)[rows]
+        if product_type == "bundle":
+            cols["pack_price"][rows] = between(4, PRICE_PROMPT_PACK)[rows]
+            cols["kit_price"][rows] = between(5, PRICE_AUTOMATION_KIT)[rows]
+    return cols
+
+@timed("candidate_pool")
+def candidate_columns(np, specs: list):
+    """(score columns, spec_metrics columns) for specs."""
+    drawn_cols = spec_metrics(np, specs)
+    kinds = np.array([RANKED_TYPES.index(spec.product_type) for spec in specs], dtype=np.int64)
+    bundles = kinds == RANKED_TYPES.index("bundle")
+    # Midpoint of the written profit_est_usd_range
+    cost = np.array([sum(pick_cost_range(t)) / 2 for t in RANKED_TYPES])[kinds]
+    price = drawn_cols["price"].astype(np.float64)
+    anchor = np.where(bundles, drawn_cols["pack_price"] + drawn_cols["kit_price"], 0).astype(np.float64)
+
+    cols = {
+        "price": price,
+        "profit": price - cost,
+        "shelf": drawn_cols["shelf"].astype(np.float64),
+        "fit": np.where(bundles, BUNDLE_FIT_SCORE, drawn_cols["fit"]).astype(np.float64),
+        "deploy": drawn_cols["deploy"].astype(np.float64),
+        "anchor": anchor,
+        "discount": np.where(bundles, np.maximum(0, anchor - price), 0.0),
+        # Pinned by the spec: pack size and how many image models the pack covers
+        "prompts": np.array([spec.pack[1] if spec.pack else 0 for spec in specs], dtype=np.float64),
+        "models": np.array([len(spec.pack[0][1]) if spec.pack else 0 for spec in specs], dtype=np.float64),
+    }
+    return cols, drawn_cols
+
+def iter_ranked(space: list, claimed: set, pool_size: int = POOL_SIZE, score_fn=linear_score):
+    """
+    Yield (spec, score, draw) for unclaimed specs, each spec once: the product
+    type is drawn like iter_candidates(), then the best spec of that type
+    comes next (ties in random order). score_fn maps the column dict to an
+    array of scores (higher is better). draw holds the spec_metrics() values
+    the score was computed on, for build_from_spec().
+    """
+    import heapq
+    import numpy as np
+
+    specs = [spec for spec in space if spec.doc_id not in claimed]
+    if len(specs) > pool_size:
+        specs = random.sample(specs, pool_size)
+    if not specs:
+        return
+
+    cols, drawn_cols = candidate_columns(np, specs)
+    with TELEMETRY.phase("candidate_score"):
+        scores = np.broadcast_to(np.asarray(score_fn(cols), dtype=np.float64), (len(specs),))
+        # Seeded from the module RNG, so ORACLE_SEED and the shard pin the order
+        tiebreak = np.random.default_rng(random.getrandbits(64)).random(len(specs))
+        heaps = {product_type: [] for product_type in RANKED_TYPES}
+        for i, (score, tie) in enumerate(zip((-scores).tolist(), tiebreak.tolist())):
+            heaps[specs[i].product_type].append((score, tie, i))
+        for heap in heaps.values():
+            heapq.heapify(heap)
+    TELEMETRY.count("pool_specs", len(specs))
+
+    # O(pool) heapify, then O(log pool) per candidate actually consumed
+    while any(heaps.values()):
+        if random.random() < BUNDLE_RATIO:
+            product_type = "bundle"
+        else:
+            product_type = "prompt_pack" if random.random() < 0.5 else "automation_kit"
+        heap = heaps[product_type] or next(h for h in heaps.values() if h)
+        neg_score, _, i = heapq.heappop(heap)
+        spec = specs[i]
+        draw = {name: int(drawn_cols[name][i]) for name in DRAW_FIELDS[spec.product_type]}
+        yield spec, round(-neg_score, 4), draw
+
+def run_space(db, collection_name: str, index=None, near=None, ranked=False) -> int:
+    space = [spec for spec in enumerate_candidate_space() if owns(spec.doc_id)]
+    # Only the local index is consulted up front. Whatever it does not know is
+    # settled by create()'s precondition on the sampled batch alone, so a run
+    # costs about BATCH_SIZE writes instead of one read per spec in the space.
+    # Rejected ids are added to the index and never sampled again. A round
+    # that hits claimed ids makes the next ones look ahead with one get_all
+    # over a doubling window, so a claimed stretch of the order (the same
+    # ORACLE_SEED every run, or a nearly full space) costs O(log n) rounds.
+    claimed = set()
+    if index is not None:
+        claimed = {spec.doc_id for spec in space if spec.doc_id in index}
+        print(format_space_report(space_report(space, claimed)))
+
+    if ranked:
+        candidates = iter_ranked(space, claimed)
+    else:
+        candidates = ((spec, None, None) for spec in iter_candidates(space, claimed))
 
+    created = 0
+    near_dups = 0
+    rounds = 0
+    lookahead = 0
+    exhausted = False
+    while created < BATCH_SIZE and rounds < SPACE_MAX_ROUNDS and not exhausted:
+        rounds += 1
+        if lookahead:
+            window = list(itertools.islice(candidates, lookahead))
+            found = existing_doc_ids(db, collection_name, [spec.doc_id for spec, _, _ in window])
+            if index is not None and found:
+                index.add_many(found)
+            TELEMETRY.count("duplicates", len(found))
+            candidates = itertools.chain([c for c in window if c[0].doc_id not in found], candidates)
+        fresh = {}
+        pending = {}
+        for spec, score, draw in candidates:
+            TELEMETRY.count("attempts")
+            product = build_from_spec(spec, draw)
+            if score is not None:
+                product["metrics"]["rank_score"] = score
+            if near_duplicate_of(near, spec.doc_id, product, pending):
+                near_dups += 1
+                continue
+            fresh[spec.doc_id] = product
+            if len(fresh) >= BATCH_SIZE - created:
+                break
+        else:
+            exhausted = True
+        if not fresh:
+            break
+
+        existing = []
+        written = bulk_create_products(db, collection_name, fresh, existing)
+        if existing:
+            lookahead = min(SPACE_LOOKAHEAD_MAX, max(2 * lookahead, 2 * len(fresh)))
+        add_near_dups(near, pending, written)
+        if index is not None:
+            index.add_many(written + existing)
+        TELEMETRY.count("created", len(written))
+        TELEMETRY.count("duplicates", len(fresh) - len(written))
+
+        for doc_id in written:
+            product = fresh[doc_id]
+            print(f"[Oracle] Created {product['product_type']} -> {doc_id} :: {product['title']}")
+        created += len(written)
+
+    if near_dups:
+        print(f"[Oracle] skipped {near_dups} near-duplicate candidates")
+    if exhausted and not created:
+        print("[Oracle] candidate space exhausted; nothing left to create")
+    return created
+
+# ----------------------------
+# Synthetic catalog export (--count N --out file.ndjson)
+# ----------------------------
+# Load-test data only; nothing here touches Firestore. Each candidate spec is
+# run through its real builder once, the per-product random fields are
+# swapped for placeholders, and the serialized JSON becomes a format string.
+# Rows then only need their random columns, drawn per chunk with NumPy.
+EXPORT_CHUNK_SIZE = int(os.getenv("ORACLE_EXPORT_CHUNK", "50000"))
+_SLOT = re.compile(r'"@@(\w+)@@"')
+
+def _slot(name: str) -> str:
+    return f"@@{name}@@"
+
+def _export_template(spec: CandidateSpec, created_at: str):
+    product = build_from_spec(spec)
+    product["createdAt"] = created_at
+    product["updatedAt"] = created_at
+    product["price_usd"] = _slot("price")
+
+    metrics = product["metrics"]
+    metrics["profit_est_usd_range"] = [_slot("profit_lo"), _slot("profit_hi")]
+    metrics["time_on_shelf_est_days"] = _slot("shelf")
+
+    if spec.product_type == "prompt_pack":
+        metrics["bundle_fit_score_0_10"] = _slot("fit")
+    elif spec.product_type == "automation_kit":
+        metrics["bundle_fit_score_0_10"] = _slot("fit")
+        product["payload"]["time_to_deploy_minutes"] = _slot("deploy")
+    else:
+        product["hooks"][-1] = _slot("hook")
+        product["payload"]["bundle_includes"]["automation_kit"]["time_to_deploy_minutes"] = _slot("deploy")
+        metrics["anchor_value_usd"] = _slot("anchor")
+        metrics["discount_vs_anchor_usd"] = _slot("discount")
+
+    text = json.dumps(product, ensure_ascii=False, separators=(",", ":"))
+    # split() alternates literal JSON and slot names; slots become positional
+    # %s so a row is one C-level `template % values`
+    pieces = _SLOT.split(text.replace("%", "%%"))
+    return "%s".join(pieces[::2]), tuple(pieces[1::2])
+
+def _export_templates(created_at: str) -> dict:
+    # {product_type: ([template, ...], slot order)}; key order is fixed per
+    # builder, so every template of a type shares one slot order
+    templates = {}
+    for spec in enumerate_candidate_space():
+        template, order = _export_template(spec, created_at)
+        rows, _ = templates.setdefault(spec.product_type, ([], order))
+        rows.append(template)
+    return templates
+
+def _export_columns(np, rng, product_type: str, n: int, order) -> list:
+    lo, hi = pick_cost_range(product_type)
+    if product_type == "prompt_pack":
+        price = rng.integers(PRICE_PROMPT_PACK[0], PRICE_PROMPT_PACK[1] + 1, n)
+        cols = {
+            "shelf": rng.choice(SHELF_DAYS["prompt_pack"], n),
+            "fit": rng.choice(FIT_SCORES, n),
+        }
+    elif product_type == "automation_kit":
+        price = rng.integers(PRICE_AUTOMATION_KIT[0], PRICE_AUTOMATION_KIT[1] + 1, n)
+        cols = {
+            "deploy": rng.choice(DEPLOY_MINUTES, n),
+            "shelf": rng.choice(SHELF_DAYS["automation_kit"], n),
+            "fit": rng.choice(FIT_SCORES, n),
+        }
+    else:
+        # Component draws happen in the same order as build_bundle()
+        anchor = rng.integers(PRICE_PROMPT_PACK[0], PRICE_PROMPT_PACK[1] + 1, n) + rng.integers(
+            PRICE_AUTOMATION_KIT[0], PRICE_AUTOMATION_KIT[1] + 1, n
+        )
+        price = rng.integers(PRICE_BUNDLE[0], PRICE_BUNDLE[1] + 1, n)
+        hooks = [json.dumps(h + ".", ensure_ascii=False) for h in SCARCITY_HOOKS]
+        cols = {
+            "deploy": rng.choice(DEPLOY_MINUTES, n),
+            "hook": np.array(hooks, dtype=object)[rng.integers(0, len(hooks), n)],
+            "anchor": anchor,
+            "discount": np.maximum(0, anchor - price),
+            "shelf": rng.choice(SHELF_DAYS["bundle"], n),
+        }
+
+    cols["price"] = price
+    # float64 -> Python float keeps json's repr (e.g. 45.0)
+    cols["profit_lo"] = price - float(hi)
+    cols["profit_hi"] = price - float(lo)
+    return [cols[name].tolist() for name in order]
+
+def export_synthetic_catalog(count: int, out, chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+    """
+    Stream `count` Oracle-shaped products as NDJSON to the open text file
+    `out`. Memory is bounded by chunk_size rows; the type mix follows
+    BUNDLE_RATIO like draw_product(). createdAt/updatedAt are the export time
+    as ISO strings since SERVER_TIMESTAMP has no JSON form.
+    """
+    import numpy as np
+
+    seed = int(hashlib.sha1(ORACLE_SEED.encode("utf-8")).hexdigest()[:16], 16) if ORACLE_SEED else None
+    rng = np.random.default_rng(seed)
+    templates = _export_templates(now_utc().isoformat())
+    types = ("prompt_pack", "automation_kit", "bundle")
+
+    written = 0
+    while written < count:
+        n = min(chunk_size, count - written)
+        bundle = rng.random(n) < BUNDLE_RATIO
+        pack = rng.random(n) < 0.5
+        kind = np.where(bundle, 2, np.where(pack, 0, 1))
+
+        lines = [None] * n
+        for t, product_type in enumerate(types):
+            rows = np.flatnonzero(kind == t)
+            if not len(rows):
+                continue
+            tmpls, order = templates[product_type]
+            combos = rng.integers(0, len(tmpls), len(rows)).tolist()
+            cols = _export_columns(np, rng, product_type, len(rows), order)
+            for row, combo, values in zip(rows.tolist(), combos, zip(*cols)):
+                lines[row] = tmpls[combo] % values
+
+        out.write("\n".join(lines))
+        out.write("\n")
+        written += n
+    return written
+
+# ----------------------------
+# Bulk path (ORACLE_BULK=1)
+# ----------------------------
+def draw_product() -> dict:
+    niche_key, niche_desc = random.choice(NICHES)
+
+    if random.random() < BUNDLE_RATIO:
+        return build_bundle(niche_key, niche_desc)
+    return build_prompt_pack(niche_key, niche_desc) if random.random() < 0.5 else build_automation_kit(niche_key, niche_desc)
+
+def draw_owned_product() -> dict:
+    # Redraw until the product falls in this shard (about SHARD[1] draws)
+    for _ in range(1000 * SHARD[1]):
+        product = draw_product()
+        if owns(doc_id_from_dedupe(product["dedupe_key"])):
+            return product
+    raise RuntimeError(f"shard {SHARD[0]}/{SHARD[1]} owns no reachable products")
+
+@timed("existence_check")
+def existing_doc_ids(db, collection_name: str, doc_ids) -> set:
+    # One BatchGetDocuments stream for the whole batch; the mask keeps the
+    # response down to a single small field per existing doc.
+    col = db.collection(collection_name)
+    refs = [col.document(doc_id) for doc_id in doc_ids]
+    if not refs:
+        return set()
+    TELEMETRY.rpc("batch_get")
+    return {snap.id for snap in db.get_all(refs, field_paths=["dedupe_key"]) if snap.exists}
+
+@timed("bulk_write")
+def bulk_create_products(db, collection_name: str, products: dict, existing=None) -> list:
+    """
+    Write {doc_id: product} through a BulkWriter using create() so a doc that
+    appeared since the existence check is rejected server-side (ALREADY_EXISTS)
+    instead of being overwritten. Returns the doc ids that were actually created;
+    the ids rejected as already existing are appended to `existing` if given.
+    """
+    created = []
+    col = db.collection(collection_name)
+    writer = db.bulk_writer()
+
+    def on_result(reference, result, bulk_writer):
+        created.append(reference.id)
+
+    def on_batch(batch, response, bulk_writer):
+        TELEMETRY.rpc("batch_write")
+
+    def on_error(failure, bulk_writer):
+        if failure.code == GRPC_ALREADY_EXISTS:
+            TELEMETRY.count("lost_races")
+            if existing is not None:
+                existing.append(failure.operation.reference.id)
+            return False
+        return failure.attempts < BULK_MAX_ATTEMPTS
+
+    writer.on_write_result(on_result)
+    writer.on_batch_result(on_batch)
+    writer.on_write_error(on_error)
+    for doc_id, product in products.items():
+        writer.create(col.document(doc_id), product)
+    writer.close()
+    return created
+
+def run_bulk(db, collection_name: str, index=None, near=None) -> int:
+    created = 0
+    attempts = 0
+    max_attempts = BATCH_SIZE * 8
+
+    while created < BATCH_SIZE and attempts < max_attempts:
+        # Build the whole round up front; duplicates inside the round still
+        # count as attempts, same as the serial loop.
+        need = BATCH_SIZE - created
+        batch = {}
+        pending = {}
+        while len(batch) < need and attempts < max_attempts:
+            attempts += 1
+            TELEMETRY.count("attempts")
+            product = draw_owned_product()
+            doc_id = doc_id_from_dedupe(product["dedupe_key"])
+            if doc_id in batch:
+                TELEMETRY.count("duplicates")
+                continue
+            if near_duplicate_of(near, doc_id, product, pending):
+                continue
+            batch[doc_id] = product
+
+        if index is not None:
+            known = [doc_id for doc_id in batch if doc_id in index]
+            TELEMETRY.count("dedupe_index_hits", len(known))
+            TELEMETRY.count("duplicates", len(known))
+            batch = {doc_id: p for doc_id, p in batch.items() if doc_id not in index}
+
+        existing = existing_doc_ids(db, collection_name, batch.keys())
+        fresh = {doc_id: p for doc_id, p in batch.items() if doc_id not in existing}
+        TELEMETRY.count("duplicates", len(existing))
+        if index is not None and existing:
+            index.add_many(existing)
+        if not fresh:
+            continue
+
+        written = bulk_create_products(db, collection_name, fresh)
+        add_near_dups(near, pending, written)
+        if index is not None:
+            index.add_many(written)
+        TELEMETRY.count("created", len(written))
+        TELEMETRY.count("duplicates", len(fresh) - len(written))
+
+        for doc_id in written:
+            created += 1
+            product = fresh[doc_id]
+            print(f"[Oracle] Created {product['product_type']} -> {doc_id} :: {product['title']}")
+
+    return created
+
+def run_serial(db, collection_name: str, index=None, near=None) -> int:
     created = 0
     attempts = 0
 
     while created < BATCH_SIZE and attempts < BATCH_SIZE * 8:
         attempts += 1
-        niche_key, niche_desc = random.choice(NICHES)
+        TELEMETRY.count("attempts")
+        product = draw_owned_product()
+        pending = {}
+        if near_duplicate_of(near, doc_id_from_dedupe(product["dedupe_key"]), product, pending):
+            continue
 
-        if random.random() < BUNDLE_RATIO:
-            product = build_bundle(niche_key, niche_desc)
+        doc_id = upsert_product(db, collection_name, product, index)
+        if not doc_id:
+            TELEMETRY.count("duplicates")
         else:
-            product = build_prompt_pack(niche_key, niche_desc) if random.random() < 0.5 else build_automation_kit(niche_key, niche_desc)
-
-        doc_id = upsert_product(db, collection_name, product)
-        if doc_id:
+            add_near_dups(near, pending, [doc_id])
+            TELEMETRY.count("created")
             created += 1
             print(f"[Oracle] Created {product['product_type']} -> {doc_id} :: {product['title']}")
 
-    print(f"[Oracle] finished {now_utc().isoformat()} | created={created}")
+    return created
+
+# ----------------------------
+# Main
+# ----------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Oracle product generator")
+    parser.add_argument(
+        "--space-report",
+        action="store_true",
+        help="print how much of the candidate space is still unclaimed and exit",
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        help="export N synthetic products as NDJSON instead of writing to Firestore",
+    )
+    parser.add_argument("--out", default="-", help="NDJSON path for --count ('-' = stdout)")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="rows per export chunk")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="build one batch offline and print it as JSON lines (no Firestore)",
+    )
+    parser.add_argument(
+        "--enumerate",
+        action="store_true",
+        help="print every doc id / dedupe key in the candidate space (no Firestore)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=WORKERS,
+        help="local worker processes, each owning one shard (ORACLE_WORKERS)",
+    )
+    parser.add_argument(
+        "--partition",
+        default=PARTITION,
+        help="k/n: this host's share of the dedupe-key space (ORACLE_PARTITION)",
+    )
+    parser.add_argument("--daemon", action="store_true", help="keep running with one warm Firestore client")
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=DAEMON_INTERVAL_SECONDS,
+        help="daemon: seconds between run starts (ORACLE_INTERVAL_SECONDS)",
+    )
+    parser.add_argument(
+        "--cron",
+        default=DAEMON_CRON,
+        help="daemon: 5-field cron expression in UTC, overrides --interval (ORACLE_CRON)",
+    )
+    return parser.parse_args(argv)
+
+def run_dry(n: int):
+    if SAMPLER == "ranked":
+        space = [spec for spec in enumerate_candidate_space() if owns(spec.doc_id)]
+        products = []
+        for spec, score, draw in itertools.islice(iter_ranked(space, set()), n):
+            product = build_from_spec(spec, draw)
+            product["metrics"]["rank_score"] = score
+            products.append(product)
+    elif SAMPLER == "space":
+        space = [spec for spec in enumerate_candidate_space() if owns(spec.doc_id)]
+        products = [build_from_spec(spec) for spec in sample_candidates(space, set(), n)]
+    else:
+        products = [draw_owned_product() for _ in range(n)]
+    for product in products:
+        print(json.dumps(product, ensure_ascii=False))
+
+def run_enumerate():
+    space = [spec for spec in enumerate_candidate_space() if owns(spec.doc_id)]
+    out = sys.stdout
+    for spec in space:
+        out.write(f"{spec.doc_id}\t{spec.product_type}\t{spec.dedupe_key}\n")
+    print(format_space_report(space_report(space, set())), file=sys.stderr)
+
+def run_export(count: int, out_path: str, chunk_size: int):
+    started = now_utc()
+    if out_path == "-":
+        written = export_synthetic_catalog(count, sys.stdout, chunk_size)
+    else:
+        with open(out_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+            written = export_synthetic_catalog(count, f, chunk_size)
+
+    secs = (now_utc() - started).total_seconds()
+    rate = written / secs if secs else float("inf")
+    print(f"[Oracle] exported {written} products -> {out_path} in {secs:.2f}s ({rate:,.0f}/s)", file=sys.stderr)
+
+def shard_path(path: str) -> str:
+    # oracle.prom -> oracle.shard-1-of-4.prom (textfile collector wants *.prom)
+    if SHARD[1] <= 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{SHARD[0]}-of-{SHARD[1]}{ext}"
+
+def emit_telemetry(mode: str):
+    global TELEMETRY
+    summary = TELEMETRY.summary(mode=mode, shard=f"{SHARD[0]}/{SHARD[1]}", batch_size=BATCH_SIZE)
+    if METRICS_JSON_PATH:
+        write_json(shard_path(METRICS_JSON_PATH), summary)
+    else:
+        print(f"[Oracle] summary {json.dumps(summary, separators=(',', ':'))}")
+
+    _TELEMETRY_TOTAL.merge(TELEMETRY)
+    if METRICS_PROM_PATH:
+        labels = {"mode": mode, "shard": f"{SHARD[0]}/{SHARD[1]}"}
+        write_atomic(shard_path(METRICS_PROM_PATH), _TELEMETRY_TOTAL.prometheus(labels=labels))
+    TELEMETRY = Telemetry()
+
+def run_once(db, collection_name: str, index=None, near=None) -> int:
+    shard = f" | shard={SHARD[0]}/{SHARD[1]}" if SHARD[1] > 1 else ""
+    print(f"[Oracle] started {now_utc().isoformat()}{shard}")
+
+    with TELEMETRY.phase("run"):
+        if near is not None:
+            # Other shards, hosts and past runs of other processes write
+            # near-clones this index has not seen; pick them up first
+            with TELEMETRY.phase("near_dup_index_sync"):
+                synced = near.sync(db, collection_name)
+            TELEMETRY.rpc("run_query")
+            TELEMETRY.count("near_dup_synced", synced)
+
+        if SAMPLER in ("space", "ranked"):
+            created = run_space(db, collection_name, index, near, ranked=SAMPLER == "ranked")
+            mode = SAMPLER
+        elif BULK_MODE:
+            created = run_bulk(db, collection_name, index, near)
+            mode = "bulk"
+        else:
+            created = run_serial(db, collection_name, index, near)
+            mode = "serial"
+
+        if near is not None:
+            near.save()
+
+    print(f"[Oracle] finished {now_utc().isoformat()} | created={created} | mode={mode}{shard}")
+    emit_telemetry(mode)
+    return created
+
+def _worker_main(shard: int, shards: int, batch_size: int, collection_name: str) -> int:
+    # Runs in a spawned process: own Firebase app, own gRPC channel
+    global BATCH_SIZE, NEAR_DUP_INDEX_PATH
+    BATCH_SIZE = batch_size
+    set_shard(shard, shards)
+    if NEAR_DUP_INDEX_PATH:
+        # .npz files are rewritten whole, so each shard keeps its own;
+        # run_once() syncs it with the other shards' writes
+        NEAR_DUP_INDEX_PATH = shard_path(NEAR_DUP_INDEX_PATH)
+
+    db = initialize_firebase()
+    index = open_dedupe_index(db, collection_name, warm=False)
+    near = open_near_dup_index(db, collection_name)
+    return run_once(db, collection_name, index, near)
+
+def run_workers(workers: int, partition: str, collection_name: str) -> int:
+    """
+    Run `workers` processes, each on its own shard of this host's partition.
+    ORACLE_BATCH_SIZE is split across them. Shards are disjoint, so workers
+    never compete for a doc id; create() still guards against stray overlap.
+    The shared dedupe index is warmed here, once, before the workers start.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    k, n = parse_partition(partition)
+    shards = n * workers
+    sizes = [BATCH_SIZE // workers + (1 if i < BATCH_SIZE % workers else 0) for i in range(workers)]
+
+    started = time.monotonic()
+    if DEDUPE_INDEX_PATH:
+        # Every worker opens the same file. Warming it in each would scan the
+        # collection W times, and warm() holds the write lock for the whole
+        # scan, so the other workers would fail with "database is locked"
+        open_dedupe_index(initialize_firebase(), collection_name).close()
+
+    # spawn, not fork: gRPC channels are not fork-safe
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(_worker_main, k * workers + i, shards, sizes[i], collection_name)
+            for i in range(workers)
+        ]
+        created = sum(f.result() for f in futures)
+
+    secs = time.monotonic() - started
+    print(f"[Oracle] workers={workers} partition={k}/{n} created={created} in {secs:.2f}s ({created / secs:.1f}/s)")
+    return created
+
+def run_daemon(db, collection_name: str, index, near, interval: float, cron_expr: str = ""):
+    """
+    Repeat run_once() on one client until SIGTERM/SIGINT. With a cron
+    expression each run waits for the next UTC fire time; otherwise runs start
+    `interval` seconds apart (the first one immediately).
+    """
+    schedule = None
+    if cron_expr:
+        from cron import CronSchedule
+
+        schedule = CronSchedule(cron_expr)
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    print(f"[Oracle] daemon up | {'cron=' + cron_expr if schedule else f'interval={interval:g}s'}")
+    while not stop.is_set():
+        if schedule is not None:
+            now = now_utc()
+            if stop.wait((schedule.next_after(now) - now).total_seconds()):
+                break
+
+        started = time.monotonic()
+        try:
+            run_once(db, collection_name, index, near)
+        except Exception as e:
+            # A bad run must not kill the warm process; the next tick retries
+            print(f"[Oracle] run failed: {e!r}")
+
+        if schedule is None:
+            stop.wait(max(0.0, interval - (time.monotonic() - started)))
+
+    print(f"[Oracle] daemon stopped {now_utc().isoformat()}")
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if ORACLE_SEED:
+        random.seed(ORACLE_SEED)
+
+    if args.count is not None:
+        run_export(args.count, args.out, args.chunk_size)
+        return
+
+    set_shard(*parse_partition(args.partition))
+    if args.dry_run:
+        run_dry(BATCH_SIZE)
+        return
+    if args.enumerate:
+        run_enumerate()
+        return
+
+    collection_name = os.getenv("FIRESTORE_JOBS_COLLECTION", DEFAULT_COLLECTION)
+    if args.workers > 1:
+        if args.daemon:
+            raise SystemExit("--workers cannot be combined with --daemon; run one daemon per --partition")
+        run_workers(args.workers, args.partition, collection_name)
+        return
+
+    db = initialize_firebase()
+    index = open_dedupe_index(db, collection_name)
+
+    if args.space_report:
+        space = enumerate_candidate_space()
+        print(format_space_report(space_report(space, claimed_doc_ids(db, collection_name, space, index))))
+        return
+
+    near = open_near_dup_index(db, collection_name)
+    if args.daemon:
+        run_daemon(db, collection_name, index, near, args.interval, args.cron)
+    else:
+        run_once(db, collection_name, index, near)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,73 @@
+# Oracle/cron.py
+from datetime import timedelta
+
+# Minimal 5-field cron ("m h dom mon dow") for the Oracle daemon: numbers,
+# "*", lists, ranges and steps (e.g. "*/15 8-20 * * 1-5"). dow 0 and 7 are
+# Sunday. When both dom and dow are restricted either may match, as in cron.
+_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),
+)
+
+def _parse_field(text: str, lo: int, hi: int) -> set:
+    values = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"bad cron step: {step_text}")
+        if part == "*":
+            start, end = lo, hi
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-", 1))
+        else:
+            start = int(part)
+            end = hi if step > 1 else start
+        if not (lo <= start <= end <= hi):
+            raise ValueError(f"cron value out of range {lo}-{hi}: {part}")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronSchedule:
+    def __init__(self, expr: str):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron expression needs 5 fields, got {len(parts)}: {expr!r}")
+        self.expr = expr
+        fields = [_parse_field(p, lo, hi) for p, (_, lo, hi) in zip(parts, _FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        self.weekdays = {d % 7 for d in weekdays}
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+
+    def _day_matches(self, dt) -> bool:
+        dom = dt.day in self.days
+        dow = (dt.isoweekday() % 7) in self.weekdays
+        if self._any_day:
+            return dow
+        if self._any_weekday:
+            return dom
+        return dom or dow
+
+    def next_after(self, dt):
+        """First matching minute strictly after dt (timezone kept as given; use UTC)."""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        hours = sorted(self.hours)
+        minutes = sorted(self.minutes)
+        # Bounded: every valid expression fires within ~4 years (Feb 29)
+        for _ in range(366 * 5):
+            if t.month in self.months and self._day_matches(t):
+                for hour in hours:
+                    if hour < t.hour:
+                        continue
+                    first = t.minute if hour == t.hour else 0
+                    for minute in minutes:
+                        if minute >= first:
+                            return t.replace(hour=hour, minute=minute)
+            t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+        raise ValueError(f"cron expression never fires: {self.expr!r}")
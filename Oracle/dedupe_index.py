@@ -0,0 +1,105 @@
+# Oracle/dedupe_index.py
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+# Keys-only projection: Firestore returns just the document name per row
+KEYS_ONLY = ["__name__"]
+WARM_CHUNK = 5000
+
+class DedupeIndex:
+    """
+    Local SQLite set of product doc ids already claimed in Firestore.
+
+    Doc ids are the SHA1 hex from doc_id_from_dedupe(); they are stored as
+    20-byte blobs in a WITHOUT ROWID table so the file stays close to the raw
+    key size and a lookup is a single B-tree probe.
+    """
+
+    def __init__(self, path: str, collection_name: str):
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.path = path
+        self.collection_name = collection_name
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS doc_ids ("
+            " collection TEXT NOT NULL,"
+            " doc_id BLOB NOT NULL,"
+            " PRIMARY KEY (collection, doc_id)"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS warmed ("
+            " collection TEXT PRIMARY KEY,"
+            " warmed_at TEXT NOT NULL,"
+            " count INTEGER NOT NULL"
+            ")"
+        )
+        self.conn.commit()
+
+    def __contains__(self, doc_id: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM doc_ids WHERE collection = ? AND doc_id = ?",
+            (self.collection_name, bytes.fromhex(doc_id)),
+        ).fetchone()
+        return row is not None
+
+    def add(self, doc_id: str):
+        self.add_many([doc_id])
+
+    def add_many(self, doc_ids):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO doc_ids (collection, doc_id) VALUES (?, ?)",
+            ((self.collection_name, bytes.fromhex(d)) for d in doc_ids),
+        )
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM doc_ids WHERE collection = ?", (self.collection_name,)
+        ).fetchone()[0]
+
+    def is_warm(self) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM warmed WHERE collection = ?", (self.collection_name,)
+        ).fetchone()
+        return row is not None
+
+    def warm(self, db) -> int:
+        """
+        Load every doc id in the collection with a keys-only query. Ids that
+        are not SHA1 hex (hand-made docs) can never collide with Oracle ids
+        and are skipped.
+        """
+        collection_name = self.collection_name
+        self.conn.execute("DELETE FROM doc_ids WHERE collection = ?", (collection_name,))
+        total = 0
+        chunk = []
+        for snap in db.collection(collection_name).select(KEYS_ONLY).stream():
+            if len(snap.id) != 40:
+                continue
+            try:
+                chunk.append((collection_name, bytes.fromhex(snap.id)))
+            except ValueError:
+                continue
+            if len(chunk) >= WARM_CHUNK:
+                self.conn.executemany("INSERT OR IGNORE INTO doc_ids VALUES (?, ?)", chunk)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            self.conn.executemany("INSERT OR IGNORE INTO doc_ids VALUES (?, ?)", chunk)
+            total += len(chunk)
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO warmed (collection, warmed_at, count) VALUES (?, ?, ?)",
+            (collection_name, datetime.now(timezone.utc).isoformat(), total),
+        )
+        self.conn.commit()
+        return total
+
+    def close(self):
+        self.conn.close()
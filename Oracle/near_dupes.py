@@ -0,0 +1,231 @@
+# Oracle/near_dupes.py
+import os
+import re
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+# MinHash over shingled product text with LSH banding. Exact dedupe keys
+# already stop identical combos; this catches near-clones such as the 75 vs
+# 100 prompt variants of one theme that the qa-gate would later flag as the
+# same concept.
+NUM_PERM = 128
+BANDS = 32
+DEFAULT_THRESHOLD = 0.85
+
+# Title-like fields are repeated so shared description/payload boilerplate
+# does not make every product of one type look alike, and the niche is its
+# own heavily weighted field because a bundle's text barely mentions it.
+# Counts and the product's own platform names are masked (see _tokens), so
+# count/platform variants of one niche+concept share every shingle (1.0).
+# Measured across Oracle's own space at these weights, different concepts
+# stay <= 0.79 (same niche) and <= 0.78 (other niches): one product per
+# concept gets past the 0.85 threshold.
+FIELD_WEIGHTS = {"t": 3, "d": 1, "p": 1, "c": 6, "n": 16}
+
+# Saved with the signatures; a file from another version is discarded and
+# rewarmed, since its signatures are not comparable. 3: warm() reads the
+# niche, so files warmed by version 2 hold signatures without it.
+SHINGLE_VERSION = 3
+
+# Fields shingles() reads; warm() and sync() project to these, or their
+# signatures would differ from add()'s
+WARM_FIELDS = ["title", "description", "payload", "bundle_components_meta", "niche"]
+
+# sync() re-reads products created this long before the newest one it has
+# seen, in case commits around that time became visible out of order
+SYNC_OVERLAP_SECONDS = 60
+
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+_WORD = re.compile(r"[a-z#]+")
+_DIGITS = re.compile(r"\d+")
+
+def _tokens(text: str, variants=frozenset()) -> list:
+    # Counts ("75 prompts" vs "100 prompts") and platforms ("n8n" vs "Make")
+    # are variant noise, not concept
+    words = _WORD.findall(_DIGITS.sub("#", text.lower()))
+    return ["@" if w in variants else w for w in words]
+
+def _platform_words(value) -> set:
+    """Tokens of every "platform" value in a payload (a kit's, or a bundle's kit's)."""
+    words = set()
+    if isinstance(value, dict):
+        for k, v in value.items():
+            if k == "platform" and isinstance(v, str):
+                words.update(_tokens(v))
+            else:
+                words |= _platform_words(v)
+    return words
+
+def _leaves(value):
+    if isinstance(value, dict):
+        for k in sorted(value):
+            yield from _leaves(value[k])
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _leaves(v)
+    elif isinstance(value, str):
+        yield value
+
+def shingles(product: dict) -> set:
+    """Field-tagged word bigrams (unigrams for one-word fields), weighted."""
+    fields = {
+        "t": product.get("title", ""),
+        "d": product.get("description", ""),
+        "p": " ".join(_leaves(product.get("payload") or {})),
+        "c": " ".join(_leaves(product.get("bundle_components_meta") or {})),
+        "n": product.get("niche", ""),
+    }
+    variants = _platform_words(product.get("payload") or {})
+    out = set()
+    for tag, text in fields.items():
+        words = _tokens(text, variants)
+        grams = [f"{a} {b}" for a, b in zip(words, words[1:])] or words
+        for copy in range(FIELD_WEIGHTS[tag]):
+            out.update(f"{tag}{copy}:{g}" for g in grams)
+    return out
+
+class NearDuplicateIndex:
+    """
+    In-memory MinHash/LSH index persisted as a single .npz file.
+
+    Signatures are NUM_PERM uint64 minima of (a*x + b) mod p over the CRC32
+    of each shingle; a candidate is a near-duplicate when any LSH band
+    collides with an indexed product and the estimated Jaccard similarity
+    reaches `threshold`.
+    """
+
+    def __init__(self, path: str = "", threshold: float = DEFAULT_THRESHOLD,
+                 num_perm: int = NUM_PERM, bands: int = BANDS, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        rng = np.random.default_rng(seed)
+        # a < 2**31 and x < 2**32 keep a*x + b inside uint64
+        self._a = rng.integers(1, 2**31, num_perm, dtype=np.uint64)[:, None]
+        self._b = rng.integers(0, 2**32, num_perm, dtype=np.uint64)[:, None]
+
+        self.ids = []
+        self._known = set()
+        # Newest createdAt (epoch seconds) seen by warm()/sync(); None -> sync() reads everything
+        self.synced_at = None
+        self._sigs = np.empty((256, num_perm), dtype=np.uint64)
+        self._buckets = [{} for _ in range(bands)]
+
+        if path and os.path.exists(path):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def signature(self, product: dict) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles(product)), dtype=np.uint64
+        )
+        if not len(hashes):
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        return ((self._a * hashes[None, :] + self._b) % _PRIME).min(axis=1)
+
+    def _band_keys(self, sig: np.ndarray):
+        return [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def query(self, product: dict, sig: np.ndarray = None):
+        """Return (doc_id, similarity) of the closest near-duplicate, or None."""
+        if sig is None:
+            sig = self.signature(product)
+
+        candidates = set()
+        for bucket, key in zip(self._buckets, self._band_keys(sig)):
+            candidates.update(bucket.get(key, ()))
+        if not candidates:
+            return None
+
+        rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarity = (self._sigs[rows] == sig).sum(axis=1) / self.num_perm
+        best = int(similarity.argmax())
+        if similarity[best] < self.threshold:
+            return None
+        return self.ids[rows[best]], float(similarity[best])
+
+    def add(self, doc_id: str, product: dict = None, sig: np.ndarray = None):
+        if sig is None:
+            sig = self.signature(product)
+        row = len(self.ids)
+        if row == len(self._sigs):
+            self._sigs = np.concatenate([self._sigs, np.empty_like(self._sigs)])
+        self.ids.append(doc_id)
+        self._known.add(doc_id)
+        self._sigs[row] = sig
+        for bucket, key in zip(self._buckets, self._band_keys(sig)):
+            bucket.setdefault(key, []).append(row)
+
+    def _seen_created(self, created_at):
+        if isinstance(created_at, datetime):
+            ts = created_at.timestamp()
+            if self.synced_at is None or ts > self.synced_at:
+                self.synced_at = ts
+
+    def warm(self, db, collection_name: str) -> int:
+        count = 0
+        for snap in db.collection(collection_name).select(WARM_FIELDS + ["createdAt"]).stream():
+            data = snap.to_dict() or {}
+            self._seen_created(data.get("createdAt"))
+            self.add(snap.id, data)
+            count += 1
+        return count
+
+    def sync(self, db, collection_name: str) -> int:
+        """
+        Add the products created since the last warm() or sync(), whoever
+        wrote them; returns how many were new. Each shard and host keeps its
+        own file, so without this one never sees the others' writes.
+        """
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        query = db.collection(collection_name).select(WARM_FIELDS + ["createdAt"])
+        if self.synced_at is not None:
+            since = datetime.fromtimestamp(self.synced_at - SYNC_OVERLAP_SECONDS, timezone.utc)
+            query = query.where(filter=FieldFilter("createdAt", ">=", since))
+        count = 0
+        for snap in query.stream():
+            data = snap.to_dict() or {}
+            self._seen_created(data.get("createdAt"))
+            if snap.id not in self._known:
+                self.add(snap.id, data)
+                count += 1
+        return count
+
+    def save(self):
+        if not self.path:
+            return
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+        tmp = self.path + ".tmp.npz"
+        np.savez(
+            tmp,
+            ids=np.array(self.ids, dtype="U40"),
+            sigs=self._sigs[:len(self.ids)],
+            params=np.array([self.num_perm, self.bands, SHINGLE_VERSION], dtype=np.int64),
+            synced_at=np.array([np.nan if self.synced_at is None else self.synced_at]),
+        )
+        os.replace(tmp, self.path)
+
+    def _load(self):
+        with np.load(self.path) as data:
+            params = tuple(int(x) for x in data["params"])
+            if params != (self.num_perm, self.bands, SHINGLE_VERSION):
+                # Different banding or shingling -> signatures are not comparable; start over
+                return
+            for doc_id, sig in zip(data["ids"].tolist(), data["sigs"]):
+                self.add(doc_id, sig=sig)
+            # Files saved before sync() existed have no watermark: the first sync reads everything
+            if "synced_at" in data.files and not np.isnan(data["synced_at"][0]):
+                self.synced_at = float(data["synced_at"][0])
@@ -0,0 +1,533 @@
+# Oracle/packager.py
+"""
+Content-addressed deliverable packager for Oracle products.
+
+    python packager.py build --space                  # every product in the candidate space
+    python packager.py build --in catalog.ndjson      # rows from brain.py --count
+    python packager.py zip <doc id | dedupe key> --out bundle.zip   ('-' = stdout)
+    python packager.py stats
+
+A product's deliverables are generated from its payload: prompt-pack.txt
+and readme.md for a prompt pack; workflow.json, setup.md, qa-checklist.md
+and troubleshooting.md for an automation kit. A bundle is a prompt pack
+plus a kit, so it owns no files of its own. Its manifest points at the
+blobs of the two components it embeds.
+
+Files live once in a blob store keyed by the SHA-256 of their content. Each
+blob is saved as a raw deflate stream, along with its CRC-32 and sizes. A
+zip is then written by copying those streams behind hand-built headers, with
+no recompression and no temp copy. This works on non-seekable outputs too
+(stdout, an HTTP response). Generation is memoized per component, so
+packaging 10k bundles that share 15 packs and 60 kits runs the generators
+75 times, and identical files across components are stored once.
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import sqlite3
+import hashlib
+import argparse
+import itertools
+
+# ----------------------------
+# Config (env-driven)
+# ----------------------------
+PACKAGE_DIR = os.getenv("ORACLE_PACKAGE_DIR", "data/packages")
+PACKAGE_LEVEL = int(os.getenv("ORACLE_PACKAGE_LEVEL", "9"))  # deflate level; paid once per blob
+COPY_CHUNK = 1 << 16
+
+# Bump when a generator's output changes; old component entries are then
+# regenerated rather than reused
+GENERATOR_VERSION = 1
+
+# Zip entries carry a fixed timestamp so the same bundle always zips to the
+# same bytes (1980-01-01 00:00, the DOS epoch)
+_DOS_TIME, _DOS_DATE = 0, (0 << 9) | (1 << 5) | 1
+
+# ----------------------------
+# Deliverable generators
+# ----------------------------
+# Prompts are composed from fixed axes by index, so a pack's text depends only
+# on its theme, models and count.
+SUBJECTS = [
+    "a product box floating above a reflective floor",
+    "an open laptop showing a dashboard",
+    "a stack of premium notebooks",
+    "a smartphone with a glowing app screen",
+    "a minimal desk setup at night",
+    "an abstract data sculpture",
+    "a storefront window display",
+    "a hand holding a credit card",
+    "a wall of modular shelves",
+    "a cinematic city skyline",
+]
+COMPOSITIONS = [
+    "centered hero shot",
+    "rule-of-thirds, subject left",
+    "top-down flat lay",
+    "low angle, dramatic perspective",
+    "tight macro crop",
+    "wide establishing shot with negative space",
+]
+LIGHTING = [
+    "soft studio lighting",
+    "hard rim light",
+    "neon accent glow",
+    "golden hour backlight",
+    "overcast diffuse light",
+]
+NEGATIVE_PROMPTS = [
+    "blurry, low resolution, jpeg artifacts",
+    "extra fingers, distorted hands",
+    "watermark, signature, stray text",
+    "oversaturated, muddy shadows",
+    "cluttered background, busy composition",
+]
+MODEL_SUFFIX = {
+    "Midjourney": "--ar 1:1 --style raw --v 6",
+    "DALL·E": "(square, 1024x1024)",
+    "SDXL": "steps: 30, cfg: 6.5, sampler: DPM++ 2M Karras",
+}
+
+def _theme(title: str) -> str:
+    return title.split(" Prompt Pack", 1)[0]
+
+def _kit_name(title: str) -> str:
+    return title.rsplit(" (", 1)[0]
+
+def prompt_pack_txt(title: str, payload: dict) -> str:
+    theme = _theme(title)
+    models = payload.get("models") or ["Midjourney"]
+    count = int(payload.get("prompt_count") or 0)
+    axes = itertools.product(range(len(SUBJECTS)), range(len(COMPOSITIONS)), range(len(LIGHTING)))
+
+    out = [title, "=" * len(title), "", f"Models: {', '.join(models)}", f"Prompts: {count}", ""]
+    for i, (s, c, l) in zip(range(count), axes):
+        model = models[i % len(models)]
+        prompt = f"{theme} style, {SUBJECTS[s]}, {COMPOSITIONS[c]}, {LIGHTING[l]}, premium commercial look"
+        out.append(f"{i + 1:03d}. [{model}] {prompt} {MODEL_SUFFIX.get(model, '')}".rstrip())
+    out += ["", "Negative prompts", "----------------"]
+    out += [f"- {n}" for n in NEGATIVE_PROMPTS]
+    return "\n".join(out) + "\n"
+
+def prompt_pack_readme(title: str, payload: dict) -> str:
+    models = payload.get("models") or []
+    out = [
+        f"# {title}",
+        "",
+        f"{payload.get('prompt_count', 0)} prompts written for {', '.join(models)}.",
+        "",
+        "## What's inside",
+        "",
+    ]
+    out += [f"- {item}" for item in payload.get("includes") or []]
+    out += [
+        "",
+        "## How to use",
+        "",
+        "1. Pick a prompt from `prompt-pack.txt` and paste it into your model of choice.",
+        "2. Keep the model-specific suffix; it pins aspect ratio and sampling.",
+        "3. Add the negative prompts at the end of the file if your model supports them.",
+        "4. Swap the subject phrase to adapt a prompt without losing the style.",
+        "",
+    ]
+    return "\n".join(out)
+
+def workflow_json(title: str, payload: dict) -> str:
+    platform = payload.get("platform", "n8n")
+    integrations = payload.get("integrations") or []
+    steps = ["Trigger"] + list(integrations)
+    nodes = [
+        {
+            "id": f"node_{i}",
+            "name": name,
+            "type": "trigger" if i == 0 else "action",
+            "app": None if i == 0 else name,
+            "position": [i * 260, 0],
+            "parameters": {},
+        }
+        for i, name in enumerate(steps)
+    ]
+    workflow = {
+        "name": _kit_name(title),
+        "platform": platform,
+        "nodes": nodes,
+        "connections": [{"from": a["id"], "to": b["id"]} for a, b in zip(nodes, nodes[1:])],
+        "settings": {"timezone": "UTC", "errorWorkflow": None},
+    }
+    return json.dumps(workflow, indent=2, ensure_ascii=False) + "\n"
+
+def setup_md(title: str, payload: dict) -> str:
+    platform = payload.get("platform", "n8n")
+    integrations = payload.get("integrations") or []
+    out = [
+        f"# Setup: {_kit_name(title)}",
+        "",
+        f"Platform: **{platform}**. Expected time to deploy: about {payload.get('time_to_deploy_minutes', 30)} minutes.",
+        "",
+        "## Steps",
+        "",
+        f"1. Import `workflow.json` into {platform}.",
+    ]
+    out += [f"{i}. Connect your {name} account and pick the target resource." for i, name in enumerate(integrations, 2)]
+    n = len(integrations) + 2
+    out += [
+        f"{n}. Run the workflow once with test data.",
+        f"{n + 1}. Work through `qa-checklist.md`, then switch the workflow on.",
+        "",
+    ]
+    return "\n".join(out)
+
+def qa_checklist_md(title: str, payload: dict) -> str:
+    out = [f"# QA checklist: {_kit_name(title)}", ""]
+    for name in payload.get("integrations") or []:
+        out += [
+            f"- [ ] {name}: credentials connected and scoped to the right workspace",
+            f"- [ ] {name}: test record created, then removed",
+        ]
+    out += [
+        "- [ ] Failure path tested (disconnect one app and confirm the error alert)",
+        "- [ ] Duplicate trigger does not create duplicate records",
+        "- [ ] Workflow enabled and first live run checked",
+        "",
+    ]
+    return "\n".join(out)
+
+def troubleshooting_md(title: str, payload: dict) -> str:
+    platform = payload.get("platform", "n8n")
+    out = [f"# Troubleshooting: {_kit_name(title)}", ""]
+    for name in payload.get("integrations") or []:
+        out += [
+            f"## {name}",
+            "",
+            f"- **401 / auth expired**: reconnect {name} in {platform} and re-run the last execution.",
+            f"- **Missing fields**: re-map the {name} step after renaming columns or properties.",
+            "",
+        ]
+    out += [
+        "## Rate limits",
+        "",
+        f"Add a delay step before the busiest app, or lower the trigger frequency in {platform}.",
+        "",
+    ]
+    return "\n".join(out)
+
+# filename -> generator(title, payload). prompt-pack.pdf is rendered from the
+# text downstream (GhostSystems formatter) and is not produced here
+GENERATORS = {
+    "prompt_pack": {
+        "prompt-pack.txt": prompt_pack_txt,
+        "readme.md": prompt_pack_readme,
+    },
+    "automation_kit": {
+        "workflow.json": workflow_json,
+        "setup.md": setup_md,
+        "qa-checklist.md": qa_checklist_md,
+        "troubleshooting.md": troubleshooting_md,
+    },
+}
+
+# Folder each component gets inside a bundle zip
+BUNDLE_DIRS = {"prompt_pack": "prompt-pack/", "automation_kit": "automation-kit/"}
+
+def components(product: dict) -> list:
+    """[(component type, title, payload, arc prefix)] a product's files come from."""
+    product_type = product.get("product_type") or product.get("productType")
+    payload = product.get("payload") or {}
+    if product_type in GENERATORS:
+        return [(product_type, product.get("title", ""), payload, "")]
+    if product_type == "bundle":
+        meta = product.get("bundle_components_meta") or {}
+        includes = payload.get("bundle_includes") or {}
+        return [
+            (kind, meta.get(f"{kind}_title", ""), includes[kind], BUNDLE_DIRS[kind])
+            for kind in ("prompt_pack", "automation_kit")
+            if kind in includes
+        ]
+    raise ValueError(f"unknown product type: {product_type!r}")
+
+def component_key(kind: str, title: str, payload: dict) -> str:
+    canonical = json.dumps([GENERATOR_VERSION, kind, title, payload], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def product_id(product: dict) -> str:
+    # Same id brain.py gives the Firestore doc
+    return hashlib.sha1(product["dedupe_key"].encode("utf-8")).hexdigest()
+
+# ----------------------------
+# Blob store + manifests
+# ----------------------------
+class PackageStore:
+    """
+    Blobs under <base>/blobs/ab/<sha256>, each a raw deflate stream written
+    once via rename. SQLite in <base>/index.sqlite holds:
+
+      blobs       sha256 -> size, compressed size, crc32
+      components  component key -> [[filename, sha256], ...]
+      manifests   product doc id -> dedupe key, [[arcname, sha256], ...]
+    """
+
+    def __init__(self, base: str = PACKAGE_DIR, level: int = PACKAGE_LEVEL):
+        self.base = base
+        self.level = level
+        self.blob_dir = os.path.join(base, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(base, "index.sqlite"))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " hash TEXT PRIMARY KEY, size INTEGER NOT NULL, csize INTEGER NOT NULL, crc INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS components (key TEXT PRIMARY KEY, files TEXT NOT NULL) WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS manifests ("
+            " product_id TEXT PRIMARY KEY, dedupe_key TEXT NOT NULL, entries TEXT NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS manifests_dedupe ON manifests (dedupe_key)")
+        self.conn.commit()
+        self._components = {}  # component key -> files, for this process
+        self.generated = 0     # components generated (cache misses) by this process
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def put_blob(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if self.conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone():
+            return digest
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        packed = compressor.compress(data) + compressor.flush()
+        path = self.blob_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(packed)
+        os.replace(tmp, path)
+        self.conn.execute(
+            "INSERT OR IGNORE INTO blobs (hash, size, csize, crc) VALUES (?, ?, ?, ?)",
+            (digest, len(data), len(packed), zlib.crc32(data)),
+        )
+        return digest
+
+    def read_blob(self, digest: str) -> bytes:
+        with open(self.blob_path(digest), "rb") as f:
+            return zlib.decompress(f.read(), -15)
+
+    def component_files(self, kind: str, title: str, payload: dict) -> list:
+        """[[filename, sha256], ...] for one component; generated on first sight only."""
+        key = component_key(kind, title, payload)
+        files = self._components.get(key)
+        if files is not None:
+            return files
+        row = self.conn.execute("SELECT files FROM components WHERE key = ?", (key,)).fetchone()
+        if row:
+            files = json.loads(row[0])
+        else:
+            files = [
+                [name, self.put_blob(generate(title, payload).encode("utf-8"))]
+                for name, generate in GENERATORS[kind].items()
+            ]
+            self.conn.execute("INSERT OR REPLACE INTO components (key, files) VALUES (?, ?)", (key, json.dumps(files)))
+            self.generated += 1
+        self._components[key] = files
+        return files
+
+    def add_product(self, product: dict) -> str:
+        """Record the product's manifest; returns its doc id."""
+        entries = [
+            [prefix + name, digest]
+            for kind, title, payload, prefix in components(product)
+            for name, digest in self.component_files(kind, title, payload)
+        ]
+        doc_id = product_id(product)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO manifests (product_id, dedupe_key, entries) VALUES (?, ?, ?)",
+            (doc_id, product["dedupe_key"], json.dumps(entries, separators=(",", ":"))),
+        )
+        return doc_id
+
+    def add_products(self, products, commit_every: int = 5000) -> int:
+        n = 0
+        for n, product in enumerate(products, 1):
+            self.add_product(product)
+            if n % commit_every == 0:
+                self.conn.commit()
+        self.conn.commit()
+        return n
+
+    def manifest(self, ref: str) -> list:
+        """Entries for a product by doc id or dedupe key; KeyError if unknown."""
+        row = self.conn.execute(
+            "SELECT entries FROM manifests WHERE product_id = ? OR dedupe_key = ? LIMIT 1", (ref, ref)
+        ).fetchone()
+        if row is None:
+            raise KeyError(ref)
+        return json.loads(row[0])
+
+    def write_zip(self, ref: str, out) -> int:
+        """Stream the product's zip to the binary file `out`; returns bytes written."""
+        entries = self.manifest(ref)
+        digests = sorted({d for _, d in entries})
+        meta = {
+            row[0]: row[1:]
+            for row in self.conn.execute(
+                f"SELECT hash, size, csize, crc FROM blobs WHERE hash IN ({','.join('?' * len(digests))})", digests
+            )
+        }
+        writer = ZipStreamWriter(out)
+        for arcname, digest in entries:
+            size, csize, crc = meta[digest]
+            with open(self.blob_path(digest), "rb") as src:
+                writer.add_deflated(arcname, src, size, csize, crc)
+        return writer.close()
+
+    def stats(self) -> dict:
+        q = lambda sql: self.conn.execute(sql).fetchone()
+        blobs, size, csize = q("SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(csize), 0) FROM blobs")
+        sizes = dict(self.conn.execute("SELECT hash, csize FROM blobs"))
+        products = 0
+        logical = 0
+        for (entries,) in self.conn.execute("SELECT entries FROM manifests"):
+            products += 1
+            logical += sum(sizes.get(d, 0) for _, d in json.loads(entries))
+        return {
+            "products": products,
+            "components": q("SELECT COUNT(*) FROM components")[0],
+            "blobs": blobs,
+            "blob_bytes": size,
+            "stored_bytes": csize,
+            # What one compressed copy per product would take
+            "logical_bytes": logical,
+            "dedupe_ratio": round(logical / csize, 1) if csize else 0.0,
+        }
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+# ----------------------------
+# Streaming zip writer
+# ----------------------------
+class ZipStreamWriter:
+    """
+    Minimal zip writer for entries that are already raw deflate streams.
+
+    Sizes and CRCs are known up front, so every local header is final and
+    no data descriptors or seeks are needed. No zip64: entries and archives
+    must stay under 4 GiB, which deliverables do by orders of magnitude.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.offset = 0
+        self.central = []
+
+    def _write(self, data: bytes):
+        self.out.write(data)
+        self.offset += len(data)
+
+    def add_deflated(self, arcname: str, src, size: int, csize: int, crc: int):
+        if max(size, csize, self.offset) >= 0xFFFFFFFF:
+            raise ValueError(f"{arcname}: zip64 is not supported")
+        name = arcname.encode("utf-8")
+        # version 20, flag 0x0800 (UTF-8 names), method 8 (deflate)
+        fields = (20, 0x0800, 8, _DOS_TIME, _DOS_DATE, crc, csize, size, len(name), 0)
+        header_offset = self.offset
+        self._write(b"PK\x03\x04" + struct.pack("<HHHHHIIIHH", *fields) + name)
+        remaining = csize
+        while remaining:
+            chunk = src.read(min(COPY_CHUNK, remaining))
+            if not chunk:
+                raise ValueError(f"{arcname}: blob is shorter than recorded")
+            self._write(chunk)
+            remaining -= len(chunk)
+        self.central.append(
+            b"PK\x01\x02"
+            + struct.pack("<HHHHHHIIIHHHHHII", 20, *fields, 0, 0, 0, 0o100644 << 16, header_offset)
+            + name
+        )
+
+    def close(self) -> int:
+        start = self.offset
+        for record in self.central:
+            self._write(record)
+        n = len(self.central)
+        self._write(b"PK\x05\x06" + struct.pack("<HHHHIIH", 0, 0, n, n, self.offset - start, start, 0))
+        return self.offset
+
+# ----------------------------
+# CLI
+# ----------------------------
+def iter_ndjson(path: str):
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def iter_space():
+    # Every distinct product brain.py can emit, built once each
+    from brain import build_from_spec, enumerate_candidate_space
+
+    for spec in enumerate_candidate_space():
+        yield build_from_spec(spec)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dir", default=PACKAGE_DIR, help="blob store and index directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="generate deliverables and manifests")
+    source = build.add_mutually_exclusive_group(required=True)
+    source.add_argument("--in", dest="path", help="NDJSON products ('-' = stdin), e.g. from brain.py --count")
+    source.add_argument("--space", action="store_true", help="the full Oracle candidate space")
+
+    zip_cmd = sub.add_parser("zip", help="stream one product's zip")
+    zip_cmd.add_argument("ref", help="product doc id or dedupe key")
+    zip_cmd.add_argument("--out", default="-", help="zip path ('-' = stdout)")
+
+    sub.add_parser("stats", help="blob store and manifest totals")
+    args = parser.parse_args(argv)
+
+    store = PackageStore(args.dir)
+    try:
+        if args.command == "build":
+            started = time.perf_counter()
+            products = store.add_products(iter_space() if args.space else iter_ndjson(args.path))
+            secs = time.perf_counter() - started
+            print(
+                f"[Oracle] packaged {products} products in {secs:.2f}s | "
+                f"components generated={store.generated}",
+                file=sys.stderr,
+            )
+            print(json.dumps(store.stats(), indent=2))
+        elif args.command == "zip":
+            if args.out == "-":
+                written = store.write_zip(args.ref, sys.stdout.buffer)
+                sys.stdout.buffer.flush()
+            else:
+                with open(args.out, "wb") as f:
+                    written = store.write_zip(args.ref, f)
+            print(f"[Oracle] zip {args.ref} | bytes={written}", file=sys.stderr)
+        else:
+            print(json.dumps(store.stats(), indent=2))
+    except KeyError as e:
+        print(f"[Oracle] no manifest for {e.args[0]}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
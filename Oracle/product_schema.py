@@ -0,0 +1,317 @@
+# Oracle/product_schema.py
+"""
+Versioned product documents: the compact v2 shape, a read adapter back to v1, and a streaming migration.
+
+    python product_schema.py migrate                          # rewrite v1 docs in the products collection
+    python product_schema.py migrate --dry-run --limit 2000   # only report what it would save
+    python product_schema.py migrate --list > saved.tsv       # one line per document: id, bytes before/after
+    python product_schema.py migrate --restart                # ignore the checkpoint, rescan from the start
+
+A v1 document has no "schema" field. It writes each flag under two names
+(product_type/productType, is_digital/digital,
+requires_shipping/requiresShipping) and inlines the whole style guide in its
+image. A v2 document ("schema": 2) keeps only the snake_case names, which
+every consumer already reads. Its image names the style guide
+("style_guide": "premium_minimal") rather than copying it. expand() turns a
+v2 document back into the exact v1 shape, for readers that still want the
+aliases or the inlined guide.
+
+migrate streams the collection in document-id order, one page at a time.
+Each v1 document gets an update that deletes its aliases and swaps the
+image, with a precondition on the update time it was read at. The page's
+updates go through one BulkWriter flush, and the cursor is checkpointed
+after it. A document changed since it was read is re-read and retried before
+the cursor moves on; one that keeps changing is checkpointed as pending and
+retried at the start of the next run. An interrupted run resumes from the
+last finished page. Sizes are
+Firestore's billed document sizes (field names, values and the document
+name), so "saved" is what storage and reads stop paying for.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+from datetime import datetime, timezone
+
+from telemetry import write_json
+
+# ----------------------------
+# Config (env-driven)
+# ----------------------------
+MIGRATION_CHECKPOINT = os.getenv("ORACLE_MIGRATION_CHECKPOINT", "data/schema_migration.json")
+MIGRATION_PAGE_SIZE = int(os.getenv("ORACLE_MIGRATION_PAGE_SIZE", "300"))
+MIGRATION_MAX_ATTEMPTS = int(os.getenv("ORACLE_MIGRATION_MAX_ATTEMPTS", "5"))
+GRPC_FAILED_PRECONDITION = 9
+
+# ----------------------------
+# Schema
+# ----------------------------
+SCHEMA_VERSION = 2
+
+# v1 camelCase alias -> the snake_case field it duplicates
+ALIASES = {
+    "productType": "product_type",
+    "digital": "is_digital",
+    "requiresShipping": "requires_shipping",
+}
+
+# Images name one of these instead of copying it. A published guide is never
+# edited (v1 documents are matched against it); add a new name instead.
+STYLE_GUIDES = {
+    "premium_minimal": {
+        "image_style": "premium, minimalist, high-contrast, modern SaaS bundle cover",
+        "format": "square 1:1",
+        "notes": "Strong title typography + abstract tech motif",
+    },
+}
+
+def compact(product: dict) -> dict:
+    """
+    v2 copy of a product in either shape. Lossless: an alias that disagrees
+    with its snake_case field, or an image whose style fields match no known
+    guide, is kept as is.
+    """
+    out = {}
+    for key, value in product.items():
+        primary = ALIASES.get(key)
+        if primary is None:
+            out[key] = value
+        elif primary not in product:
+            out[primary] = value  # alias-only document: keep the value under the primary name
+        elif product[primary] != value:
+            out[key] = value
+
+    image = product.get("image")
+    if isinstance(image, dict) and "style_guide" not in image:
+        for name, guide in STYLE_GUIDES.items():
+            if all(image.get(k) == v for k, v in guide.items()):
+                out["image"] = {"style_guide": name, **{k: v for k, v in image.items() if k not in guide}}
+                break
+
+    out["schema"] = SCHEMA_VERSION
+    return out
+
+def expand(doc: dict) -> dict:
+    """v1 view of a product in either shape (read-compat for consumers of the old fields)."""
+    if not doc or doc.get("schema") != SCHEMA_VERSION:
+        return doc
+    out = {k: v for k, v in doc.items() if k != "schema"}
+    for alias, primary in ALIASES.items():
+        if primary in out and alias not in out:
+            out[alias] = out[primary]
+    image = out.get("image")
+    if isinstance(image, dict) and image.get("style_guide") in STYLE_GUIDES:
+        rest = {k: v for k, v in image.items() if k != "style_guide"}
+        out["image"] = {**rest, **STYLE_GUIDES[image["style_guide"]]}
+    return out
+
+def read_product(snapshot) -> dict:
+    """expand(snapshot.to_dict()), for code that read product documents before v2."""
+    return expand(snapshot.to_dict())
+
+def update_fields(old: dict, new: dict, delete_field) -> dict:
+    """Top-level update turning `old` into `new`; removed keys map to delete_field."""
+    fields = {key: delete_field for key in old if key not in new}
+    fields.update((key, value) for key, value in new.items() if key not in old or old[key] != value)
+    return fields
+
+# ----------------------------
+# Document size (Firestore storage size rules)
+# ----------------------------
+def value_size(value) -> int:
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(value_size(k) + value_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(v) for v in value)
+    if hasattr(value, "path"):  # document reference
+        return name_size(value.path)
+    if hasattr(value, "latitude"):  # GeoPoint
+        return 16
+    return 8  # server timestamp and other transforms resolve to a timestamp
+
+def name_size(path: str) -> int:
+    return sum(value_size(part) for part in path.split("/")) + 16
+
+def document_size(path: str, data: dict) -> int:
+    return name_size(path) + value_size(data or {}) + 32
+
+# ----------------------------
+# Migration
+# ----------------------------
+def load_checkpoint(path: str, collection_name: str) -> dict:
+    state = {
+        "collection": collection_name, "cursor": None, "scanned": 0, "migrated": 0,
+        "conflicts": 0, "bytes_before": 0, "bytes_after": 0, "pending": [],
+    }
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("collection") != collection_name:
+            raise RuntimeError(f"checkpoint {path} is for collection '{saved.get('collection')}', not '{collection_name}'")
+        state.update(saved)
+    return state
+
+def write_page(db, collection_name: str, snaps, dry_run: bool = False):
+    """
+    Update every v1 document in snaps to v2 through one BulkWriter flush,
+    each on the update time it was read at. Returns ({doc_id: (bytes before,
+    after)} for the documents rewritten, [ids that changed since read]).
+    """
+    from firebase_admin import firestore
+
+    writer = None if dry_run else db.bulk_writer()
+    failed = []
+    if writer is not None:
+        def on_error(failure, bulk_writer):
+            if failure.code == GRPC_FAILED_PRECONDITION:
+                failed.append(failure.operation.reference.id)  # changed since read; migrate() re-reads it
+                return False
+            return failure.attempts < MIGRATION_MAX_ATTEMPTS
+        writer.on_write_error(on_error)
+
+    sizes = {}
+    for snap in snaps:
+        data = snap.to_dict() or {}
+        if data.get("schema") == SCHEMA_VERSION:
+            continue
+        new = compact(data)
+        path = f"{collection_name}/{snap.id}"
+        sizes[snap.id] = (document_size(path, data), document_size(path, new))
+        if writer is not None:
+            writer.update(
+                snap.reference, update_fields(data, new, firestore.DELETE_FIELD),
+                option=db.write_option(last_update_time=snap.update_time),
+            )
+    if writer is not None:
+        writer.close()
+
+    for doc_id in failed:
+        sizes.pop(doc_id, None)
+    return sizes, failed
+
+def migrate(db, collection_name: str, checkpoint: str = MIGRATION_CHECKPOINT, page_size: int = MIGRATION_PAGE_SIZE,
+            limit: int = 0, dry_run: bool = False, report=None, should_stop=lambda: False) -> dict:
+    """
+    Rewrite v1 products as v2, one page at a time, resuming from `checkpoint`
+    ("" = no checkpoint). `report(doc_id, before, after)` is called for every
+    document rewritten (or, with dry_run, that would be). Returns the totals.
+
+    A document that changes between read and update is re-read and retried,
+    up to MIGRATION_MAX_ATTEMPTS times, before the cursor moves past it. One
+    still conflicting is kept in the checkpoint's "pending" and retried
+    first on the next run.
+    """
+    state = load_checkpoint(checkpoint, collection_name)
+    col = db.collection(collection_name)
+    query = col.order_by("__name__").limit(page_size)
+    cursor = {"__name__": state["cursor"]} if state["cursor"] else None
+    seen = 0
+
+    def migrate_snaps(snaps):
+        sizes, failed = write_page(db, collection_name, snaps, dry_run)
+        for _ in range(1, MIGRATION_MAX_ATTEMPTS):
+            if not failed:
+                break
+            state["conflicts"] += len(failed)
+            # Fresh reads carry the new update_time; deleted documents drop out
+            snaps = [snap for snap in db.get_all([col.document(doc_id) for doc_id in failed]) if snap.exists]
+            retried, failed = write_page(db, collection_name, snaps, dry_run)
+            sizes.update(retried)
+        else:
+            state["conflicts"] += len(failed)
+
+        for doc_id, (before, after) in sizes.items():
+            if report is not None:
+                report(doc_id, before, after)
+            state["bytes_before"] += before
+            state["bytes_after"] += after
+        state["migrated"] += len(sizes)
+        return failed
+
+    def save_checkpoint():
+        if checkpoint and not dry_run:
+            state["updated_at"] = datetime.now(timezone.utc).isoformat()
+            write_json(checkpoint, state)
+
+    if state["pending"] and not should_stop():
+        snaps = [snap for snap in db.get_all([col.document(doc_id) for doc_id in state["pending"]]) if snap.exists]
+        state["pending"] = migrate_snaps(snaps)
+        save_checkpoint()
+
+    while not should_stop() and not (limit and seen >= limit):
+        page = list((query.start_after(cursor) if cursor is not None else query).stream())
+        if not page:
+            break
+        if limit:
+            page = page[: limit - seen]
+
+        state["pending"] += migrate_snaps(page)
+        state["scanned"] += len(page)
+        seen += len(page)
+
+        state["cursor"] = page[-1].id
+        cursor = page[-1]
+        save_checkpoint()
+        if len(page) < page_size:
+            break
+    return state
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    mig = sub.add_parser("migrate", help="rewrite v1 product documents as v2")
+    mig.add_argument("--collection", default=os.getenv("FIRESTORE_JOBS_COLLECTION", "products"))
+    mig.add_argument("--checkpoint", default=MIGRATION_CHECKPOINT, help="resume file ('' = none)")
+    mig.add_argument("--restart", action="store_true", help="discard the checkpoint and start over")
+    mig.add_argument("--page-size", type=int, default=MIGRATION_PAGE_SIZE)
+    mig.add_argument("--limit", type=int, default=0, help="stop after this many documents scanned")
+    mig.add_argument("--dry-run", action="store_true", help="write nothing (checkpoint included)")
+    mig.add_argument("--list", action="store_true", help="print 'doc id, bytes before, after, saved' per document")
+    args = parser.parse_args(argv)
+
+    from brain import initialize_firebase
+
+    if args.restart and args.checkpoint and os.path.exists(args.checkpoint) and not args.dry_run:
+        os.remove(args.checkpoint)
+
+    stop = []
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.append(signum))
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.append(signum))
+
+    def report(doc_id, before, after):
+        print(f"{doc_id}\t{before}\t{after}\t{before - after}")
+
+    started = time.perf_counter()
+    state = migrate(
+        initialize_firebase(), args.collection,
+        checkpoint="" if args.dry_run and args.restart else args.checkpoint,
+        page_size=args.page_size, limit=args.limit, dry_run=args.dry_run,
+        report=report if args.list else None, should_stop=lambda: bool(stop),
+    )
+    secs = time.perf_counter() - started
+
+    before, after, migrated = state["bytes_before"], state["bytes_after"], state["migrated"]
+    saved = before - after
+    print(
+        f"[Oracle] schema v{SCHEMA_VERSION} {'dry run' if args.dry_run else 'migration'} "
+        f"'{args.collection}' | scanned={state['scanned']} migrated={migrated} conflicts={state['conflicts']} "
+        f"pending={len(state['pending'])} "
+        f"bytes {before} -> {after} (saved {saved}, {100.0 * saved / before if before else 0:.1f}%, "
+        f"{saved / migrated if migrated else 0:.0f}/doc) | {secs:.1f}s{' | interrupted' if stop else ''}",
+        file=sys.stderr,
+    )
+    return 130 if stop else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
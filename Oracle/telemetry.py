@@ -0,0 +1,159 @@
+# Oracle/telemetry.py
+import os
+import json
+import time
+from contextlib import contextmanager
+
+# Prometheus-style latency buckets (seconds)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot = +Inf
+        self.samples = []
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self.total += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def merge(self, other: "Histogram"):
+        # Buckets and sums only: process-lifetime totals (daemon) must not
+        # grow with every run, and Prometheus only needs the buckets
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+
+    def quantile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> dict:
+        n = len(self.samples)
+        return {
+            "count": n,
+            "total_s": round(self.total, 6),
+            "mean_ms": round(self.total / n * 1000, 3) if n else 0.0,
+            "p50_ms": round(self.quantile(0.50) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "max_ms": round(max(self.samples) * 1000, 3) if n else 0.0,
+        }
+
+class Telemetry:
+    """
+    Per-phase latency histograms plus event and Firestore RPC counters.
+
+    Cheap enough to leave on: a phase costs two perf_counter() calls and an
+    append. Counters are plain dict increments.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.rpcs = {}
+        self.started = time.time()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name: str, seconds: float):
+        hist = self.phases.get(name)
+        if hist is None:
+            hist = self.phases[name] = Histogram()
+        hist.observe(seconds)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def rpc(self, method: str, n: int = 1):
+        self.rpcs[method] = self.rpcs.get(method, 0) + n
+
+    def merge(self, other: "Telemetry"):
+        for name, hist in other.phases.items():
+            self.phases.setdefault(name, Histogram()).merge(hist)
+        for name, n in other.counters.items():
+            self.count(name, n)
+        for method, n in other.rpcs.items():
+            self.rpc(method, n)
+
+    def summary(self, **extra) -> dict:
+        created = self.counters.get("created", 0)
+        rpcs = sum(self.rpcs.values())
+        return {
+            **extra,
+            "started_at": self.started,
+            "elapsed_s": round(time.time() - self.started, 6),
+            "counters": dict(sorted(self.counters.items())),
+            "firestore_rpcs": dict(sorted(self.rpcs.items())),
+            "rpcs_per_created": round(rpcs / created, 3) if created else None,
+            "phases": {name: h.summary() for name, h in sorted(self.phases.items())},
+        }
+
+    def prometheus(self, prefix: str = "oracle", labels: dict = None) -> str:
+        base = ",".join(f'{k}="{v}"' for k, v in sorted((labels or {}).items()))
+
+        def lbl(**kv):
+            parts = [base] if base else []
+            parts += [f'{k}="{v}"' for k, v in kv.items()]
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        out = [
+            f"# HELP {prefix}_phase_duration_seconds Time spent per Oracle phase.",
+            f"# TYPE {prefix}_phase_duration_seconds histogram",
+        ]
+        for name, hist in sorted(self.phases.items()):
+            cumulative = 0
+            for bound, n in zip(BUCKETS, hist.counts):
+                cumulative += n
+                out.append(f"{prefix}_phase_duration_seconds_bucket{lbl(phase=name, le=repr(bound))} {cumulative}")
+            cumulative += hist.counts[-1]
+            out.append(f'{prefix}_phase_duration_seconds_bucket{lbl(phase=name, le="+Inf")} {cumulative}')
+            out.append(f"{prefix}_phase_duration_seconds_sum{lbl(phase=name)} {hist.total:.6f}")
+            out.append(f"{prefix}_phase_duration_seconds_count{lbl(phase=name)} {cumulative}")
+
+        out += [
+            f"# HELP {prefix}_events_total Candidate outcomes (attempts, duplicates, creates, ...).",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        out += [f"{prefix}_events_total{lbl(event=k)} {v}" for k, v in sorted(self.counters.items())]
+
+        out += [
+            f"# HELP {prefix}_firestore_rpcs_total Firestore RPCs issued, by method.",
+            f"# TYPE {prefix}_firestore_rpcs_total counter",
+        ]
+        out += [f"{prefix}_firestore_rpcs_total{lbl(method=k)} {v}" for k, v in sorted(self.rpcs.items())]
+
+        created = self.counters.get("created", 0)
+        out += [
+            f"# HELP {prefix}_rpcs_per_created Firestore RPCs per created product.",
+            f"# TYPE {prefix}_rpcs_per_created gauge",
+            f"{prefix}_rpcs_per_created{lbl()} {sum(self.rpcs.values()) / created if created else 0:.6f}",
+            f"# HELP {prefix}_last_run_timestamp_seconds Unix time the metrics were written.",
+            f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+            f"{prefix}_last_run_timestamp_seconds{lbl()} {time.time():.3f}",
+        ]
+        return "\n".join(out) + "\n"
+
+def write_atomic(path: str, text: str):
+    # node_exporter's textfile collector may read at any time; never expose a partial file
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def write_json(path: str, summary: dict):
+    write_atomic(path, json.dumps(summary, indent=2) + "\n")
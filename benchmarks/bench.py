@@ -0,0 +1,622 @@
+"""
+Benchmarks for Oracle and GhostSystems/python against local fakes.
+
+    python benchmarks/bench.py                        # every case, compared with baseline.json
+    python benchmarks/bench.py --only oracle.build    # cases whose name starts with this
+    python benchmarks/bench.py --save-baseline        # record this run as the new baseline
+    python benchmarks/bench.py --list
+
+Firestore is FakeFirestore (firestore_fake.py), installed in place of
+firebase_admin's client. Printful is printful_stub's local server with
+--printful-latency-ms and --printful-error-rate. Each case runs in its own
+interpreter, so module state and peak RSS belong to that case alone.
+
+Reported per case, from the fastest of --repeat runs: ops/s (ops over
+wall time), p50/p99 latency of one op and the process's peak RSS. A case regresses when ops/s drops or p50 rises
+by more than --tolerance against the baseline; the exit status is then 1.
+baseline.json records the machine, Python version and commit it was measured
+on. Against a baseline from another machine or Python the deltas measure the
+hardware, so record a local baseline first.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import platform
+import argparse
+import resource
+import tempfile
+import contextlib
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+ORACLE_DIR = os.path.join(ROOT, "Oracle")
+GHOST_DIR = os.path.join(ROOT, "GhostSystems", "python")
+BASELINE_PATH = os.path.join(HERE, "baseline.json")
+DEFAULT_TOLERANCE = 0.20
+
+# ==============================================================================
+# HARNESS
+# ==============================================================================
+def timed_ops(op, n, warmup=0):
+    """Run op(i) n times after `warmup` untimed calls; (latencies, elapsed)."""
+    for i in range(warmup):
+        op(i)
+    latencies = []
+    perf = time.perf_counter
+    started = perf()
+    for i in range(n):
+        t = perf()
+        op(i)
+        latencies.append(perf() - t)
+    return latencies, perf() - started
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def summarize(latencies, elapsed, extra=None):
+    ordered = sorted(latencies)
+    return {
+        "ops": len(ordered),
+        "elapsed_s": round(elapsed, 4),
+        "ops_per_s": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 4),
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        **(extra or {}),
+    }
+
+def placeholder_credentials(tmp):
+    # The services check that a key file exists before initialize_app()
+    path = os.path.join(tmp, "firebase_service_account.json")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{}")
+    return path
+
+# ==============================================================================
+# ORACLE CASES
+# ==============================================================================
+def load_oracle(tmp, sampler="space"):
+    from firestore_fake import FakeFirestore, install
+
+    os.environ["FIREBASE_SERVICE_ACCOUNT_PATH"] = placeholder_credentials(tmp)
+    os.environ["ORACLE_SAMPLER"] = sampler
+    os.environ.setdefault("ORACLE_SEED", "bench")
+    db = install(FakeFirestore())
+    sys.path.insert(0, ORACLE_DIR)
+    import brain
+
+    random.seed("bench")
+    return brain, db
+
+def bench_stable_slug(args, tmp):
+    brain, _ = load_oracle(tmp)
+    titles = [brain.build_from_spec(s)["title"] for s in brain.enumerate_candidate_space()[:200]]
+    return timed_ops(lambda i: brain.stable_slug(titles[i % len(titles)]), args.n or 20000, warmup=500)
+
+def _bench_builder(name):
+    def run(args, tmp):
+        brain, _ = load_oracle(tmp)
+        build = getattr(brain, name)
+        niches = brain.NICHES
+        return timed_ops(lambda i: build(*niches[i % len(niches)]), args.n or 5000, warmup=200)
+    return run
+
+def bench_upsert_create(args, tmp):
+    brain, db = load_oracle(tmp)
+    products = [brain.build_from_spec(s) for s in brain.enumerate_candidate_space()]
+    n = min(args.n or len(products), len(products))
+    latencies, elapsed = timed_ops(lambda i: brain.upsert_product(db, "products", products[i]), n)
+    check_near_dup_warm(brain, db, products[:n])
+    return latencies, elapsed, {"docs": len(db._docs)}
+
+def bench_upsert_existing(args, tmp):
+    # Every doc already exists: the create-only write is rejected (AlreadyExists)
+    brain, db = load_oracle(tmp)
+    products = [brain.build_from_spec(s) for s in brain.enumerate_candidate_space()]
+    for product in products:
+        brain.upsert_product(db, "products", product)
+    n = args.n or len(products)
+    return timed_ops(lambda i: brain.upsert_product(db, "products", products[i % len(products)]), n)
+
+def check_near_dup_warm(brain, db, products):
+    """
+    Fail the case unless NearDuplicateIndex.warm() over the written documents
+    gives each one the signature add() gives the product it was built from.
+    """
+    from near_dupes import NearDuplicateIndex
+
+    warmed, built = NearDuplicateIndex(), NearDuplicateIndex()
+    warmed.warm(db, "products")
+    rows = {doc_id: row for row, doc_id in enumerate(warmed.ids)}
+    for product in products:
+        built.add(brain.doc_id_from_dedupe(product["dedupe_key"]), product)
+    for row, doc_id in enumerate(built.ids):
+        if doc_id not in rows:
+            raise AssertionError(f"near-dup warm: {doc_id} was not warmed")
+        if not (warmed._sigs[rows[doc_id]] == built._sigs[row]).all():
+            raise AssertionError(f"near-dup warm: {doc_id} warmed to a different signature than add()")
+
+def written_columns(product):
+    """The ranked sampler's score columns, read back from a written product."""
+    metrics, payload = product["metrics"], product["payload"]
+    pack = payload.get("bundle_includes", {}).get("prompt_pack", payload)
+    kit = payload.get("bundle_includes", {}).get("automation_kit", payload)
+    return {
+        "price": product["price_usd"],
+        "profit": sum(metrics["profit_est_usd_range"]) / 2,
+        "shelf": metrics["time_on_shelf_est_days"],
+        "fit": metrics["bundle_fit_score_0_10"],
+        "deploy": kit.get("time_to_deploy_minutes", 0),
+        "anchor": metrics.get("anchor_value_usd", 0),
+        "discount": metrics.get("discount_vs_anchor_usd", 0),
+        "prompts": pack.get("prompt_count", 0),
+        "models": len(pack.get("models", ())),
+    }
+
+def check_shard_near_dups(brain, shards=2, rounds=6, batch_size=20):
+    """
+    Fail the case if shards that take turns on one collection, each with its
+    own near-dup index (as run_workers' shards do), write near-clones of each
+    other's products. Runs on its own FakeFirestore.
+    """
+    from firestore_fake import FakeFirestore
+    from near_dupes import NearDuplicateIndex
+
+    db = FakeFirestore()
+    indexes = [NearDuplicateIndex(threshold=brain.NEAR_DUP_THRESHOLD) for _ in range(shards)]
+    saved = brain.SHARD, brain.BATCH_SIZE
+    brain.BATCH_SIZE = batch_size
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for _ in range(rounds):
+                for k, near in enumerate(indexes):
+                    brain.SHARD = (k, shards)
+                    brain.run_once(db, "products", None, near)
+    finally:
+        brain.SHARD, brain.BATCH_SIZE = saved
+
+    seen = NearDuplicateIndex(threshold=brain.NEAR_DUP_THRESHOLD)
+    clones = 0
+    for path, (data, _, _) in sorted(db._docs.items(), key=lambda item: item[1][1]):
+        doc_id = path.rsplit("/", 1)[1]
+        if seen.query(data):
+            clones += 1
+        seen.add(doc_id, data)
+    if clones:
+        raise AssertionError(f"{shards} shards wrote {clones} near-clones of each other's products in {len(db._docs)}")
+
+def check_product_mix(brain, sampler, n=300, tolerance=0.1):
+    """
+    Fail the case unless one run of n products keeps the sampler's type mix
+    (bundle share near BUNDLE_RATIO) and the builders' price spread (no type
+    collapsed onto a few prices; for the ranked sampler, over the prices
+    spec_metrics gives the whole space). The ranked sampler must also write
+    the metrics it scored: each rank_score has to equal the score of the
+    product's own metrics. Runs on its own FakeFirestore; returns the bundle
+    share.
+    """
+    from firestore_fake import FakeFirestore
+    from product_schema import expand
+
+    db, batch_size = FakeFirestore(), brain.BATCH_SIZE
+    brain.BATCH_SIZE = n
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            brain.run_space(db, "products", ranked=sampler == "ranked")
+    finally:
+        brain.BATCH_SIZE = batch_size
+
+    prices = {}
+    for data, _, _ in db._docs.values():
+        product = expand(data)
+        prices.setdefault(product["product_type"], []).append(product["price_usd"])
+        if sampler == "ranked":
+            score = round(brain.linear_score(written_columns(product)), 4)
+            if abs(score - product["metrics"]["rank_score"]) > 1e-6:
+                raise AssertionError(f"ranked: rank_score {product['metrics']['rank_score']}, written metrics score {score}")
+    total = sum(len(p) for p in prices.values())
+    share = len(prices.get("bundle", [])) / total if total else 0.0
+    if abs(share - brain.BUNDLE_RATIO) > tolerance:
+        raise AssertionError(f"{sampler}: bundle share {share:.2f}, expected {brain.BUNDLE_RATIO:.2f} +/- {tolerance}")
+    if sampler == "ranked":
+        # Profit decides, so one run's picks sit at the top of each price
+        # range; the spread must hold over the prices every spec will get
+        import numpy as np
+
+        space = brain.enumerate_candidate_space()
+        drawn_prices = brain.spec_metrics(np, space)["price"].tolist()
+        prices = {}
+        for spec, price in zip(space, drawn_prices):
+            prices.setdefault(spec.product_type, []).append(price)
+    bounds = {"prompt_pack": brain.PRICE_PROMPT_PACK, "automation_kit": brain.PRICE_AUTOMATION_KIT, "bundle": brain.PRICE_BUNDLE}
+    for product_type, values in prices.items():
+        lo, hi = bounds[product_type]
+        if len(set(values)) < min(len(values), hi - lo + 1) // 2:
+            raise AssertionError(f"{sampler}: {len(set(values))} distinct {product_type} prices in {len(values)} products")
+    return round(share, 3)
+
+def _bench_main(sampler):
+    def run(args, tmp):
+        brain, db = load_oracle(tmp, sampler)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            latencies, elapsed = timed_ops(lambda i: brain.main([]), args.n or 40, warmup=1)
+        extra = {"docs": len(db._docs), "batch_size": brain.BATCH_SIZE}
+        extra["bundle_share"] = check_product_mix(brain, sampler)
+        check_shard_near_dups(brain)
+        return latencies, elapsed, extra
+    return run
+
+# ==============================================================================
+# GHOSTSYSTEMS CASES
+# ==============================================================================
+def load_ghost(args, tmp):
+    """Stub Printful up, fake Firestore installed, product_generator imported from tmp."""
+    from firestore_fake import FakeFirestore, install
+
+    # printful_client reads its config at import, so the stub's address must
+    # be known before printful_stub (which imports it) is loaded
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    os.environ.update({
+        "PRINTFUL_API_URL": f"http://127.0.0.1:{port}",
+        "PRINTFUL_API_KEY": "bench",
+        # Lift the client's production pacing (110/min), or the token bucket
+        # sets the burst's pace instead of the code under test
+        "PRINTFUL_RATE_PER_MINUTE": "600000",
+        "PRINTFUL_BURST": "1000",
+        "PRINTFUL_BACKOFF_BASE": "0.01",
+        "GHOST_RETRY_BASE_SECONDS": "0.05",
+        "PREFLIGHT_ENABLED": "0",
+        "GHOST_HEALTH_ENABLED": "0",
+    })
+    sys.path.insert(0, GHOST_DIR)
+    from printful_stub import start_stub
+
+    server, _ = start_stub(
+        port=port,
+        latency_ms=args.printful_latency_ms,
+        error_rate=args.printful_error_rate,
+        catalog=os.path.join(GHOST_DIR, "fixtures", "printful_catalog.json"),
+    )
+    placeholder_credentials(tmp)
+    os.chdir(tmp)  # product_generator looks for the key file and data/ in cwd
+    db = install(FakeFirestore())
+    import logging
+    import product_generator as pg
+
+    logging.getLogger().setLevel(logging.WARNING)
+    return pg, db, server
+
+def bench_process_job_burst(args, tmp):
+    """
+    Start the real listener, then commit N pending jobs in 500-write batches.
+    The burst reaches process_job through on_snapshot and the bounded pool.
+    Latency is from the job's commit until its last process_job call returns,
+    and elapsed ends once every job has a final status.
+    """
+    import threading
+
+    pg, db, server = load_ghost(args, tmp)
+    n = args.n or 300
+    done_at = {}
+    run_job = pg.process_job
+
+    def timed_process_job(job_doc, *rest):
+        try:
+            run_job(job_doc, *rest)
+        finally:
+            done_at[job_doc.id] = time.perf_counter()
+
+    pg.process_job = timed_process_job
+    listener = threading.Thread(target=pg.start_listener, name="FirestoreListener")
+    listener.start()
+    while not pg.health.attached:
+        time.sleep(0.01)
+
+    written_at = {}
+    started = time.perf_counter()
+    for first in range(0, n, 500):
+        batch = db.batch()
+        for i in range(first, min(n, first + 500)):
+            ref = db.document(f"users/u{i % 20}/jobs/job{i:06d}")
+            batch.set(ref, {
+                "status": "pending",
+                "title": f"Bench tee {i}",
+                "productType": "T-Shirt",
+                "price": "24.99",
+                "imageUrl": f"https://example.com/art/{i}.png",
+                "createdAt": i,
+            })
+        batch.commit()
+        now = time.perf_counter()
+        written_at.update((f"job{i:06d}", now) for i in range(first, min(n, first + 500)))
+
+    jobs = db.collection_group("jobs")
+    deadline = time.monotonic() + args.timeout
+    final = 0
+    while time.monotonic() < deadline:
+        final = sum(1 for s in jobs.stream() if s.get("status") in ("complete", "failed"))
+        if final >= n:
+            break
+        time.sleep(0.02)
+    elapsed = time.perf_counter() - started
+
+    pg.shutdown_event.set()
+    listener.join(30)
+    server.shutdown()
+
+    statuses = {}
+    for snap in jobs.stream():
+        status = snap.get("status")
+        statuses[status] = statuses.get(status, 0) + 1
+    latencies = [done_at[j] - written_at[j] for j in written_at if j in done_at]
+    return latencies, elapsed, {"statuses": statuses, "printful": server.state.counts, "timed_out": final < n}
+
+def bench_dead_letter_replay(args, tmp):
+    """
+    Replay N dead letters in 50-letter pages through a pool whose every job
+    fails again at once, as an exhausted job does. Latency is the time
+    between submits. Fails if any job is submitted more than once.
+    """
+    import threading
+    from datetime import datetime, timedelta, timezone
+    from firestore_fake import FakeFirestore, install
+
+    db = install(FakeFirestore())
+    sys.path.insert(0, GHOST_DIR)
+    from firebase_admin import firestore
+    from dead_letters import dead_letter_ref, iter_pages, replay, replay_query
+
+    n = args.n or 1000
+    failed_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    batch = db.batch()
+    for i in range(n):
+        job_ref = db.document(f"users/u{i % 20}/jobs/job{i:06d}")
+        batch.set(job_ref, {"status": "failed", "title": f"Bench tee {i}"})
+        batch.set(dead_letter_ref(db, job_ref), {
+            "jobPath": job_ref.path,
+            "errorClass": "HTTPError",
+            "attempts": 3,
+            "failedAt": failed_at + timedelta(milliseconds=i),
+        })
+        if (i + 1) % 250 == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+
+    submitted = []
+    seen = set()
+
+    class RefailingPool:
+        def submit(self, job, _change, attempts, replay_job):
+            path = job.reference.path
+            if path in seen:
+                # Unbounded, the replay would go on resubmitting forever
+                raise AssertionError(f"dead-letter replay: {path} submitted twice")
+            seen.add(path)
+            submitted.append((time.perf_counter(), path))
+            dead_letter_ref(db, job.reference).update(
+                {"failedAt": firestore.SERVER_TIMESTAMP, "attempts": attempts + 1}
+            )
+            return True
+
+        def stats(self):
+            return {}
+
+    class DirectWriter:
+        def update(self, ref, fields):
+            ref.update(fields)
+
+    class NoWait:
+        def reserve(self):
+            return 0.0
+
+    started = time.perf_counter()
+    pages = iter_pages(replay_query(db), page_size=50)
+    stats = replay(db, pages, RefailingPool(), NoWait(), DirectWriter(), threading.Event())
+    elapsed = time.perf_counter() - started
+
+    if len(submitted) != n:
+        raise AssertionError(f"dead-letter replay: {len(submitted)} of {n} jobs submitted")
+    times = [started] + [t for t, _ in submitted]
+    return [b - a for a, b in zip(times, times[1:])], elapsed, {"replay": dict(stats)}
+
+def bench_shard_stamp(args, tmp):
+    """
+    Stamp shard slots on N unstamped pending jobs delivered in 100-job
+    snapshots. Every fourth job is claimed after its snapshot was taken, so
+    its stamp fails the update-time precondition: that must be dropped
+    without raising, and leave the claimed job unstamped. Latency is one
+    snapshot's stamping.
+    """
+    from types import SimpleNamespace
+    from firestore_fake import FakeFirestore, install
+
+    db = install(FakeFirestore())
+    sys.path.insert(0, GHOST_DIR)
+    from sharding import SHARD_FIELD, ShardStamper
+
+    n = args.n or 2000
+    jobs = db.collection("jobs")
+    batch = db.batch()
+    for i in range(n):
+        batch.set(jobs.document(f"job{i:06d}"), {"status": "pending", "createdAt": i})
+        if (i + 1) % 500 == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+
+    added = SimpleNamespace(name="ADDED")
+    changes = [SimpleNamespace(type=added, document=snap) for snap in jobs.stream()]
+    for change in changes[::4]:
+        change.document.reference.update({"status": "processing"})
+
+    stamper = ShardStamper(db, jobs)
+    chunks = [changes[i:i + 100] for i in range(0, n, 100)]
+    latencies, elapsed = timed_ops(lambda i: stamper._on_snapshot(None, chunks[i], None), len(chunks))
+
+    stamped = {snap.id for snap in jobs.stream() if SHARD_FIELD in snap.to_dict()}
+    claimed = {change.document.id for change in changes[::4]}
+    if stamped & claimed:
+        raise AssertionError(f"shard stamp: {len(stamped & claimed)} claimed jobs were stamped")
+    if len(stamped) != n - len(claimed):
+        raise AssertionError(f"shard stamp: {len(stamped)} of {n - len(claimed)} unclaimed jobs stamped")
+    return latencies, elapsed, {"stamped": len(stamped), "conflicts": len(claimed)}
+
+# ==============================================================================
+# CASES
+# ==============================================================================
+# name -> runner(args, tmp) returning (latencies, elapsed[, extra])
+CASES = {
+    "oracle.stable_slug": bench_stable_slug,
+    "oracle.build_prompt_pack": _bench_builder("build_prompt_pack"),
+    "oracle.build_automation_kit": _bench_builder("build_automation_kit"),
+    "oracle.build_bundle": _bench_builder("build_bundle"),
+    "oracle.upsert_product.create": bench_upsert_create,
+    "oracle.upsert_product.existing": bench_upsert_existing,
+    "oracle.main.space": _bench_main("space"),
+    "oracle.main.ranked": _bench_main("ranked"),
+    "ghost.process_job.burst": bench_process_job_burst,
+    "ghost.dead_letters.replay": bench_dead_letter_replay,
+    "ghost.sharding.stamp": bench_shard_stamp,
+}
+
+def run_case_here(name, args):
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        out = CASES[name](args, tmp)
+        latencies, elapsed, extra = out if len(out) == 3 else (*out, None)
+        return summarize(latencies, elapsed, extra)
+
+def run_case(name, args):
+    """Run one case in a fresh interpreter and return its summary."""
+    cmd = [
+        sys.executable, os.path.abspath(__file__), "--run-case", name,
+        "--printful-latency-ms", str(args.printful_latency_ms),
+        "--printful-error-rate", str(args.printful_error_rate),
+        "--timeout", str(args.timeout),
+    ]
+    if args.n:
+        cmd += ["--n", str(args.n)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=HERE, env={**os.environ, "PYTHONPATH": HERE})
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stderr.strip().splitlines()[-15:])
+        raise RuntimeError(f"case {name} failed (exit {proc.returncode}):\n{tail}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+# ==============================================================================
+# BASELINE
+# ==============================================================================
+def git_commit():
+    """Short hash of the measured tree ('+dirty' with local changes), or None outside git."""
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=ROOT)
+        dirty = subprocess.run(["git", "status", "--porcelain"], capture_output=True, text=True, cwd=ROOT)
+    except OSError:
+        return None
+    if head.returncode != 0:
+        return None
+    return head.stdout.strip() + ("+dirty" if dirty.stdout.strip() else "")
+
+def compare(results, baseline, tolerance):
+    """Print one line per case with deltas; returns the names that regressed."""
+    base_cases = (baseline or {}).get("cases", {})
+    regressed = []
+    print(f"{'case':34} {'ops/s':>11} {'p50 ms':>9} {'p99 ms':>9} {'rss MB':>7}  vs baseline")
+    for name, r in results.items():
+        line = f"{name:34} {r['ops_per_s']:>11,.1f} {r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['peak_rss_mb']:>7.1f}"
+        base = base_cases.get(name)
+        if base:
+            ops = r["ops_per_s"] / base["ops_per_s"] - 1 if base["ops_per_s"] else 0.0
+            p50 = r["p50_ms"] / base["p50_ms"] - 1 if base["p50_ms"] else 0.0
+            rss = r["peak_rss_mb"] - base["peak_rss_mb"]
+            flag = ops < -tolerance or p50 > tolerance
+            if flag:
+                regressed.append(name)
+            line += f"  ops {ops:+.0%} p50 {p50:+.0%} rss {rss:+.1f}MB{'  REGRESSION' if flag else ''}"
+        elif baseline is not None:
+            line += "  (new)"
+        print(line)
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", action="append", help="run cases whose name starts with this (repeatable)")
+    parser.add_argument("--list", action="store_true", help="print case names and exit")
+    parser.add_argument("--n", type=int, help="ops per case (default: per-case)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the fastest is reported")
+    parser.add_argument("--printful-latency-ms", type=float, default=20.0, help="stub Printful response latency")
+    parser.add_argument("--printful-error-rate", type=float, default=0.0, help="fraction of stub 503s")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds a burst may take to settle")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to --baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed fractional slowdown")
+    parser.add_argument("--json", help="also write the full results here")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case_here(args.run_case, args)))
+        return 0
+
+    names = [n for n in CASES if not args.only or any(n.startswith(p) for p in args.only)]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    results = {}
+    for name in names:
+        print(f"[bench] {name} ...", file=sys.stderr)
+        # Best of --repeat: noise only ever slows a run down
+        runs = [run_case(name, args) for _ in range(max(1, args.repeat))]
+        results[name] = max(runs, key=lambda r: r["ops_per_s"])
+
+    report = {
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} cpu)",
+        "commit": git_commit(),
+        "printful_latency_ms": args.printful_latency_ms,
+        "printful_error_rate": args.printful_error_rate,
+        "cases": results,
+    }
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        recorded = {k: baseline.get(k) for k in ("python", "machine")}
+        if recorded != {k: report[k] for k in recorded}:
+            # Timings only compare on like hardware and interpreter
+            print(
+                f"[bench] baseline recorded on {recorded['machine']}, Python {recorded['python']}; "
+                f"this is {report['machine']}, Python {report['python']}. Re-record it here "
+                f"(--save-baseline) before reading deltas as regressions.",
+                file=sys.stderr,
+            )
+    regressed = compare(results, baseline, args.tolerance)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        if os.path.exists(args.baseline):
+            # Keep cases that were not re-run this time
+            with open(args.baseline, encoding="utf-8") as f:
+                report["cases"] = {**json.load(f).get("cases", {}), **results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"[bench] baseline written to {args.baseline}", file=sys.stderr)
+    if regressed:
+        print(f"[bench] {len(regressed)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressed)}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
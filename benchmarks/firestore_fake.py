@@ -0,0 +1,605 @@
+"""
+In-memory Firestore for the benchmarks (no network, no credentials).
+
+Covers what Oracle and GhostSystems/python call: document get / create /
+set (merge) / update (with last_update_time preconditions) / delete,
+collection and collection_group queries (where, order_by, limit,
+start_after, select, stream), get_all, WriteBatch, BulkWriter and
+on_snapshot watches. SERVER_TIMESTAMP, DELETE_FIELD, Increment, ArrayUnion,
+ArrayRemove, Maximum and Minimum are applied at commit time. Snapshot
+listeners get ADDED/MODIFIED/REMOVED changes on their own thread, one
+delivery per commit, like the real watch stream.
+
+    from firestore_fake import FakeFirestore, install
+    db = FakeFirestore()
+    install(db)   # firebase_admin.initialize_app / firestore.client now use db
+"""
+import copy
+import queue
+import random
+import string
+import threading
+from datetime import datetime, timedelta, timezone
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+_GRPC_CODES = {NotFound: 5, AlreadyExists: 6, FailedPrecondition: 9}
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+BULK_BATCH_SIZE = 20  # BulkWriter's batch size
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    "array-contains": lambda a, b: isinstance(a, list) and b in a,
+    "array_contains_any": lambda a, b: isinstance(a, list) and any(v in a for v in b),
+    "array-contains-any": lambda a, b: isinstance(a, list) and any(v in a for v in b),
+}
+
+_MISSING = object()
+
+def _lookup(data, field_path):
+    value = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _resolve(value, current, now):
+    """Value a field ends up with when `value` is written over `current`."""
+    if value is transforms.SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, transforms.Increment):
+        return (current if isinstance(current, (int, float)) else 0) + value._value
+    if isinstance(value, transforms.Maximum):
+        return value._value if not isinstance(current, (int, float)) else max(current, value._value)
+    if isinstance(value, transforms.Minimum):
+        return value._value if not isinstance(current, (int, float)) else min(current, value._value)
+    if isinstance(value, transforms.ArrayUnion):
+        base = list(current) if isinstance(current, list) else []
+        return base + [v for v in value._values if v not in base]
+    if isinstance(value, transforms.ArrayRemove):
+        return [v for v in current if v not in value._values] if isinstance(current, list) else []
+    if isinstance(value, dict):
+        inner = current if isinstance(current, dict) else {}
+        out = {}
+        for k, v in value.items():
+            if v is not transforms.DELETE_FIELD:
+                out[k] = _resolve(v, inner.get(k), now)
+        return out
+    return copy.deepcopy(value)
+
+def _merge(target, fields, now):
+    for key, value in fields.items():
+        if value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value, now)
+        else:
+            target[key] = _resolve(value, target.get(key), now)
+
+def _update(target, fields, now):
+    # update() keys are field paths: "a.b" addresses a nested map
+    for path, value in fields.items():
+        *parents, leaf = path.split(".")
+        node = target
+        for part in parents:
+            if not isinstance(node.get(part), dict):
+                node[part] = {}
+            node = node[part]
+        if value is transforms.DELETE_FIELD:
+            node.pop(leaf, None)
+        else:
+            node[leaf] = _resolve(value, node.get(leaf), now)
+
+def _project(data, field_paths):
+    if field_paths is None:
+        return data
+    out = {}
+    for path in field_paths:
+        value = _lookup(data, path)
+        if value is not _MISSING:
+            _update(out, {path: value}, None)
+    return out
+
+# ==============================================================================
+# SNAPSHOTS AND REFERENCES
+# ==============================================================================
+class FakeSnapshot:
+    def __init__(self, reference, data, create_time=None, update_time=None, read_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.create_time = create_time
+        self.update_time = update_time
+        self.read_time = read_time
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        value = _lookup(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+class WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+class _WriteOption:
+    def __init__(self, last_update_time=None, exists=None):
+        self.last_update_time = last_update_time
+        self.exists = exists
+
+class FakeDocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, collection_id):
+        return FakeCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, field_paths=None, transaction=None, retry=None, timeout=None):
+        return self._client._snapshot(self, field_paths)
+
+    def create(self, document_data, retry=None, timeout=None):
+        return self._client._commit([("create", self, document_data, None)])[0]
+
+    def set(self, document_data, merge=False, retry=None, timeout=None):
+        return self._client._commit([("set", self, document_data, merge)])[0]
+
+    def update(self, field_updates, option=None, retry=None, timeout=None):
+        return self._client._commit([("update", self, field_updates, option)])[0]
+
+    def delete(self, option=None, retry=None, timeout=None):
+        return self._client._commit([("delete", self, None, option)])[0]
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return f"<FakeDocumentReference {self.path}>"
+
+# ==============================================================================
+# QUERIES AND WATCHES
+# ==============================================================================
+class FakeQuery:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, client, parent=None, group=None):
+        self._client = client
+        self._parent = parent  # collection path, or None for a collection group
+        self._group = group
+        self._filters = []
+        self._orders = []
+        self._limit = None
+        self._after = None
+        self._fields = None
+
+    def _copy(self, **changes):
+        query = FakeQuery(self._client, self._parent, self._group)
+        query._filters = list(self._filters)
+        query._orders = list(self._orders)
+        query._limit, query._after, query._fields = self._limit, self._after, self._fields
+        for key, value in changes.items():
+            setattr(query, key, value)
+        return query
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in _OPS:
+            raise ValueError(f"unsupported operator {op_string!r}")
+        return self._copy(_filters=self._filters + [(field_path, _OPS[op_string], value)])
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(_orders=self._orders + [(field_path, direction == self.DESCENDING)])
+
+    def limit(self, count):
+        return self._copy(_limit=count)
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(_after=document_fields_or_snapshot)
+
+    def select(self, field_paths):
+        return self._copy(_fields=[f for f in field_paths if f != "__name__"])
+
+    def _contains(self, path):
+        parent, _ = path.rsplit("/", 1)
+        if self._parent is not None:
+            return parent == self._parent
+        return parent.rsplit("/", 1)[-1] == self._group
+
+    def _matches(self, path, data):
+        if not self._contains(path):
+            return False
+        for field_path, op, value in self._filters:
+            current = _lookup(data, field_path)
+            if current is _MISSING:
+                return False
+            try:
+                if not op(current, value):
+                    return False
+            except TypeError:
+                return False
+        # Ordering on a field also filters out documents without it
+        return all(f == "__name__" or _lookup(data, f) is not _MISSING for f, _ in self._orders)
+
+    def _sort_key(self, path, data):
+        return [path if f == "__name__" else _lookup(data, f) for f, _ in self._orders]
+
+    def _rows(self):
+        rows = [(path, doc) for path, doc in self._client._docs.items() if self._matches(path, doc[0])]
+        orders = self._orders or [("__name__", False)]
+        # Stable sorts from the last key to the first give a multi-key order
+        for i in reversed(range(len(orders))):
+            field, descending = orders[i]
+            rows.sort(
+                key=lambda r, f=field: r[0] if f == "__name__" else _lookup(r[1][0], f),
+                reverse=descending,
+            )
+        if self._after is not None:
+            rows = self._skip_through_cursor(rows, orders)
+        if self._limit is not None:
+            rows = rows[: self._limit]
+        return rows
+
+    def _skip_through_cursor(self, rows, orders):
+        after = self._after
+        if isinstance(after, FakeSnapshot):
+            cursor = [after.reference.path if f == "__name__" else _lookup(after._data, f) for f, _ in orders]
+        else:
+            cursor = [after.get(f) for f, _ in orders]
+            # As in the client, a bare id under __name__ is a document of this collection
+            cursor = [
+                f"{self._parent}/{value}" if f == "__name__" and isinstance(value, str) and "/" not in value
+                else getattr(value, "path", value)
+                for (f, _), value in zip(orders, cursor)
+            ]
+
+        def past(row):
+            for (field, descending), want in zip(orders, cursor):
+                have = row[0] if field == "__name__" else _lookup(row[1][0], field)
+                if have != want:
+                    return (have < want) if descending else (have > want)
+            return False
+
+        return [row for row in rows if past(row)]
+
+    def stream(self, transaction=None, retry=None, timeout=None):
+        with self._client._lock:
+            now = self._client._clock()
+            rows = [
+                (path, copy.deepcopy(_project(data, self._fields)), created, updated)
+                for path, (data, created, updated) in self._rows()
+            ]
+        for path, data, created, updated in rows:
+            yield FakeSnapshot(FakeDocumentReference(self._client, path), data, created, updated, now)
+
+    def get(self, transaction=None, retry=None, timeout=None):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        return self._client._watch(self, callback)
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, path):
+        super().__init__(client, parent=path)
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id=None):
+        if document_id is None:
+            document_id = "".join(random.choices(_AUTO_ID_CHARS, k=20))
+        return FakeDocumentReference(self._client, f"{self.path}/{document_id}")
+
+    def add(self, document_data, document_id=None):
+        ref = self.document(document_id)
+        result = ref.create(document_data)
+        return result.update_time, ref
+
+class FakeWatch:
+    def __init__(self, client, query, callback):
+        self._client = client
+        self.query = query
+        self.callback = callback
+        self.paths = set()
+        self.active = True
+
+    def unsubscribe(self):
+        self.active = False
+        with self._client._lock:
+            if self in self._client._watches:
+                self._client._watches.remove(self)
+
+    # Called under the client lock after each commit
+    def _changes(self, touched, now):
+        changes = []
+        for path in touched:
+            doc = self._client._docs.get(path)
+            matches = doc is not None and self.query._matches(path, doc[0])
+            was = path in self.paths
+            if not matches and not was:
+                continue
+            ref = FakeDocumentReference(self._client, path)
+            if matches:
+                self.paths.add(path)
+                snap = FakeSnapshot(ref, copy.deepcopy(doc[0]), doc[1], doc[2], now)
+                kind = ChangeType.MODIFIED if was else ChangeType.ADDED
+                changes.append(DocumentChange(kind, snap, -1 if not was else 0, 0))
+            else:
+                self.paths.discard(path)
+                changes.append(DocumentChange(ChangeType.REMOVED, FakeSnapshot(ref, None, read_time=now), 0, -1))
+        return changes
+
+    def _current(self, now):
+        return [
+            FakeSnapshot(FakeDocumentReference(self._client, p), copy.deepcopy(d), c, u, now)
+            for p, (d, c, u) in sorted((p, self._client._docs[p]) for p in self.paths)
+        ]
+
+# ==============================================================================
+# WRITES
+# ==============================================================================
+class FakeWriteBatch:
+    """All-or-nothing commit of the queued writes."""
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def create(self, reference, document_data):
+        self._writes.append(("create", reference, document_data, None))
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(("set", reference, document_data, merge))
+
+    def update(self, reference, field_updates, option=None):
+        self._writes.append(("update", reference, field_updates, option))
+
+    def delete(self, reference, option=None):
+        self._writes.append(("delete", reference, None, option))
+
+    def commit(self, retry=None, timeout=None):
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+    def __len__(self):
+        return len(self._writes)
+
+class _Operation:
+    def __init__(self, write):
+        self.write = write
+        self.reference = write[1]
+        self.attempts = 0
+
+class BulkWriteFailure:
+    def __init__(self, operation, error):
+        self.operation = operation
+        self.code = _GRPC_CODES.get(type(error), 2)
+        self.message = str(error)
+        self.attempts = operation.attempts
+
+class FakeBulkWriter:
+    """
+    Queues writes and applies them BULK_BATCH_SIZE at a time on flush().
+    Each write succeeds or fails on its own. The error callback decides
+    whether a failed write is retried, as with the real BulkWriter.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._queue = []
+        self._on_result = None
+        self._on_batch = None
+        self._on_error = None
+
+    def on_write_result(self, callback):
+        self._on_result = callback
+
+    def on_batch_result(self, callback):
+        self._on_batch = callback
+
+    def on_write_error(self, callback):
+        self._on_error = callback
+
+    def create(self, reference, document_data):
+        self._queue.append(_Operation(("create", reference, document_data, None)))
+
+    def set(self, reference, document_data, merge=False):
+        self._queue.append(_Operation(("set", reference, document_data, merge)))
+
+    def update(self, reference, field_updates, option=None):
+        self._queue.append(_Operation(("update", reference, field_updates, option)))
+
+    def delete(self, reference, option=None):
+        self._queue.append(_Operation(("delete", reference, None, option)))
+
+    def flush(self):
+        while self._queue:
+            batch, self._queue = self._queue[:BULK_BATCH_SIZE], self._queue[BULK_BATCH_SIZE:]
+            results = []
+            for op in batch:
+                while True:
+                    op.attempts += 1
+                    try:
+                        result = self._client._commit([op.write])[0]
+                    except (AlreadyExists, FailedPrecondition, NotFound) as e:
+                        if self._on_error and self._on_error(BulkWriteFailure(op, e), self):
+                            continue
+                        break
+                    results.append(result)
+                    if self._on_result:
+                        self._on_result(op.reference, result, self)
+                    break
+            self._client.stats["bulk_batches"] += 1
+            if self._on_batch:
+                self._on_batch(batch, results, self)
+
+    def close(self):
+        self.flush()
+
+# ==============================================================================
+# CLIENT
+# ==============================================================================
+class FakeFirestore:
+    def __init__(self):
+        self._docs = {}  # path -> (data, create_time, update_time)
+        self._lock = threading.RLock()
+        self._last_time = datetime.now(timezone.utc)
+        self._watches = []
+        self._deliveries = queue.Queue()
+        self._delivery_thread = None
+        self.stats = {"reads": 0, "writes": 0, "commits": 0, "queries": 0, "bulk_batches": 0}
+
+    def _clock(self):
+        # Strictly increasing, so every write gets a distinct update_time
+        now = datetime.now(timezone.utc)
+        self._last_time = max(now, self._last_time + timedelta(microseconds=1))
+        return self._last_time
+
+    def collection(self, collection_id):
+        return FakeCollectionReference(self, collection_id)
+
+    def collection_group(self, collection_id):
+        return FakeQuery(self, group=collection_id)
+
+    def document(self, document_path):
+        return FakeDocumentReference(self, document_path)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def bulk_writer(self, options=None):
+        return FakeBulkWriter(self)
+
+    def write_option(self, last_update_time=None, exists=None):
+        return _WriteOption(last_update_time, exists)
+
+    def get_all(self, references, field_paths=None, transaction=None, retry=None, timeout=None):
+        for ref in list(references):
+            yield self._snapshot(ref, field_paths)
+
+    def _snapshot(self, ref, field_paths=None):
+        with self._lock:
+            self.stats["reads"] += 1
+            doc = self._docs.get(ref.path)
+            now = self._clock()
+            if doc is None:
+                return FakeSnapshot(ref, None, read_time=now)
+            data, created, updated = doc
+            return FakeSnapshot(ref, copy.deepcopy(_project(data, field_paths)), created, updated, now)
+
+    def _commit(self, writes):
+        """Apply writes atomically; raises (changing nothing) if any precondition fails."""
+        with self._lock:
+            now = self._clock()
+            staged = {}
+            results = []
+            for kind, ref, data, extra in writes:
+                path = ref.path
+                current = staged[path] if path in staged else self._docs.get(path)
+                option = extra if kind in ("update", "delete") else None
+                if option is not None:
+                    if option.exists is not None and option.exists != (current is not None):
+                        raise FailedPrecondition(f"{path}: exists precondition failed")
+                    if option.last_update_time is not None and (
+                        current is None or current[2] != option.last_update_time
+                    ):
+                        raise FailedPrecondition(f"{path}: document was modified")
+                if kind == "create":
+                    if current is not None:
+                        raise AlreadyExists(f"Document already exists: {path}")
+                    new = ({}, now, now)
+                    _merge(new[0], data, now)
+                elif kind == "set":
+                    body = copy.deepcopy(current[0]) if (extra and current is not None) else {}
+                    _merge(body, data, now)
+                    new = (body, current[1] if current is not None else now, now)
+                elif kind == "update":
+                    if current is None:
+                        raise NotFound(f"No document to update: {path}")
+                    body = copy.deepcopy(current[0])
+                    _update(body, data, now)
+                    new = (body, current[1], now)
+                else:
+                    new = None
+                staged[path] = new
+                results.append(WriteResult(now))
+
+            for path, doc in staged.items():
+                if doc is None:
+                    self._docs.pop(path, None)
+                else:
+                    self._docs[path] = doc
+            self.stats["writes"] += len(writes)
+            self.stats["commits"] += 1
+            for watch in self._watches:
+                changes = watch._changes(staged, now)
+                if changes:
+                    self._deliveries.put((watch, watch._current(now), changes, now))
+            return results
+
+    def _watch(self, query, callback):
+        watch = FakeWatch(self, query, callback)
+        with self._lock:
+            self.stats["queries"] += 1
+            now = self._clock()
+            changes = watch._changes(list(self._docs), now)
+            self._watches.append(watch)
+            self._deliveries.put((watch, watch._current(now), changes, now))
+            if self._delivery_thread is None:
+                self._delivery_thread = threading.Thread(target=self._deliver, name="FakeWatch", daemon=True)
+                self._delivery_thread.start()
+        return watch
+
+    def _deliver(self):
+        while True:
+            watch, docs, changes, read_time = self._deliveries.get()
+            if watch.active:
+                watch.callback(docs, changes, read_time)
+
+    def wait_for_watches(self, timeout=5.0):
+        """Block until queued snapshot deliveries have been handed to listeners."""
+        deadline = threading.Event()
+        self._deliveries.put((_Marker(deadline), [], [], None))
+        return deadline.wait(timeout)
+
+class _Marker:
+    active = True
+
+    def __init__(self, event):
+        self.callback = lambda *_: event.set()
+
+def install(client):
+    """
+    Route firebase_admin to `client`: initialize_app() does nothing and
+    firestore.client() returns the fake. Call before importing a service.
+    """
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    credentials.Certificate = lambda *args, **kwargs: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    firestore.client = lambda *args, **kwargs: client
+    return client